@@ -0,0 +1,131 @@
+"""
+Bandwidth measurement scheduler for measure_bandwidth.
+
+Every measurement is an iperf client run on a Mininet host through the
+m utility, e.g. "m h1 iperf -t 5 -c 10.0.0.2 -y C". Instead of running them
+one after another, run() starts up to max_concurrent of them at once, but
+never two whose paths share a link (host access links included), since
+they would only measure each other. Results are cached for ttl seconds and
+pairs with a fresh result are not measured again.
+
+The iperf processes are started with Popen and polled, so a round is one
+cooperative loop: pass sleep=hub.sleep and run it in a hub.spawn'ed
+thread, and the controller keeps handling events meanwhile. The m command
+is taken from SIMPLE_SWITCH_M_COMMAND, e.g. "python fake_m.py" to stand in
+for it outside of Mininet.
+"""
+
+import collections
+import os
+import shlex
+import subprocess
+import time
+
+# The Mininet utility running a command on a host, split like a shell command line
+M_COMMAND = os.environ.get('SIMPLE_SWITCH_M_COMMAND', '/home/mininet/mininet/util/m')
+# Seconds every iperf client runs
+IPERF_DURATION = 5
+# iperf clients running at the same time
+MAX_CONCURRENT = 4
+# Seconds a measured bandwidth stays valid
+RESULT_TTL = 300
+# Seconds between two checks of the running clients
+POLL_INTERVAL = 0.1
+
+# links: set of frozenset({a, b}) on the path, host access links included
+Measurement = collections.namedtuple('Measurement', 'client server server_ip links')
+
+
+def parse_iperf_csv(output):
+    """
+    Bandwidth in Mbits/sec from the output of iperf -y C, or None if there
+    is no report (e.g. the connection failed). With several streams the
+    last line is their sum.
+    """
+    for line in reversed(output.strip().splitlines()):
+        fields = line.strip().split(',')
+        # timestamp,src,src port,dst,dst port,id,interval,bytes,bits per second
+        if len(fields) >= 9:
+            try:
+                return float(fields[8]) / 1e6
+            except ValueError:
+                continue
+    return None
+
+
+class BandwidthScheduler(object):
+
+    def __init__(self, m_command=M_COMMAND, duration=IPERF_DURATION, max_concurrent=MAX_CONCURRENT,
+                 ttl=RESULT_TTL, sleep=time.sleep, clock=time.time, poll_interval=POLL_INTERVAL):
+        self.m_command = m_command
+        self.duration = duration
+        self.max_concurrent = max_concurrent
+        self.ttl = ttl
+        self.sleep = sleep
+        self.clock = clock
+        self.poll_interval = poll_interval
+        # (client, server) -> (Mbits/sec, time measured)
+        self.results = {}
+        self.running = False
+
+    def command(self, job):
+        return shlex.split(self.m_command) + [job.client, 'iperf', '-t', str(self.duration),
+                '-c', job.server_ip, '-y', 'C']
+
+    def fresh(self, client, server):
+        result = self.results.get((client, server))
+        return result is not None and self.clock() - result[1] < self.ttl
+
+    def bandwidth(self):
+        "{(client, server): Mbits/sec} of the results that have not expired."
+        now = self.clock()
+        return dict((pair, mbps) for pair, (mbps, measured) in self.results.items()
+                    if now - measured < self.ttl)
+
+    def run(self, jobs):
+        """
+        Measure the jobs without a fresh result. Returns {(client, server):
+        Mbits/sec} of the ones measured in this round.
+        """
+        pending = [job for job in jobs if not self.fresh(job.client, job.server)]
+        # Popen -> (job, time started)
+        active = {}
+        busy = set()
+        measured = {}
+        self.running = True
+        try:
+            while pending or active:
+                for job in list(pending):
+                    if len(active) >= self.max_concurrent:
+                        break
+                    if job.links & busy:
+                        continue
+                    pending.remove(job)
+                    try:
+                        proc = subprocess.Popen(self.command(job), stdout=subprocess.PIPE,
+                                                stderr=subprocess.PIPE, stdin=subprocess.PIPE)
+                    except OSError:
+                        # no m command here, the pair stays unmeasured
+                        continue
+                    busy |= job.links
+                    active[proc] = (job, self.clock())
+
+                self.sleep(self.poll_interval)
+                for proc, (job, started) in list(active.items()):
+                    if proc.poll() is None:
+                        if self.clock() - started < self.duration * 2 + 5:
+                            continue
+                        # iperf hangs when the server never answers
+                        proc.kill()
+                    output, _ = proc.communicate()
+                    del active[proc]
+                    busy -= job.links
+                    mbps = parse_iperf_csv(output.decode('utf-8', 'replace'))
+                    if mbps is not None:
+                        self.results[(job.client, job.server)] = (mbps, self.clock())
+                        measured[(job.client, job.server)] = mbps
+        finally:
+            for proc in active:
+                proc.kill()
+            self.running = False
+        return measured
@@ -0,0 +1,40 @@
+#!/usr/bin/python
+
+"""
+Stand-in for Mininet's m utility to try the bandwidth scheduler without a
+network: "fake_m.py h1 iperf -t 5 -c 10.0.0.2 -y C" sleeps for the test
+duration and prints an iperf CSV report.
+
+    FAKE_M_MBPS         reported bandwidth in Mbits/sec (default 9.5)
+    FAKE_M_TIME_SCALE   factor applied to the sleep, e.g. 0.01 (default 1)
+    FAKE_M_UNREACHABLE  comma separated server ips that fail to connect
+    FAKE_M_HANG         comma separated server ips that never answer
+"""
+
+import os
+import sys
+import time
+
+
+def main(argv):
+    args = argv[2:]
+    duration = float(args[args.index('-t') + 1]) if '-t' in args else 10.0
+    server_ip = args[args.index('-c') + 1]
+    if server_ip in os.environ.get('FAKE_M_UNREACHABLE', '').split(','):
+        sys.stderr.write("connect failed: Connection refused\n")
+        return 1
+    if server_ip in os.environ.get('FAKE_M_HANG', '').split(','):
+        # iperf waits forever for a server that accepted but does not answer
+        while True:
+            time.sleep(60)
+
+    time.sleep(duration * float(os.environ.get('FAKE_M_TIME_SCALE', '1')))
+    bps = float(os.environ.get('FAKE_M_MBPS', '9.5')) * 1e6
+    print("%s,10.0.0.%s,5001,%s,5001,3,0.0-%.1f,%d,%d" % (
+        time.strftime('%Y%m%d%H%M%S'), argv[1].lstrip('h'), server_ip, duration,
+        bps * duration / 8, bps))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -24,9 +24,11 @@ from ryu.lib.packet import ether_types
 from ryu.topology import event
 # Below is the library used for topo discovery
 from ryu.topology.api import get_switch, get_link, get_host
+from ryu.lib import hub
 
 import copy
-import subprocess
+
+from bandwidth_scheduler import BandwidthScheduler, Measurement
 
 class SimpleSwitch13(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
@@ -44,6 +46,8 @@ class SimpleSwitch13(app_manager.RyuApp):
         self.MAX_COUNT = 300
         # Count to print topology data after convergence
         self.count = 0
+        # Runs the iperf measurements in the background, several at once when their paths are disjoint
+        self.bandwidth_scheduler = BandwidthScheduler(sleep=hub.sleep)
 
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
@@ -156,14 +160,16 @@ class SimpleSwitch13(app_manager.RyuApp):
         self.count = self.count + 1
         if self.count%self.MAX_COUNT == 0:
             self.print_topo()
-            print("***Measuring Bandwidth***")
             self.measure_bandwidth()
-            print("Link Costs: {}".format(self.bandwidth))
 
     """
-    Measure the bandwidth between hosts by using iperf
+    Measure the bandwidth between hosts by using iperf. The measurements run in a separate thread,
+    the results land in self.bandwidth when the round is over
     """
     def measure_bandwidth(self):
+        if self.bandwidth_scheduler.running:
+            return
+        jobs = []
         for s in self.topo_raw_hosts.keys():
             hs = 'h' + str(s)
             hs_ip = '10.0.0.' + str(s)
@@ -172,21 +178,37 @@ class SimpleSwitch13(app_manager.RyuApp):
                 if c == s:
                     continue
                 hc = 'h' + str(c)
-                print("iperf --server on {} with ip {} and iperf --client in {}".format(hs, hs_ip, hc))
-                c_result = subprocess.Popen(['/home/mininet/mininet/util/m', hc, 'iperf', '-t 5', '-c', hs_ip], stdout=subprocess.PIPE, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
-                client_log = str(c_result.communicate())
-
-                # if the client not able to reach the server: continue
-                if 'connect failed' in client_log:
-                    continue
+                jobs.append(Measurement(hc, hs, hs_ip, self.path_links(c, s)))
+        print("***Measuring Bandwidth***")
+        hub.spawn(self._measure_round, jobs)
 
-                # parse iperf client log and fetch bandwidth value
-                bw = client_log
-                bw = bw.split("Mbits/sec")[0]
-                bw = bw.rstrip().split(" ")[-1]
+    def _measure_round(self, jobs):
+        measured = self.bandwidth_scheduler.run(jobs)
+        # save the link-costs, the ones measured in an earlier round stay until they expire
+        self.bandwidth = self.bandwidth_scheduler.bandwidth()
+        print("Measured {} of {} host pairs".format(len(measured), len(jobs)))
+        print("Link Costs: {}".format(self.bandwidth))
 
-                # save the link-cost
-                self.bandwidth[(hc, hs)] = float(bw)
+    """
+    Links on the path between the hosts attached to the switches c and s, the access links included
+    """
+    def path_links(self, c, s):
+        neighbors = {}
+        for l in self.topo_raw_links:
+            neighbors.setdefault(l.src.dpid, set()).add(l.dst.dpid)
+        parent = {c: None}
+        queue = [c]
+        for u in queue:
+            for v in neighbors.get(u, ()):
+                if v not in parent:
+                    parent[v] = u
+                    queue.append(v)
+        links = set([frozenset(('h' + str(c), c)), frozenset(('h' + str(s), s))])
+        v = s
+        while parent.get(v) is not None:
+            links.add(frozenset((parent[v], v)))
+            v = parent[v]
+        return links
 
 
     """
@@ -0,0 +1,133 @@
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import bandwidth_scheduler
+from bandwidth_scheduler import BandwidthScheduler, Measurement, parse_iperf_csv
+
+FAKE_M = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fake_m.py')
+_Popen = subprocess.Popen
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # the clients run in real time, the scheduler's timeouts in scheduler time
+        time.sleep(0.01)
+        self.now += seconds
+
+
+def job(client, server, *links):
+    return Measurement(client, server, '10.0.0.%s' % server.lstrip('h'),
+                       frozenset(frozenset(link) for link in links))
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    "The server ips of the iperf clients in the order they started and ended."
+    monkeypatch.setenv('FAKE_M_TIME_SCALE', '0.02')
+    monkeypatch.setenv('FAKE_M_MBPS', '7.5')
+    events = []
+
+    class Popen(_Popen):
+        def __init__(self, args, **kwargs):
+            _Popen.__init__(self, args, **kwargs)
+            self.server_ip = args[args.index('-c') + 1]
+            events.append(('start', self.server_ip))
+
+        def communicate(self, *args, **kwargs):
+            events.append(('end', self.server_ip))
+            return _Popen.communicate(self, *args, **kwargs)
+
+    monkeypatch.setattr(bandwidth_scheduler.subprocess, 'Popen', Popen)
+    return events
+
+
+def make_scheduler(clock, **kwargs):
+    return BandwidthScheduler(m_command='%s %s' % (sys.executable, FAKE_M), duration=5, sleep=clock.sleep,
+                              clock=clock, poll_interval=0.5, **kwargs)
+
+
+def test_parse_iperf_csv():
+    assert parse_iperf_csv('20240101,10.0.0.1,5001,10.0.0.2,5001,3,0.0-5.0,5937500,9500000\n') == 9.5
+    assert parse_iperf_csv('connect failed\n') is None
+
+
+def test_the_m_command_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv('SIMPLE_SWITCH_M_COMMAND', 'python fake_m.py')
+    try:
+        reloaded = importlib.reload(bandwidth_scheduler)
+        assert reloaded.M_COMMAND == 'python fake_m.py'
+        command = reloaded.BandwidthScheduler().command(job('h1', 'h2'))
+        assert command[:3] == ['python', 'fake_m.py', 'h1']
+    finally:
+        monkeypatch.delenv('SIMPLE_SWITCH_M_COMMAND')
+        importlib.reload(bandwidth_scheduler)
+
+
+def test_clients_sharing_a_link_never_run_together(clients):
+    jobs = [
+        job('h1', 'h2', ('h1', 1), (1, 2), (2, 'h2')),
+        job('h3', 'h4', ('h3', 1), (1, 2), (2, 'h4')),
+        job('h5', 'h6', ('h5', 3), (3, 'h6')),
+        job('h7', 'h8', ('h7', 4), (4, 'h8')),
+    ]
+    links = dict((j.server_ip, j.links) for j in jobs)
+    scheduler = make_scheduler(FakeClock(), max_concurrent=2)
+    measured = scheduler.run(jobs)
+    assert measured == dict(((j.client, j.server), 7.5) for j in jobs)
+
+    running = set()
+    overlap = False
+    for event, server_ip in clients:
+        if event == 'start':
+            assert all(not links[server_ip] & links[other] for other in running)
+            running.add(server_ip)
+            assert len(running) <= 2
+            overlap = overlap or len(running) == 2
+        else:
+            running.discard(server_ip)
+    # the independent clients did run at the same time
+    assert overlap
+    assert not scheduler.running
+
+
+def test_fresh_results_are_not_measured_again(clients):
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, ttl=300)
+    pair = job('h1', 'h2', ('h1', 1), (1, 'h2'))
+    assert scheduler.run([pair]) == {('h1', 'h2'): 7.5}
+    assert scheduler.run([pair]) == {}
+    assert len(clients) == 2
+    assert scheduler.bandwidth() == {('h1', 'h2'): 7.5}
+
+    clock.now += 300
+    assert scheduler.bandwidth() == {}
+    assert scheduler.run([pair]) == {('h1', 'h2'): 7.5}
+    assert len(clients) == 4
+
+
+def test_hung_and_failed_clients_are_given_up(clients, monkeypatch):
+    monkeypatch.setenv('FAKE_M_HANG', '10.0.0.2')
+    monkeypatch.setenv('FAKE_M_UNREACHABLE', '10.0.0.4')
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    hung = job('h1', 'h2', ('h1', 1), (1, 'h2'))
+    blocked = job('h5', 'h6', ('h5', 1), (1, 'h2'), (1, 'h6'))
+    started = clock()
+    measured = scheduler.run([hung, job('h3', 'h4'), blocked])
+    # killed once it ran for twice the test duration and 5 seconds
+    assert clock() - started >= scheduler.duration * 2 + 5
+    assert measured == {('h5', 'h6'): 7.5}
+    # the client sharing a link with the hung one only started after it was killed
+    assert clients.index(('end', '10.0.0.2')) < clients.index(('start', '10.0.0.6'))
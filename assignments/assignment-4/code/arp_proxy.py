@@ -0,0 +1,105 @@
+"""
+Controller-side ARP responder.
+
+The sender fields of every ARP packet seen (and the addresses reported by
+the host discovery) fill an IPv4 -> MAC table. A request for an address in
+that table whose MAC is still in the host-location table is answered by the
+controller straight away with a reply packet-out on the port it came in on,
+so it is never broadcast through the network. Requests that cannot be
+answered are left to the caller to flood.
+
+The ARP header is read with struct like the ethernet header in ethframe.
+"""
+
+import struct
+
+from ethframe import ETH_HEADER_LEN, ETH_TYPE_8021Q, ETH_TYPE_ARP
+from host_locator import mac_to_int
+
+ARP_REQUEST = 1
+ARP_REPLY = 2
+
+# htype, ptype, hlen, plen, opcode, sha (16 + 32 bit), spa, tha (16 + 32 bit), tpa
+_ARP = struct.Struct('!HHBBHHIIHII')
+_ETH_TYPE = struct.Struct('!H')
+_ETH_HEADER = struct.Struct('!HIHIH')
+_ARP_IPV4 = (1, 0x0800, 6, 4)
+
+
+def parse_arp(data):
+    """
+    Return (opcode, sender mac, sender ip, target mac, target ip) of an
+    Ethernet/IPv4 ARP frame, with every address as an integer, or None if
+    data does not hold one.
+    """
+    offset = ETH_HEADER_LEN
+    if len(data) >= ETH_HEADER_LEN + 4 and _ETH_TYPE.unpack_from(data, 12)[0] == ETH_TYPE_8021Q:
+        offset += 4
+    if len(data) < offset + _ARP.size:
+        return None
+    (htype, ptype, hlen, plen, opcode,
+     sha_hi, sha_lo, spa, tha_hi, tha_lo, tpa) = _ARP.unpack_from(data, offset)
+    if (htype, ptype, hlen, plen) != _ARP_IPV4:
+        return None
+    return opcode, (sha_hi << 32) | sha_lo, spa, (tha_hi << 32) | tha_lo, tpa
+
+
+def arp_reply(src_mac, src_ip, dst_mac, dst_ip):
+    "Ethernet frame of an ARP reply telling dst that src_ip is at src_mac."
+    return _ETH_HEADER.pack(dst_mac >> 32, dst_mac & 0xffffffff, src_mac >> 32,
+                            src_mac & 0xffffffff, ETH_TYPE_ARP) + \
+        _ARP.pack(1, 0x0800, 6, 4, ARP_REPLY, src_mac >> 32, src_mac & 0xffffffff, src_ip,
+                  dst_mac >> 32, dst_mac & 0xffffffff, dst_ip)
+
+
+def ip_to_int(ip):
+    "'10.0.0.1' -> 167772161"
+    a, b, c, d = (int(x) for x in ip.split('.'))
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+
+class ArpProxy(object):
+
+    def __init__(self, hosts):
+        # the HostLocator; only hosts it still knows are answered for
+        self.hosts = hosts
+        # ip (int) -> mac (int)
+        self.ip_to_mac = {}
+        self.answered = 0
+        self.missed = 0
+
+    def learn(self, ip, mac):
+        "Addresses may be given as strings or integers."
+        if isinstance(ip, str):
+            ip = ip_to_int(ip)
+        self.ip_to_mac[ip] = mac_to_int(mac)
+
+    def forget(self, mac):
+        "Drop the addresses of mac. Returns how many there were."
+        mac = mac_to_int(mac)
+        ips = [ip for ip, known in self.ip_to_mac.items() if known == mac]
+        for ip in ips:
+            del self.ip_to_mac[ip]
+        return len(ips)
+
+    def handle(self, data):
+        """
+        Learn from an ARP frame and return the frame of the reply to send
+        back, or None if it is not a request the controller can answer.
+        """
+        arp = parse_arp(data)
+        if arp is None:
+            return None
+        opcode, sha, spa, tha, tpa = arp
+        if spa:
+            # 0.0.0.0 is an address probe, nothing to learn from it
+            self.learn(spa, sha)
+        if opcode != ARP_REQUEST or spa == tpa:
+            # replies and gratuitous ARP are passed on
+            return None
+        mac = self.ip_to_mac.get(tpa)
+        if mac is None or mac not in self.hosts:
+            self.missed += 1
+            return None
+        self.answered += 1
+        return arp_reply(mac, tpa, sha, spa)
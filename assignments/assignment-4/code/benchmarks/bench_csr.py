@@ -0,0 +1,101 @@
+#!/usr/bin/python
+
+"""
+Memory and runtime of the CSR topology graph against the dict representation.
+
+    python benchmarks/bench_csr.py [--sizes 1000,10000] [--all-pairs-max 2000]
+
+For every size it reports the memory held by each representation, one
+single-source shortest path computation, and (up to --all-pairs-max
+switches) the all-pairs computation: Dijkstra from every source on the dict
+vs CSRGraph.all_pairs().
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+# the controller modules live one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import routing
+from bench_routing import random_topo
+from csr_graph import CSRGraph
+
+
+def measure(build):
+    "Return (result, bytes allocated by build())."
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def int_topo(n):
+    topo = random_topo(n)
+    return dict((int(u), dict((int(v), w) for v, w in nbrs.items())) for u, nbrs in topo.items())
+
+
+def link_ports(topo):
+    "Made-up egress port numbers, the dict side keeps them in a second map."
+    ports = {}
+    for u, nbrs in topo.items():
+        for i, v in enumerate(nbrs):
+            ports[(u, v)] = i + 1
+    return ports
+
+
+def bench(n, all_pairs_max):
+    topo, dict_bytes = measure(lambda: int_topo(n))
+    ports, port_bytes = measure(lambda: link_ports(topo))
+    graph = CSRGraph.from_adjacency(topo, ports)
+
+    src = min(topo)
+    _, dict_sssp = timed(lambda: routing.shortest_path_tree(topo, src))
+    graph.shortest_paths(0)
+    _, csr_sssp = timed(lambda: graph.shortest_paths(0))
+
+    row = {
+        'n': n,
+        'dict_mem': dict_bytes + port_bytes,
+        'csr_mem': graph.nbytes,
+        'dict_sssp': dict_sssp,
+        'csr_sssp': csr_sssp,
+    }
+    if n <= all_pairs_max:
+        _, row['dict_apsp'] = timed(lambda: [routing.shortest_path_tree(topo, s) for s in topo])
+        (dist, _), row['csr_apsp'] = timed(graph.all_pairs)
+        row['matrix_mem'] = dist.nbytes * 1.5
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000')
+    parser.add_argument('--all-pairs-max', type=int, default=2000)
+    args = parser.parse_args()
+
+    for n in [int(s) for s in args.sizes.split(',')]:
+        row = bench(n, args.all_pairs_max)
+        print("%d switches" % n)
+        print("  memory      dict %10.1f KiB   csr %10.1f KiB   (%.1fx smaller)" % (
+            row['dict_mem'] / 1024.0, row['csr_mem'] / 1024.0, float(row['dict_mem']) / row['csr_mem']))
+        print("  one source  dict %10.2f ms    csr %10.2f ms" % (row['dict_sssp'] * 1e3, row['csr_sssp'] * 1e3))
+        if 'dict_apsp' in row:
+            print("  all pairs   dict %10.2f s     csr %10.2f s    (distance + next-hop matrices %.1f MiB)" % (
+                row['dict_apsp'], row['csr_apsp'], row['matrix_mem'] / 2.0 ** 20))
+        else:
+            print("  all pairs   skipped above %d switches" % args.all_pairs_max)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/python
+
+"""
+Flow entries the forwarding modes leave on the switches, measured.
+
+    python benchmarks/bench_flow_entries.py [--sizes 20,50] [--hosts-per-switch 2]
+        [--modes path,sink_tree]
+
+For every topology and forwarding mode a SimpleSwitch13 is started on the
+FakeDatapaths of bench_replay and every host sends one IPv4 frame to every
+other host, handed to the controller as the packet-in of its ingress
+switch. The FlowMods written to each fake switch are decoded and applied
+to a model of its flow tables (adds, strict and non-strict deletes, by
+cookie too), so what is reported is what the switches would hold once the
+all-pairs traffic went through: the entries in the classifier table (0)
+and the forwarding table (1), their total and the fullest switch, and the
+FlowMods it took. Entries do not time out during the run and the flow
+table budget of the controller is lifted, so nothing is evicted.
+
+The sample topologies of assignment 3 and 4 are measured with their real
+hosts, the generated ones are random_topo graphs with hosts-per-switch
+hosts on every switch.
+"""
+
+import argparse
+import os
+import struct
+import sys
+
+from ryu.lib.packet import ethernet, ether_types, ipv4, packet
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+# the controller modules live one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_replay import (SAMPLE_TOPOLOGIES, build_topology, load_controller, packet_in, sample_topo, settle,
+                          start)
+from bench_routing import random_topo
+from fake_datapath import FakeDatapath
+
+# cookie, cookie mask, table id, command, idle/hard timeout, priority, buffer id, out port/group,
+# flags: the OFPFlowMod fields between the header and the match
+_FLOW_MOD = struct.Struct('!QQBBHHHIIIH2x')
+_HEADER_LEN = 8
+
+
+class FlowTableDatapath(FakeDatapath):
+    "A FakeDatapath that also keeps the flow tables its FlowMods would leave on the switch."
+
+    def __init__(self, dpid):
+        FakeDatapath.__init__(self, dpid)
+        # table id -> {(priority, match items): cookie}
+        self.tables = {}
+        self.flow_mods = 0
+
+    def send(self, buf):
+        FakeDatapath.send(self, buf)
+        offset = 0
+        while offset < len(buf):
+            _, msg_type, length, _ = struct.unpack_from('!BBHI', buf, offset)
+            if msg_type == ofproto_v1_3.OFPT_FLOW_MOD:
+                self._flow_mod(buf, offset)
+            offset += length
+
+    def _flow_mod(self, buf, offset):
+        self.flow_mods += 1
+        (cookie, cookie_mask, table_id, command, _, _, priority, _, _, _,
+         _) = _FLOW_MOD.unpack_from(buf, offset + _HEADER_LEN)
+        match = ofproto_v1_3_parser.OFPMatch.parser(bytes(buf), offset + _HEADER_LEN + _FLOW_MOD.size)
+        match = tuple(match.items())
+        if command == ofproto_v1_3.OFPFC_ADD:
+            self.tables.setdefault(table_id, {})[(priority, match)] = cookie
+            return
+        if command not in (ofproto_v1_3.OFPFC_DELETE, ofproto_v1_3.OFPFC_DELETE_STRICT):
+            return
+        strict = command == ofproto_v1_3.OFPFC_DELETE_STRICT
+        fields = set(match)
+        for tid, entries in self.tables.items():
+            if table_id not in (tid, ofproto_v1_3.OFPTT_ALL):
+                continue
+            for key, entry_cookie in list(entries.items()):
+                if cookie_mask and entry_cookie & cookie_mask != cookie & cookie_mask:
+                    continue
+                if key == (priority, match) if strict else fields <= set(key[1]):
+                    del entries[key]
+
+    def entries(self, table_id):
+        return len(self.tables.get(table_id, ()))
+
+
+def frame(src, dst):
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst=dst.mac, src=src.mac, ethertype=ether_types.ETH_TYPE_IP))
+    pkt.add_protocol(ipv4.ipv4(src=src.ipv4[0], dst=dst.ipv4[0], proto=17))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def measure(controller, topo, hosts_per_switch, forwarding):
+    "The FlowTableDatapaths after every host sent a frame to every other host."
+    datapaths, switches, links, hosts = build_topology(topo, hosts_per_switch, FlowTableDatapath)
+    app = start(controller, datapaths, switches, links, hosts, forwarding)
+    for dpid in datapaths:
+        app.flow_tables.set_budget(dpid, sys.maxsize)
+    for src in hosts:
+        for dst in hosts:
+            if src is not dst:
+                dp = datapaths[src.port.dpid]
+                app._packet_in_handler(packet_in(dp, src.port.port_no, frame(src, dst)))
+                settle(app, datapaths)
+    settle(app, datapaths, flush_all=True)
+    app.close()
+    return datapaths, len(hosts)
+
+
+def report(controller, name, topo, hosts_per_switch, modes):
+    for forwarding in modes:
+        datapaths, hosts = measure(controller, topo, hosts_per_switch, forwarding)
+        classifier = sum(dp.entries(controller.CLASSIFIER_TABLE) for dp in datapaths.values())
+        forward = sum(dp.entries(controller.FORWARD_TABLE) for dp in datapaths.values())
+        fullest = max(sum(len(entries) for entries in dp.tables.values()) for dp in datapaths.values())
+        print("{:<16} {:<14} {:>8} {:>6} {:>10} {:>10} {:>10} {:>8} {:>10}".format(
+            name, forwarding, len(topo), hosts, classifier, forward, classifier + forward, fullest,
+            sum(dp.flow_mods for dp in datapaths.values())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='20,50')
+    parser.add_argument('--hosts-per-switch', type=int, default=2)
+    parser.add_argument('--modes', default='path,sink_tree',
+                        help='comma separated forwarding modes (path, sink_tree, ecmp, fast_failover)')
+    args = parser.parse_args()
+    modes = args.modes.split(',')
+    controller = load_controller()
+
+    print("{:<16} {:<14} {:>8} {:>6} {:>10} {:>10} {:>10} {:>8} {:>10}".format(
+        'topology', 'forwarding', 'switches', 'hosts', 'table 0', 'table 1', 'total', 'max', 'flowmods'))
+    for name, (links, hosts) in sorted(SAMPLE_TOPOLOGIES.items()):
+        report(controller, name, sample_topo(links), hosts, modes)
+    for n in [int(s) for s in args.sizes.split(',')]:
+        topo = dict((int(dpid), dict((int(nbr), cost) for nbr, cost in neighbors.items()))
+                    for dpid, neighbors in random_topo(n).items())
+        report(controller, 'random-%d' % n, topo, dict((dpid, args.hosts_per_switch) for dpid in topo), modes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/python
+
+"""
+Packet-in latency while the routes are recomputed, inline or in the RouteService pool.
+
+    python benchmarks/bench_offload.py [--switches 1000] [--rate 100]
+        [--duration 8] [--changes 4] [--links 4] [--forwarding ecmp]
+
+A SimpleSwitch13 on the FakeDatapaths of bench_replay is driven the way the
+hub drives it: one thread handles the packet-ins, arriving at --rate per
+second, and does the background work (barrier replies, loading the results
+of the worker pool) while it waits for the next one. --changes times during
+the run --links random links fail or come back, in both directions, and the
+batch is applied on that same thread as the convergence thread would.
+
+The latency of a packet-in is counted from its arrival, so the time it
+waited behind a recomputation is included. It is reported over the whole
+run and over the packet-ins that arrived while the routes were being
+recomputed, from a change until the trees and next hops were up to date
+again, once with the recomputation inline and once in the worker pool,
+along with how long applying a change blocked the thread and how long the
+routes took to converge. The workers need cores of their own: on a single
+core they share it with the event loop and converge later.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from ryu.topology import event
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_replay import build_topology, load_controller, packet_in, replay, settle, start, synthetic_events
+from bench_routing import random_topo
+from profiling import LatencyHistogram
+
+# Seconds slept at most while waiting for the next packet-in
+IDLE_SLEEP = 0.0005
+
+
+def wait_routes(app, datapaths):
+    "Let the pending route jobs finish and load them."
+    while app.route_service.jobs:
+        time.sleep(IDLE_SLEEP)
+        app.collect_routes()
+    settle(app, datapaths, flush_all=True)
+
+
+def change_links(app, by_ends, pairs, up):
+    for a, b in pairs:
+        for link in (by_ends[(a, b)], by_ends[(b, a)]):
+            if up:
+                app.handler_link_add(event.EventLinkAdd(link))
+            else:
+                app.handler_link_delete(event.EventLinkDelete(link))
+
+
+def run(controller, topo, args, offload):
+    hosts_per_switch = dict((dpid, 1) for dpid in topo)
+    datapaths, switches, links, hosts = build_topology(topo, hosts_per_switch)
+    app = start(controller, datapaths, switches, links, hosts, args.forwarding)
+    wait_routes(app, datapaths)
+    # every topology is offloaded, or none
+    app.route_service.min_switches = 0 if offload else len(topo) + 1
+
+    count = int(args.rate * args.duration)
+    events = synthetic_events(hosts, args.flows * 2 + count, args.flows, args.seed)
+    # the first packets of every flow install its destination, so the changes have rules to refresh
+    replay(app, datapaths, events[:args.flows * 2], 0)
+    wait_routes(app, datapaths)
+    evs = [packet_in(datapaths[dpid], in_port, data) for dpid, in_port, data in events[args.flows * 2:]]
+
+    rnd = random.Random(args.seed)
+    by_ends = dict(((link.src.dpid, link.dst.dpid), link) for link in links)
+    pairs = rnd.sample(sorted((a, b) for a, b in by_ends if a < b), args.links)
+    change_times = [args.duration * (k + 1) / float(args.changes + 1) for k in range(args.changes)]
+
+    arrivals, latencies = [], []
+    # (change applied, routes converged) in seconds from the start, and the seconds blocked applying
+    windows, blocked = [], []
+    changed_at = None
+    begin = time.perf_counter()
+    i = 0
+    while i < len(evs):
+        now = time.perf_counter() - begin
+        if len(windows) < len(change_times) and now >= change_times[len(windows)] and changed_at is None:
+            change_links(app, by_ends, pairs, up=len(windows) % 2 == 1)
+            changed_at = now
+            app.convergence.flush()
+            settle(app, datapaths)
+            blocked.append(time.perf_counter() - begin - now)
+        if changed_at is not None and not app.route_service.jobs:
+            windows.append((changed_at, time.perf_counter() - begin))
+            changed_at = None
+        arrival = i / float(args.rate)
+        if now < arrival:
+            app.collect_routes()
+            settle(app, datapaths)
+            time.sleep(min(arrival - now, IDLE_SLEEP))
+            continue
+        app._packet_in_handler(evs[i])
+        settle(app, datapaths)
+        arrivals.append(arrival)
+        latencies.append(time.perf_counter() - begin - arrival)
+        i += 1
+    wait_routes(app, datapaths)
+    app.route_service.close()
+
+    overall, during = LatencyHistogram(), LatencyHistogram()
+    for arrival, latency in zip(arrivals, latencies):
+        overall.record(int(latency * 1e9))
+        if any(start <= arrival < end for start, end in windows):
+            during.record(int(latency * 1e9))
+    return {
+        'overall': overall,
+        'during': during,
+        'blocked': max(blocked) if blocked else 0.0,
+        'converged': max(end - start for start, end in windows) if windows else 0.0,
+        'stats': app.route_service.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--switches', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=100, help='packet-ins per second')
+    parser.add_argument('--duration', type=float, default=8)
+    parser.add_argument('--changes', type=int, default=4)
+    parser.add_argument('--links', type=int, default=4, help='links failing (or recovering) per change')
+    parser.add_argument('--flows', type=int, default=100)
+    parser.add_argument('--forwarding', default='ecmp', choices=['path', 'sink_tree', 'ecmp'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    topo = dict((int(dpid), dict((int(n), cost) for n, cost in neighbors.items()))
+                for dpid, neighbors in random_topo(args.switches, seed=args.seed).items())
+    controller = load_controller()
+    if 2 * args.links < controller.REBUILD_MIN_CHANGES:
+        sys.exit("--links %d is repaired link by link, use at least %d" % (
+            args.links, (controller.REBUILD_MIN_CHANGES + 1) // 2))
+
+    print("topology: random-%d, %d links, %s forwarding, %.0f packet-ins/s, %d changes of %d links" % (
+        args.switches, sum(len(n) for n in topo.values()), args.forwarding, args.rate, args.changes,
+        args.links))
+    print("{:<8} {:>10} {:>10} {:>10} {:>16} {:>16} {:>12} {:>15}".format(
+        'routes', 'p50 (us)', 'p99 (us)', 'max (ms)', 'recomp p99 (ms)', 'recomp max (ms)',
+        'blocked (ms)', 'converged (ms)'))
+    for mode in ('inline', 'offload'):
+        row = run(controller, topo, args, mode == 'offload')
+        overall, during = row['overall'], row['during']
+        print("{:<8} {:>10.1f} {:>10.1f} {:>10.2f} {:>16.2f} {:>16.2f} {:>12.2f} {:>15.2f}".format(
+            mode, overall.percentile(50) / 1e3, overall.percentile(99) / 1e3, overall.max / 1e6,
+            during.percentile(99) / 1e6 if during.count else 0.0, during.max / 1e6 if during.count else 0.0,
+            row['blocked'] * 1e3, row['converged'] * 1e3))
+
+
+if __name__ == '__main__':
+    main()
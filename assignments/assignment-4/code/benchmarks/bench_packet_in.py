@@ -0,0 +1,118 @@
+#!/usr/bin/python
+
+"""
+Packet-in decoding rate: full ryu packet.Packet parse vs the ethframe fast path.
+
+    python benchmarks/bench_packet_in.py [--pcap capture.pcap] [--frames 20000]
+
+Without --pcap a mix of ARP, IPv4/TCP and LLDP frames between the hosts of
+topo.py is generated.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from ryu.lib import pcaplib
+from ryu.lib.packet import arp, ethernet, ether_types, ipv4, lldp, packet, tcp
+
+# the controller modules live one level up; appended (not prepended) so
+# that code/ryu.py does not shadow the ryu package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ethframe import ETH_TYPE_LLDP, parse_eth
+from host_locator import int_to_mac
+
+HOST_IDS = [1, 2, 4, 5, 6]
+
+
+def synthetic_frames(count, seed=0):
+    rnd = random.Random(seed)
+    frames = []
+    for _ in range(count):
+        s, d = rnd.sample(HOST_IDS, 2)
+        src, dst = int_to_mac(s), int_to_mac(d)
+        src_ip, dst_ip = '10.0.0.%d' % s, '10.0.0.%d' % d
+        kind = rnd.random()
+        pkt = packet.Packet()
+        if kind < 0.2:
+            pkt.add_protocol(ethernet.ethernet(dst='ff:ff:ff:ff:ff:ff', src=src,
+                                               ethertype=ether_types.ETH_TYPE_ARP))
+            pkt.add_protocol(arp.arp_ip(arp.ARP_REQUEST, src, src_ip, '00:00:00:00:00:00', dst_ip))
+        elif kind < 0.3:
+            pkt.add_protocol(ethernet.ethernet(dst=lldp.LLDP_MAC_NEAREST_BRIDGE, src=src,
+                                               ethertype=ether_types.ETH_TYPE_LLDP))
+            tlvs = (lldp.ChassisID(subtype=lldp.ChassisID.SUB_LOCALLY_ASSIGNED, chassis_id=b'dpid:1'),
+                    lldp.PortID(subtype=lldp.PortID.SUB_PORT_COMPONENT, port_id=b'\x00\x01'),
+                    lldp.TTL(ttl=120), lldp.End())
+            pkt.add_protocol(lldp.lldp(tlvs))
+        else:
+            pkt.add_protocol(ethernet.ethernet(dst=dst, src=src, ethertype=ether_types.ETH_TYPE_IP))
+            pkt.add_protocol(ipv4.ipv4(src=src_ip, dst=dst_ip, proto=6))
+            pkt.add_protocol(tcp.tcp(src_port=rnd.randint(1024, 65535), dst_port=5001))
+            pkt.add_protocol(b'\x00' * 64)
+        pkt.serialize()
+        frames.append(bytes(pkt.data))
+    return frames
+
+
+def pcap_frames(path, count):
+    frames = []
+    with open(path, 'rb') as f:
+        for _, buf in pcaplib.Reader(f):
+            frames.append(bytes(buf))
+            if len(frames) >= count:
+                break
+    return frames
+
+
+def full_parse(frames):
+    for data in frames:
+        pkt = packet.Packet(data)
+        eth = pkt.get_protocols(ethernet.ethernet)[0]
+        if eth.ethertype == ether_types.ETH_TYPE_LLDP:
+            continue
+        eth.src, eth.dst
+
+
+def fast_parse(frames):
+    for data in frames:
+        dst, src, ethertype = parse_eth(data)
+        if ethertype == ETH_TYPE_LLDP:
+            continue
+        int_to_mac(src), int_to_mac(dst)
+
+
+def rate(func, frames, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(frames)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(frames) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pcap', help='replay the frames of a capture file')
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.pcap:
+        frames = pcap_frames(args.pcap, args.frames)
+    else:
+        frames = synthetic_frames(args.frames)
+
+    before = rate(full_parse, frames, args.repeat)
+    after = rate(fast_parse, frames, args.repeat)
+    print("frames:               %d" % len(frames))
+    print("packet.Packet parse:  %12.0f packet-ins/s" % before)
+    print("ethframe fast path:   %12.0f packet-ins/s (%.1fx)" % (after, after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/python
+
+"""
+Offline replay of packet-ins through SimpleSwitch13, without Mininet or OVS.
+
+    python benchmarks/bench_replay.py [--topo assignment-4 | --switches 100]
+        [--events 20000] [--rate 0] [--pcap capture.pcap] [--forwarding ecmp]
+
+The app is created with FakeDatapath objects that serialize and record what
+would be written to the switches, the topology is announced with the
+discovery events, and the packet-ins are then handed to _packet_in_handler
+one by one, at --rate per second or as fast as possible (0). Every barrier
+request is answered at once, so the packet-ins held back by the inflight
+table are released as on a live switch. The fake switches have no flow
+table: every frame comes back as a packet-in, as with cbench.
+
+Without --pcap the frames are synthetic flows between the hosts of the
+topology, an ARP request for the first frame of a flow and IPv4 after. With
+--pcap the frames of a capture are replayed at the switch of their source
+host; frames from unknown sources are skipped.
+
+Reported: packet-ins/s, the latency of each event (handler, flushes and
+barrier replies) and the messages emitted per type.
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+
+from ryu.controller import ofp_event
+from ryu.controller.handler import MAIN_DISPATCHER
+from ryu.lib import pcaplib
+from ryu.lib.packet import arp, ethernet, ether_types, ipv4, packet, tcp
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+from ryu.topology import event
+from ryu.topology.switches import Host, Link, Port, Switch
+
+# the controller modules live one level up; appended (not prepended) so
+# that code/ryu.py does not shadow the ryu package
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(CODE_DIR)
+
+from bench_routing import random_topo
+from ethframe import parse_eth
+from fake_datapath import FakeDatapath
+from host_locator import int_to_mac
+from profiling import LatencyHistogram
+
+# the switch links and the hosts per switch of the MyTopo of each assignment
+SAMPLE_TOPOLOGIES = {
+    'assignment-3': ([(1, 2), (1, 3), (1, 5), (3, 4), (5, 6)],
+                     {1: 1, 2: 1, 3: 1, 4: 1, 5: 1, 6: 1}),
+    'assignment-4': ([(1, 2), (1, 3), (1, 5), (2, 3), (2, 4), (3, 4), (4, 6), (5, 6)],
+                     {1: 1, 2: 1, 4: 1, 5: 1, 6: 1}),
+}
+
+
+def sample_topo(links):
+    "{dpid: {dpid: 1}} of the undirected links of a sample topology."
+    topo = {}
+    for a, b in links:
+        topo.setdefault(a, {})[b] = 1
+        topo.setdefault(b, {})[a] = 1
+    return topo
+
+
+def load_controller():
+    "code/ryu.py, imported under another name since it would shadow the ryu package."
+    spec = importlib.util.spec_from_file_location('controller', os.path.join(CODE_DIR, 'ryu.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _add_port(ports, dpid):
+    "A new OFPPort on the switch dpid, as the Port of the discovery objects."
+    port_no = len(ports[dpid]) + 1
+    ofpport = ofproto_v1_3_parser.OFPPort(port_no, '00:00:00:00:00:00', 's%d-eth%d' % (dpid, port_no),
+                                          0, 0, 0, 0, 0, 0, 0, 0)
+    ports[dpid].append(ofpport)
+    return Port(dpid, ofproto_v1_3, ofpport)
+
+
+def build_topology(topo, hosts_per_switch, datapath_class=FakeDatapath):
+    """
+    FakeDatapaths (or datapath_class), discovery objects and hosts for a
+    {dpid: {dpid: cost}} topology with hosts_per_switch[dpid] hosts. Host
+    ports come first on every switch. Returns (datapaths, switches, links,
+    hosts), hosts being the ryu Host objects. Host k of switch dpid is numbered
+    n = k * max(dpid) + dpid, so the first host of a switch matches topo.py,
+    and has the mac int_to_mac(n) and the ip 10.0.0.n (n spread over the
+    last three bytes).
+    """
+    datapaths = dict((dpid, datapath_class(dpid)) for dpid in topo)
+    ports = dict((dpid, []) for dpid in topo)
+    hosts = []
+    for dpid in sorted(topo):
+        for k in range(hosts_per_switch.get(dpid, 0)):
+            n = k * max(topo) + dpid
+            host = Host(int_to_mac(n), _add_port(ports, dpid))
+            host.ipv4 = ['10.%d.%d.%d' % (n >> 16 & 0xff, n >> 8 & 0xff, n & 0xff)]
+            hosts.append(host)
+    links = []
+    for a in sorted(topo):
+        for b in sorted(topo[a]):
+            if a < b:
+                pa, pb = _add_port(ports, a), _add_port(ports, b)
+                links.extend([Link(pa, pb), Link(pb, pa)])
+    switches = []
+    for dpid in sorted(topo):
+        switch = Switch(datapaths[dpid])
+        for ofpport in ports[dpid]:
+            switch.add_port(ofpport)
+        switches.append(switch)
+    return datapaths, switches, links, hosts
+
+
+def start(controller, datapaths, switches, links, hosts, forwarding):
+    "A SimpleSwitch13 that went through the connection and discovery events of the topology."
+    # start cold, not from the snapshot of a controller that ran on this machine
+    controller.SNAPSHOT_PATH = None
+    controller.FORWARDING = forwarding
+    app = controller.SimpleSwitch13()
+    for switch in switches:
+        app.handler_switch_enter(event.EventSwitchEnter(switch))
+    for dp in datapaths.values():
+        state = ofp_event.EventOFPStateChange(dp)
+        state.state = MAIN_DISPATCHER
+        app.state_change_handler(state)
+        features = ofproto_v1_3_parser.OFPSwitchFeatures(dp)
+        app.switch_features_handler(ofp_event.EventOFPSwitchFeatures(features))
+    for link in links:
+        app.handler_link_add(event.EventLinkAdd(link))
+    for host in hosts:
+        app.handler_host_add(event.EventHostAdd(host))
+    # the discovery burst is applied as one batch, as the convergence thread would
+    app.convergence.flush()
+    settle(app, datapaths, flush_all=True)
+    for dp in datapaths.values():
+        dp.reset()
+    return app
+
+
+def settle(app, datapaths, flush_all=False):
+    "Flush the send queues that are due (all of them with flush_all) and answer the barriers."
+    if flush_all:
+        for dp in datapaths.values():
+            app.send_queues.flush(dp)
+    else:
+        app.send_queues.flush_due()
+    for dp in datapaths.values():
+        while dp.barriers:
+            reply = ofproto_v1_3_parser.OFPBarrierReply(dp)
+            reply.xid = dp.barriers.pop(0)
+            app.barrier_reply_handler(ofp_event.EventOFPBarrierReply(reply))
+
+
+def synthetic_events(hosts, count, flows, seed=0):
+    "(dpid, in_port, frame) of count frames spread over flows random host pairs."
+    rnd = random.Random(seed)
+    pairs = [tuple(rnd.sample(hosts, 2)) for _ in range(flows)]
+    started = set()
+    events = []
+    for _ in range(count):
+        src, dst = pairs[rnd.randrange(len(pairs))]
+        pkt = packet.Packet()
+        if (src.mac, dst.mac) not in started:
+            started.add((src.mac, dst.mac))
+            pkt.add_protocol(ethernet.ethernet(dst='ff:ff:ff:ff:ff:ff', src=src.mac,
+                                               ethertype=ether_types.ETH_TYPE_ARP))
+            pkt.add_protocol(arp.arp_ip(arp.ARP_REQUEST, src.mac, src.ipv4[0],
+                                        '00:00:00:00:00:00', dst.ipv4[0]))
+        else:
+            pkt.add_protocol(ethernet.ethernet(dst=dst.mac, src=src.mac,
+                                               ethertype=ether_types.ETH_TYPE_IP))
+            pkt.add_protocol(ipv4.ipv4(src=src.ipv4[0], dst=dst.ipv4[0], proto=6))
+            pkt.add_protocol(tcp.tcp(src_port=rnd.randint(1024, 65535), dst_port=5001))
+            pkt.add_protocol(b'\x00' * 64)
+        pkt.serialize()
+        events.append((src.port.dpid, src.port.port_no, bytes(pkt.data)))
+    return events
+
+
+def pcap_events(path, hosts, count):
+    "(dpid, in_port, frame) of the frames of a capture, injected at the port of their source host."
+    ports = dict((host.mac, host.port) for host in hosts)
+    events = []
+    skipped = 0
+    with open(path, 'rb') as f:
+        for _, buf in pcaplib.Reader(f):
+            try:
+                src = int_to_mac(parse_eth(buf)[1])
+            except ValueError:
+                skipped += 1
+                continue
+            port = ports.get(src)
+            if port is None:
+                skipped += 1
+                continue
+            events.append((port.dpid, port.port_no, bytes(buf)))
+            if len(events) >= count:
+                break
+    return events, skipped
+
+
+def packet_in(dp, in_port, data):
+    msg = ofproto_v1_3_parser.OFPPacketIn(dp, buffer_id=ofproto_v1_3.OFP_NO_BUFFER,
+                                          total_len=len(data), reason=ofproto_v1_3.OFPR_NO_MATCH,
+                                          table_id=0, match=ofproto_v1_3_parser.OFPMatch(in_port=in_port),
+                                          data=data)
+    msg.msg_len = len(data) + 34
+    return ofp_event.EventOFPPacketIn(msg)
+
+
+def replay(app, datapaths, events, rate):
+    """
+    Hand the events to the app, at rate per second (0: back to back). Returns
+    (elapsed seconds, LatencyHistogram in ns).
+    """
+    latency = LatencyHistogram()
+    # the packet-in events are built up front, like ryu's parser would before dispatching them
+    evs = [packet_in(datapaths[dpid], in_port, data) for dpid, in_port, data in events]
+    start_time = time.perf_counter()
+    for i, ev in enumerate(evs):
+        if rate:
+            delay = start_time + i / float(rate) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        begin = time.perf_counter_ns()
+        app._packet_in_handler(ev)
+        settle(app, datapaths)
+        latency.record(time.perf_counter_ns() - begin)
+    settle(app, datapaths, flush_all=True)
+    return time.perf_counter() - start_time, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--topo', default='assignment-4', choices=sorted(SAMPLE_TOPOLOGIES))
+    parser.add_argument('--switches', type=int, help='random_topo of this size instead of --topo')
+    parser.add_argument('--hosts-per-switch', type=int, default=2)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--flows', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=0, help='packet-ins per second, 0 for no limit')
+    parser.add_argument('--pcap', help='replay the frames of a capture file')
+    parser.add_argument('--forwarding', default='ecmp', choices=['path', 'sink_tree', 'ecmp', 'fast_failover'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.switches:
+        topo = dict((int(dpid), dict((int(n), cost) for n, cost in neighbors.items()))
+                    for dpid, neighbors in random_topo(args.switches, seed=args.seed).items())
+        hosts_per_switch = dict((dpid, args.hosts_per_switch) for dpid in topo)
+        name = 'random-%d' % args.switches
+    else:
+        links, hosts_per_switch = SAMPLE_TOPOLOGIES[args.topo]
+        topo = sample_topo(links)
+        name = args.topo
+
+    controller = load_controller()
+    datapaths, switches, links, hosts = build_topology(topo, hosts_per_switch)
+    app = start(controller, datapaths, switches, links, hosts, args.forwarding)
+
+    skipped = 0
+    if args.pcap:
+        events, skipped = pcap_events(args.pcap, hosts, args.events)
+    else:
+        events = synthetic_events(hosts, args.events, args.flows, args.seed)
+    if not events:
+        sys.exit("no packet-ins to replay")
+
+    elapsed, latency = replay(app, datapaths, events, args.rate)
+
+    sent = {}
+    for dp in datapaths.values():
+        for msg_type, n in dp.counts.items():
+            sent[msg_type] = sent.get(msg_type, 0) + n
+    print("topology:      %s, %d switches, %d hosts, %s forwarding" % (
+        name, len(topo), len(hosts), args.forwarding))
+    print("packet-ins:    %d (%d skipped)" % (len(events), skipped))
+    print("throughput:    %.0f packet-ins/s" % (len(events) / elapsed))
+    print("latency (us):  mean %.1f  p50 %.1f  p99 %.1f  max %.1f" % (
+        latency.mean() / 1e3, latency.percentile(50) / 1e3, latency.percentile(99) / 1e3,
+        latency.max / 1e3))
+    for msg_type in sorted(sent, key=str):
+        print("%-14s %d (%.2f per packet-in)" % (str(msg_type).replace('OFPT_', '') + ':',
+                                                 sent[msg_type], sent[msg_type] / float(len(events))))
+    print("bytes sent:    %d" % sum(dp.bytes for dp in datapaths.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/python
+
+"""
+Micro-benchmark of the heap based routing.dijkstra against the recursive
+dijkstra that SimpleSwitch13 used before.
+
+    python benchmarks/bench_routing.py [--sizes 10,100,1000,10000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+# the controller modules live one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import routing
+
+# the legacy implementation is O(V^3); beyond this size it takes hours
+LEGACY_MAX_NODES = 2000
+
+
+def legacy_dijkstra(topo, src, dest, visited=[], dist={}, parent={}):
+    "Copy of the recursive SimpleSwitch13.dijkstra, kept as the baseline."
+    if src not in topo:
+        raise TypeError('The root of the shortest path tree cannot be found')
+    if dest not in topo:
+        raise TypeError('The target of the shortest path cannot be found')
+
+    if src == dest:
+        path = []
+        p = dest
+        while p is not None:
+            path.append(p)
+            p = parent.get(p, None)
+        cost = dist[dest]
+        dist.clear()
+        parent.clear()
+        del visited[:]
+        return path, cost
+    else:
+        if len(visited) == 0:
+            dist[src] = 0
+        for neighbor in topo[src]:
+            if neighbor not in visited:
+                new_distance = dist[src] + topo[src][neighbor]
+                if new_distance < dist.get(neighbor, float('inf')):
+                    dist[neighbor] = new_distance
+                    parent[neighbor] = src
+        visited.append(src)
+        unvisited = {}
+        for k in topo:
+            if k not in visited:
+                unvisited[k] = dist.get(k, float('inf'))
+        if len(unvisited) > 0:
+            next_vertex = min(unvisited, key=unvisited.get)
+            return legacy_dijkstra(topo, next_vertex, dest, visited, dist, parent)
+
+
+def random_topo(n, degree=4, seed=0):
+    "Connected random graph in the SimpleSwitch13.topo format (ring + chords)."
+    rnd = random.Random(seed)
+    topo = dict((str(i), {}) for i in range(1, n + 1))
+
+    def link(a, b):
+        if a != b:
+            cost = rnd.randint(1, 20)
+            topo[str(a)][str(b)] = cost
+            topo[str(b)][str(a)] = cost
+
+    for i in range(1, n + 1):
+        link(i, i % n + 1)
+    for _ in range(n * (degree - 2) // 2):
+        link(rnd.randint(1, n), rnd.randint(1, n))
+    return topo
+
+
+def bench(n, repeat):
+    topo = random_topo(n)
+    # worst case for an early-exit search: the node farthest from the root
+    dist, _ = routing.shortest_path_tree(topo, '1')
+    src, dest = '1', max(dist, key=dist.get)
+
+    heap_time = min(timeit.repeat(lambda: routing.dijkstra(topo, src, dest),
+                                  number=1, repeat=repeat))
+    if n > LEGACY_MAX_NODES:
+        return heap_time, None
+
+    path, cost = routing.dijkstra(topo, src, dest)
+    _, legacy_cost = legacy_dijkstra(topo, src, dest)
+    assert cost == legacy_cost, (cost, legacy_cost)
+    legacy_time = min(timeit.repeat(lambda: legacy_dijkstra(topo, src, dest),
+                                    number=1, repeat=repeat))
+    return heap_time, legacy_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,10000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # the legacy version recurses once per vertex
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), LEGACY_MAX_NODES * 2))
+
+    print("{:>8} {:>14} {:>14} {:>10}".format('nodes', 'heap (ms)', 'legacy (ms)', 'speedup'))
+    for n in [int(s) for s in args.sizes.split(',')]:
+        heap_time, legacy_time = bench(n, args.repeat)
+        if legacy_time is None:
+            print("{:>8} {:>14.3f} {:>14} {:>10}".format(n, heap_time * 1e3, 'skipped', '-'))
+        else:
+            print("{:>8} {:>14.3f} {:>14.3f} {:>9.1f}x".format(
+                n, heap_time * 1e3, legacy_time * 1e3, legacy_time / heap_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+
+"""
+Scaling of the routing engine on the synthetic topologies of topo_gen.
+
+    python benchmarks/bench_scaling.py [--sizes 10,100,1000,10000,50000]
+        [--families fat-tree,ring] [--all-pairs-max 2000] [--waxman-max 5000]
+
+For every family and size it reports the links, the memory of the weight
+map and of its CSRGraph, one shortest path (routing.dijkstra from switch 1
+to the farthest switch), one shortest path tree, and the all-pairs
+precomputation (CSRGraph.all_pairs). Above --all-pairs-max switches the
+all-pairs time is extrapolated from the tree time and its matrices (n^2
+distances and first links) are only sized, they would not fit in memory.
+Waxman draws all n^2 pairs and is skipped above --waxman-max.
+"""
+
+import argparse
+import os
+import sys
+
+# the controller modules live one level up
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import routing
+import topo_gen
+from bench_csr import measure, timed
+from csr_graph import CSRGraph
+
+# bytes per all-pairs cell: float64 distance + int32 first link
+MATRIX_CELL_BYTES = 12
+
+
+def bench(family, n, all_pairs_max, seed):
+    (topology, gen_time) = timed(lambda: topo_gen.by_size(family, n, seed))
+    weights, weights_bytes = measure(topology.weight_map)
+    graph = CSRGraph.from_adjacency(weights)
+    size = len(topology)
+
+    src = min(weights)
+    (tree, _), tree_time = timed(lambda: routing.shortest_path_tree(weights, src))
+    dst = max(tree, key=tree.get)
+    _, path_time = timed(lambda: routing.dijkstra(weights, src, dst))
+
+    row = {
+        'name': topology.name,
+        'switches': size,
+        'links': len(topology.links),
+        'generate': gen_time,
+        'dict_mem': weights_bytes,
+        'csr_mem': graph.nbytes,
+        'path': path_time,
+        'tree': tree_time,
+        'matrix_mem': size * size * MATRIX_CELL_BYTES,
+    }
+    if size <= all_pairs_max:
+        _, row['all_pairs'] = timed(graph.all_pairs)
+        row['all_pairs_estimated'] = False
+    else:
+        graph.shortest_paths(0)
+        _, csr_tree = timed(lambda: graph.shortest_paths(0))
+        row['all_pairs'] = csr_tree * size
+        row['all_pairs_estimated'] = True
+    return row
+
+
+def size_text(nbytes):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if nbytes < 1024 or unit == 'GiB':
+            return '%.1f %s' % (nbytes, unit)
+        nbytes /= 1024.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,10000,50000')
+    parser.add_argument('--families', default=','.join(topo_gen.FAMILIES))
+    parser.add_argument('--all-pairs-max', type=int, default=2000)
+    parser.add_argument('--waxman-max', type=int, default=5000,
+                        help='skip waxman above this many switches, it draws all n^2 pairs (default 5000)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print("{:<26} {:>8} {:>9} {:>10} {:>11} {:>11} {:>10} {:>10} {:>12} {:>11}".format(
+        'topology', 'switches', 'links', 'gen (s)', 'dict mem', 'csr mem', 'path (ms)', 'tree (ms)',
+        'all-pairs (s)', 'matrices'))
+    for family in args.families.split(','):
+        for n in [int(s) for s in args.sizes.split(',')]:
+            if family == 'waxman' and n > args.waxman_max:
+                continue
+            row = bench(family, n, args.all_pairs_max, args.seed)
+            print("{:<26} {:>8} {:>9} {:>10.2f} {:>11} {:>11} {:>10.2f} {:>10.2f} {:>12} {:>11}".format(
+                row['name'], row['switches'], row['links'], row['generate'], size_text(row['dict_mem']),
+                size_text(row['csr_mem']), row['path'] * 1e3, row['tree'] * 1e3,
+                ('~%.1f' if row['all_pairs_estimated'] else '%.2f') % row['all_pairs'],
+                size_text(row['matrix_mem'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+
+"""
+Packet-in throughput of a sharded deployment against a single controller.
+
+    python benchmarks/bench_shards.py [--switches 100] [--shards 1,2,4]
+        [--events 20000] [--flows 200] [--forwarding ecmp]
+
+For every shard count a coordinator (shard.Coordinator) and that many
+worker processes are started on a Unix socket. Each worker is a
+SimpleSwitch13 with the FakeDatapaths of bench_replay for the switches of
+its shard only: it announces them, the links LLDP would find between them
+and their hosts, reports the links coming in from other shards the way
+their delay probes would, and syncs with the coordinator until it has the
+whole topology. Once every worker has it they all replay, back to back,
+the packet-ins of the same synthetic flows whose ingress switch is theirs.
+The fake switches have no flow table, so every frame comes back as a
+packet-in at its ingress, as in bench_replay; the packet-in a path raises
+at the first switch of another shard is not replayed.
+
+Reported per row: the aggregate packet-ins/s (all the packet-ins over the
+time from the first worker starting to the last one finishing), the
+slowest worker, the p50/p99 latency over all workers and the speedup over
+a single controller replaying everything in one process. The workers need
+a core each to scale: on fewer cores they take turns on them.
+"""
+
+import argparse
+import binascii
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_replay import build_topology, load_controller, replay, settle, start, synthetic_events
+from bench_routing import random_topo
+from profiling import LatencyHistogram
+from shard import Coordinator, shard_of
+
+# Seconds between two syncs of a worker waiting for the topology, and how long it waits at most
+SYNC_INTERVAL = 0.05
+SYNC_TIMEOUT = 60
+
+
+def run_coordinator(shards, address):
+    coordinator = Coordinator(shards, address)
+    try:
+        coordinator.serve()
+    finally:
+        coordinator.close()
+
+
+def run_worker(index, shards, address, args, barrier, results):
+    """
+    One controller process: shard index of shards, or the whole topology
+    without a coordinator if shards is 0. Puts (packet-ins, start, end,
+    LatencyHistogram) on results.
+    """
+    controller = load_controller()
+    controller.SHARDS = shards
+    controller.SHARD_INDEX = index
+    controller.SHARD_COORDINATOR = address
+
+    topo = make_topo(args)
+    datapaths, switches, links, hosts = build_topology(topo, dict((dpid, 1) for dpid in topo))
+
+    def owns(dpid):
+        return not shards or shard_of(dpid, shards) == index
+
+    own = dict((dpid, dp) for dpid, dp in datapaths.items() if owns(dpid))
+    app = start(controller, own, [switch for switch in switches if owns(switch.dp.id)],
+                [link for link in links if owns(link.src.dpid) and owns(link.dst.dpid)],
+                [host for host in hosts if owns(host.port.dpid)], args.forwarding)
+    # the routes are computed inline, what is measured is the spreading of the packet-ins
+    app.route_service.min_switches = len(topo) + 1
+    if shards:
+        for link in links:
+            if owns(link.dst.dpid) and not owns(link.src.dpid):
+                probe = app.delay_monitor.probe(link.src.dpid, link.src.port_no)
+                app.probe_received(own[link.dst.dpid], link.dst.port_no, probe)
+        app.convergence.flush()
+        deadline = time.time() + SYNC_TIMEOUT
+        while (len(app.topology.graph) < len(topo) or app.topology.graph.number_of_edges() < len(links)
+               or len(app.hosts) < len(hosts)):
+            if time.time() > deadline:
+                raise RuntimeError("shard %d has %d switches, %d links and %d hosts of %d, %d and %d" % (
+                    index, len(app.topology.graph), app.topology.graph.number_of_edges(), len(app.hosts),
+                    len(topo), len(links), len(hosts)))
+            time.sleep(SYNC_INTERVAL)
+            app.sync_shard()
+        settle(app, own, flush_all=True)
+
+    events = [e for e in synthetic_events(hosts, args.events, args.flows, args.seed) if owns(e[0])]
+    barrier.wait()
+    begin = time.time()
+    _, latency = replay(app, own, events, 0)
+    results.put((len(events), begin, time.time(), latency))
+    app.close()
+
+
+def make_topo(args):
+    return dict((int(dpid), dict((int(n), cost) for n, cost in neighbors.items()))
+                for dpid, neighbors in random_topo(args.switches, seed=args.seed).items())
+
+
+def run(shards, args):
+    "Replay over shards workers (0: one controller on its own). Returns the row to print."
+    context = multiprocessing.get_context('spawn')
+    workdir = tempfile.mkdtemp()
+    address = os.path.join(workdir, 'coordinator')
+    coordinator = None
+    if shards:
+        coordinator = context.Process(target=run_coordinator, args=(shards, address))
+        coordinator.daemon = True
+        coordinator.start()
+        while not os.path.exists(address):
+            time.sleep(SYNC_INTERVAL)
+    workers = max(shards, 1)
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=run_worker, args=(index, shards, address, args, barrier, results))
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    if coordinator is not None:
+        coordinator.terminate()
+        coordinator.join()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    latency = LatencyHistogram()
+    for row in rows:
+        latency.merge(row[3])
+    count = sum(row[0] for row in rows)
+    elapsed = max(row[2] for row in rows) - min(row[1] for row in rows)
+    return {
+        'packet_ins': count,
+        'throughput': count / elapsed,
+        'slowest': max(row[2] - row[1] for row in rows),
+        'latency': latency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--switches', type=int, default=100)
+    parser.add_argument('--shards', default='1,2,4', help='comma separated shard counts')
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--flows', type=int, default=200)
+    parser.add_argument('--forwarding', default='ecmp', choices=['sink_tree', 'ecmp', 'fast_failover'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    counts = [int(n) for n in args.shards.split(',')]
+    # the secret of the coordinator connections, inherited by the spawned processes
+    os.environ.setdefault('SIMPLE_SWITCH_SHARD_KEY', binascii.hexlify(os.urandom(16)).decode())
+
+    print("topology: random-%d, %s forwarding, %d packet-ins over %d flows, %d cores" % (
+        args.switches, args.forwarding, args.events, args.flows, multiprocessing.cpu_count()))
+    print("{:<8} {:>14} {:>12} {:>10} {:>10} {:>9}".format(
+        'shards', 'packet-ins/s', 'slowest (s)', 'p50 (us)', 'p99 (us)', 'speedup'))
+    baseline = None
+    for shards in [0] + counts:
+        row = run(shards, args)
+        if baseline is None:
+            baseline = row['throughput']
+        latency = row['latency']
+        print("{:<8} {:>14.0f} {:>12.2f} {:>10.1f} {:>10.1f} {:>8.2f}x".format(
+            shards or 'off', row['throughput'], row['slowest'], latency.percentile(50) / 1e3,
+            latency.percentile(99) / 1e3, row['throughput'] / baseline))
+
+
+if __name__ == '__main__':
+    main()
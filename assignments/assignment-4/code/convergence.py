@@ -0,0 +1,101 @@
+"""
+Debounced application of topology changes.
+
+Discovery events come in bursts: a switch connecting brings a link event
+per port and direction, a switch failing a link delete for each of them.
+Instead of recomputing the routes after every event, the events are
+queued here and applied together once the topology has been quiet for
+quiet_period seconds, or at the latest max_delay seconds after the first
+event of the burst, so a flapping link cannot hold the batch back forever.
+
+apply(batch) receives the queued (kind, args) in arrival order and does
+one recomputation for the whole batch. For every batch the burst length
+(first to last event) and the convergence time (first event to applied)
+are kept; stable() is the "topology converged" signal.
+"""
+
+import collections
+import time
+
+# Seconds without a topology event before the queued ones are applied
+QUIET_PERIOD = 0.2
+# Seconds after the first event of a burst by which it is applied regardless
+MAX_BATCH_DELAY = 2.0
+# Batches whose timings are kept for stats()
+HISTORY = 32
+
+# events: number of events, burst: first to last event, convergence: first
+# event to applied, apply: seconds spent in apply()
+Batch = collections.namedtuple('Batch', 'events burst convergence apply applied_at')
+
+
+class ConvergenceManager(object):
+
+    def __init__(self, apply, quiet_period=QUIET_PERIOD, max_delay=MAX_BATCH_DELAY, clock=time.time):
+        self.apply = apply
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.clock = clock
+        self.pending = []
+        self.first_event = None
+        self.last_event = None
+        self.batches = 0
+        self.events = 0
+        self.history = collections.deque(maxlen=HISTORY)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, kind, *args):
+        "Queue a topology change."
+        now = self.clock()
+        if not self.pending:
+            self.first_event = now
+        self.last_event = now
+        self.pending.append((kind, args))
+
+    def due(self):
+        if not self.pending:
+            return False
+        now = self.clock()
+        return (now - self.last_event >= self.quiet_period or
+                now - self.first_event >= self.max_delay)
+
+    def next_due(self):
+        "Seconds until the pending batch is due (quiet_period if there is none)."
+        if not self.pending:
+            return self.quiet_period
+        due = min(self.last_event + self.quiet_period, self.first_event + self.max_delay)
+        return max(due - self.clock(), 0.0)
+
+    def flush(self):
+        "Apply the pending changes now. Returns the Batch, or None if nothing was pending."
+        if not self.pending:
+            return None
+        batch, self.pending = self.pending, []
+        start = self.clock()
+        self.apply(batch)
+        end = self.clock()
+        result = Batch(len(batch), self.last_event - self.first_event, end - self.first_event,
+                       end - start, end)
+        self.first_event = self.last_event = None
+        self.batches += 1
+        self.events += len(batch)
+        self.history.append(result)
+        return result
+
+    def stable(self):
+        "True once a batch was applied and no change is waiting."
+        return self.batches > 0 and not self.pending
+
+    def stats(self):
+        last = self.history[-1] if self.history else None
+        return {
+            'pending': len(self.pending),
+            'batches': self.batches,
+            'events': self.events,
+            'events_per_batch': float(self.events) / self.batches if self.batches else 0.0,
+            'last_convergence': last.convergence if last else None,
+            'max_convergence': max(b.convergence for b in self.history) if self.history else None,
+            'stable': self.stable(),
+        }
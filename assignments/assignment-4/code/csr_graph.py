@@ -0,0 +1,185 @@
+"""
+Compact, array-backed (CSR) topology graph.
+
+Switch dpids are mapped to dense indices 0..n-1 and the links are stored
+as four flat NumPy arrays:
+
+    offsets[i]:offsets[i + 1]  slice of the links leaving switch i
+    neighbors[e]               index of the switch link e leads to
+    weights[e]                 routing cost of link e
+    ports[e]                   egress port of link e on its source switch
+
+A CSRGraph is immutable: it is built from a snapshot of the topology and
+replaced as a whole when the topology changes, which also makes it cheap to
+pickle and hand to other processes.
+"""
+
+import heapq
+
+import numpy as np
+
+# Above this many switches all_pairs() uses batched Dijkstra instead of
+# Floyd-Warshall, whose O(n^3) is only worth it on small dense fabrics
+FLOYD_WARSHALL_MAX_NODES = 512
+
+
+class CSRGraph(object):
+
+    def __init__(self, dpids, offsets, neighbors, weights, ports):
+        self.dpids = np.asarray(dpids, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.ports = np.asarray(ports, dtype=np.int32)
+        self.index = dict((int(dpid), i) for i, dpid in enumerate(self.dpids))
+        self._as_lists = None
+
+    @classmethod
+    def from_adjacency(cls, adj, ports=None):
+        """
+        Build from {dpid: {dpid: cost}} (the SimpleSwitch13.topo format).
+        ports maps (src, dst) -> egress port; missing ports are stored as 0.
+        """
+        ports = ports or {}
+        dpids = sorted(set(adj) | set(v for nbrs in adj.values() for v in nbrs))
+        index = dict((dpid, i) for i, dpid in enumerate(dpids))
+        offsets = [0]
+        neighbors, weights, egress = [], [], []
+        for u in dpids:
+            for v, cost in sorted(adj.get(u, {}).items()):
+                neighbors.append(index[v])
+                weights.append(cost)
+                egress.append(ports.get((u, v), 0))
+            offsets.append(len(neighbors))
+        return cls(dpids, offsets, neighbors, weights, egress)
+
+    @classmethod
+    def from_topology(cls, graph):
+        "Build from the TopologyState networkx graph (edge attributes weight and port)."
+        adj, ports = {}, {}
+        for u in graph.nodes:
+            adj[u] = {}
+        for u, v, data in graph.edges(data=True):
+            adj[u][v] = data['weight']
+            ports[(u, v)] = data['port']
+        return cls.from_adjacency(adj, ports)
+
+    def __len__(self):
+        return len(self.dpids)
+
+    @property
+    def nbytes(self):
+        return (self.dpids.nbytes + self.offsets.nbytes + self.neighbors.nbytes +
+                self.weights.nbytes + self.ports.nbytes)
+
+    def adjacency(self):
+        "The {dpid: {dpid: cost}} map the graph was built from, for the functions of routing."
+        dpids = self.dpids.tolist()
+        offsets, neighbors, weights = self._lists()
+        return dict((dpids[i], dict((dpids[neighbors[e]], weights[e]) for e in range(offsets[i], offsets[i + 1])))
+                    for i in range(len(dpids)))
+
+    def edges_of(self, i):
+        "Link indices leaving switch index i."
+        return range(self.offsets[i], self.offsets[i + 1])
+
+    def shortest_paths(self, src):
+        """
+        Dijkstra from the switch index src. Returns (dist, first_edge): the
+        cost to every switch (inf if unreachable) and the index of the first
+        link on the path to it (-1 for src itself and unreachable switches).
+        """
+        n = len(self.dpids)
+        offsets, neighbors, weights = self._lists()
+
+        inf = float('inf')
+        dist = [inf] * n
+        first = [-1] * n
+        done = [False] * n
+        dist[src] = 0.0
+        heap = [(0.0, src)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if done[u]:
+                continue
+            done[u] = True
+            for e in range(offsets[u], offsets[u + 1]):
+                v = neighbors[e]
+                nd = d + weights[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    first[v] = e if u == src else first[u]
+                    heapq.heappush(heap, (nd, v))
+        return dist, first
+
+    def all_pairs(self, method=None, batch=256):
+        """
+        Fill the n x n distance and first-link matrices in one call.
+        next_edge[i, j] is the index of the first link from i towards j, so
+        neighbors[next_edge] is the next hop and ports[next_edge] the egress
+        port; -1 means unreachable (or i == j).
+
+        method is 'floyd' (vectorised Floyd-Warshall) or 'dijkstra' (one
+        Dijkstra per source, written into the matrices batch rows at a time);
+        by default it is picked from the graph size.
+        """
+        if method is None:
+            method = 'floyd' if len(self.dpids) <= FLOYD_WARSHALL_MAX_NODES else 'dijkstra'
+        if method == 'floyd':
+            return self._floyd_warshall()
+        if method == 'dijkstra':
+            return self._batched_dijkstra(batch)
+        raise ValueError('unknown all-pairs method: %s' % method)
+
+    def next_hop(self, next_edge, src, dst):
+        "(next hop dpid, egress port) from dpid src towards dpid dst, or None."
+        e = next_edge[self.index[src], self.index[dst]]
+        if e < 0:
+            return None
+        return int(self.dpids[self.neighbors[e]]), int(self.ports[e])
+
+    def _floyd_warshall(self):
+        n = len(self.dpids)
+        dist = np.full((n, n), np.inf)
+        next_edge = np.full((n, n), -1, dtype=np.int32)
+        src = np.repeat(np.arange(n), np.diff(self.offsets))
+        # keep the cheapest of parallel links: write them most expensive first
+        order = np.argsort(-self.weights, kind='stable')
+        dist[src[order], self.neighbors[order]] = self.weights[order]
+        next_edge[src[order], self.neighbors[order]] = order
+        np.fill_diagonal(dist, 0.0)
+        np.fill_diagonal(next_edge, -1)
+
+        for k in range(n):
+            via = dist[:, k, None] + dist[None, k, :]
+            better = via < dist
+            np.minimum(dist, via, out=dist)
+            next_edge = np.where(better, next_edge[:, k, None], next_edge)
+        return dist, next_edge
+
+    def _batched_dijkstra(self, batch):
+        n = len(self.dpids)
+        dist = np.empty((n, n))
+        next_edge = np.empty((n, n), dtype=np.int32)
+        for start in range(0, n, batch):
+            rows = range(start, min(start + batch, n))
+            d_rows, e_rows = [], []
+            for src in rows:
+                d, e = self.shortest_paths(src)
+                d_rows.append(d)
+                e_rows.append(e)
+            dist[rows.start:rows.stop] = d_rows
+            next_edge[rows.start:rows.stop] = e_rows
+        return dist, next_edge
+
+    def _lists(self):
+        # plain lists are much faster than element-wise numpy access in the
+        # Dijkstra loop; built once and not pickled
+        if self._as_lists is None:
+            self._as_lists = (self.offsets.tolist(), self.neighbors.tolist(), self.weights.tolist())
+        return self._as_lists
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_as_lists'] = None
+        return state
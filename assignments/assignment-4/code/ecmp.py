@@ -0,0 +1,231 @@
+"""
+Equal-cost multipath forwarding with OpenFlow select groups.
+
+For a destination host the equal-cost DAG towards its switch is computed
+with routing.ecmp_next_hops. Every switch of the DAG that is reachable
+from the ingress switch gets one eth_dst rule: a plain output action where
+there is a single next hop, or an OFPGT_SELECT group with one bucket per
+equal-cost next hop, so the switch hashes flows across all of them.
+
+The installed destinations are remembered, and refresh() reprograms the
+groups and rules that changed after a topology event. The DAGs are cached
+per destination switch for the current route table version, and
+load_dags() fills the cache with DAGs computed elsewhere (by the
+RouteService) so that a refresh does not have to compute them.
+
+In a sharded deployment (see shard.py) owns(dpid) tells the switches this
+controller programs; the others on the DAG are programmed by the controller
+of their own shard when the traffic reaches them.
+
+Subclasses may set whole_tree to program every switch that can reach the
+destination at once instead of only those reachable from the ingress, and
+override _entry() and _buckets() (with group_type) to program other kinds
+of groups.
+"""
+
+from routing import ecmp_next_hops
+
+
+class EcmpInstaller(object):
+
+    whole_tree = False
+    # ofproto name of the group type of the 'group' entries
+    group_type = 'OFPGT_SELECT'
+
+    def __init__(self, topology, add_flow, send_queues, priority=1, table_id=0, owns=None):
+        # topology is the TopologyState, add_flow is SimpleSwitch13.add_flow; the
+        # GroupMods go through the same per-datapath send_queues as the FlowMods
+        self.topology = topology
+        self.add_flow = add_flow
+        self.send_queues = send_queues
+        self.priority = priority
+        # the table add_flow installs the rules in, for deleting them again
+        self.table_id = table_id
+        # dpid -> whether this controller programs the switch, None for all of them
+        self.owns = owns
+        # eth_dst -> (dst dpid, host port)
+        self.destinations = {}
+        # eth_dst -> {dpid: ('port', port) or ('group', group id, ports)}
+        self.installed = {}
+        # (dpid, eth_dst) -> group id, and the last group id used on every dpid
+        self.group_ids = {}
+        self.last_group_id = {}
+        # dst dpid -> (dist, next_hops) at route table version dags_version
+        self.dags = {}
+        self.dags_version = None
+
+    def install(self, datapaths, ingress, eth_dst, dst_dpid, host_port):
+        """
+        Program the ECMP rules for eth_dst on every switch reachable from
+        ingress. Returns (actions to apply to the packet at ingress, barrier
+        requests sent), or None if dst_dpid cannot be reached.
+        """
+        self.destinations[eth_dst] = (dst_dpid, host_port)
+        # the switches already programmed stay roots, the paths of the other ingresses are kept
+        wanted = self._update(datapaths, eth_dst, [ingress] + list(self.installed.get(eth_dst, {})))
+        if wanted is None or ingress not in wanted:
+            return None
+        barriers = [self.send_queues.flush(datapaths[dpid]) for dpid in wanted if self._owned(dpid)]
+        actions = self._actions(datapaths[ingress], wanted[ingress])
+        return actions, [barrier for barrier in barriers if barrier is not None]
+
+    def destination_switches(self):
+        return set(dst_dpid for dst_dpid, _ in self.destinations.values())
+
+    def dag(self, dst_dpid):
+        "The ECMP DAG (dist, next_hops) towards dst_dpid, computed once per route table version."
+        version = self.topology.route_table.version
+        if version != self.dags_version:
+            self.dags = {}
+            self.dags_version = version
+        dag = self.dags.get(dst_dpid)
+        if dag is None:
+            dag = self.dags[dst_dpid] = ecmp_next_hops(self.topology.route_table.graph, dst_dpid)
+        return dag
+
+    def load_dags(self, dags, version):
+        "Cache {dst dpid: (dist, next_hops)} computed for version. False if the route table moved on."
+        if version != self.topology.route_table.version:
+            return False
+        if version != self.dags_version:
+            self.dags = {}
+            self.dags_version = version
+        self.dags.update(dags)
+        return True
+
+    def refresh(self, datapaths):
+        "Recompute every installed destination after a topology change."
+        for eth_dst in list(self.destinations):
+            if self._update(datapaths, eth_dst, list(self.installed.get(eth_dst, {}))) is None:
+                self.forget(datapaths, eth_dst)
+
+    def _update(self, datapaths, eth_dst, roots):
+        """
+        Bring the rules for eth_dst in line with the current ECMP DAG on the
+        switches reachable from roots, and remove them from the switches that
+        dropped out. Returns {dpid: entry} (None on the switches of other
+        shards) or None if the destination switch is gone or a switch on the
+        DAG is not connected.
+        """
+        dst_dpid, host_port = self.destinations[eth_dst]
+        if dst_dpid not in self.topology.route_table:
+            return None
+        dist, next_hops = self.dag(dst_dpid)
+
+        wanted = {}
+        if self.whole_tree:
+            roots = list(dist)
+        stack = [dpid for dpid in roots if dpid in dist]
+        while stack:
+            dpid = stack.pop()
+            if dpid in wanted:
+                continue
+            # the switches of other shards are only walked through
+            wanted[dpid] = (self._entry(dpid, eth_dst, dst_dpid, host_port, next_hops, dist)
+                            if self._owned(dpid) else None)
+            if dpid != dst_dpid:
+                stack.extend(next_hops[dpid])
+        if any(dpid not in datapaths for dpid in wanted if self._owned(dpid)):
+            return None
+
+        installed = self.installed.setdefault(eth_dst, {})
+        for dpid in list(installed):
+            if dpid not in wanted:
+                if dpid in datapaths:
+                    self._delete_flow(datapaths[dpid], eth_dst)
+                del installed[dpid]
+        # the switches closest to the destination are programmed first
+        for dpid in sorted(wanted, key=dist.get):
+            if not self._owned(dpid):
+                continue
+            old = installed.get(dpid)
+            if old != wanted[dpid]:
+                self._program(datapaths[dpid], eth_dst, old, wanted[dpid])
+                installed[dpid] = wanted[dpid]
+        return wanted
+
+    def _owned(self, dpid):
+        return self.owns is None or self.owns(dpid)
+
+    def forget(self, datapaths, eth_dst):
+        "Remove the rules of a destination, e.g. after the host moved."
+        self.destinations.pop(eth_dst, None)
+        for dpid in self.installed.pop(eth_dst, {}):
+            datapath = datapaths.get(dpid)
+            if datapath is not None:
+                self._delete_flow(datapath, eth_dst)
+
+    def flow_removed(self, datapath, eth_dst):
+        """
+        The rule for eth_dst on datapath timed out or was evicted: drop its
+        group too, so the next install programs the switch from scratch.
+        """
+        entry = self.installed.get(eth_dst, {}).pop(datapath.id, None)
+        if entry is not None and entry[0] == 'group':
+            ofproto = datapath.ofproto
+            parser = datapath.ofproto_parser
+            self.send_queues.put(datapath, parser.OFPGroupMod(datapath, ofproto.OFPGC_DELETE,
+                                                              getattr(ofproto, self.group_type), entry[1]))
+            self.group_ids.pop((datapath.id, eth_dst), None)
+
+    def _entry(self, dpid, eth_dst, dst_dpid, host_port, next_hops, dist):
+        """
+        What dpid does with eth_dst: ('port', port) or ('group', group id,
+        ports). dist and next_hops are the ECMP DAG towards dst_dpid.
+        """
+        if dpid == dst_dpid:
+            return ('port', host_port)
+        ports = tuple(self.topology.link_ports(dpid, v)[0] for v in next_hops[dpid])
+        if len(ports) == 1:
+            return ('port', ports[0])
+        return ('group', self._group_id(dpid, eth_dst), ports)
+
+    def _group_id(self, dpid, eth_dst):
+        key = (dpid, eth_dst)
+        if key not in self.group_ids:
+            self.last_group_id[dpid] = self.last_group_id.get(dpid, 0) + 1
+            self.group_ids[key] = self.last_group_id[dpid]
+        return self.group_ids[key]
+
+    def _program(self, datapath, eth_dst, old, new):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        group_type = getattr(ofproto, self.group_type)
+        if new[0] == 'group':
+            command = ofproto.OFPGC_MODIFY if old is not None and old[0] == 'group' else ofproto.OFPGC_ADD
+            self.send_queues.put(datapath, parser.OFPGroupMod(datapath, command, group_type, new[1],
+                                                              self._buckets(datapath, new[2])))
+        match = parser.OFPMatch(eth_dst=eth_dst)
+        self.add_flow(datapath, self.priority, match, self._actions(datapath, new))
+        if old is not None and old[0] == 'group' and new[0] != 'group':
+            self.send_queues.put(datapath, parser.OFPGroupMod(datapath, ofproto.OFPGC_DELETE,
+                                                              group_type, old[1]))
+            del self.group_ids[(datapath.id, eth_dst)]
+
+    @staticmethod
+    def _buckets(datapath, ports):
+        "One bucket of equal weight per port, the switch hashes the flows over them."
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        return [parser.OFPBucket(weight=1, watch_port=ofproto.OFPP_ANY, watch_group=ofproto.OFPG_ANY,
+                                 actions=[parser.OFPActionOutput(port)])
+                for port in ports]
+
+    @staticmethod
+    def _actions(datapath, entry):
+        parser = datapath.ofproto_parser
+        if entry[0] == 'group':
+            return [parser.OFPActionGroup(entry[1])]
+        return [parser.OFPActionOutput(entry[1])]
+
+    def _delete_flow(self, datapath, eth_dst):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        self.send_queues.put(datapath, parser.OFPFlowMod(
+            datapath, command=ofproto.OFPFC_DELETE, table_id=self.table_id,
+            out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY,
+            match=parser.OFPMatch(eth_dst=eth_dst)))
+        group_id = self.group_ids.pop((datapath.id, eth_dst), None)
+        if group_id is not None:
+            self.send_queues.put(datapath, parser.OFPGroupMod(datapath, ofproto.OFPGC_DELETE,
+                                                              getattr(ofproto, self.group_type), group_id))
@@ -0,0 +1,38 @@
+"""
+Fast path decoder for the Ethernet header of a packet-in.
+
+struct.unpack_from reads the 14-byte header in place from msg.data, so
+nothing is copied and no ryu packet objects are built. The controller only
+needs the addresses and the ethertype for most packet-ins; the full ryu
+parser (packet.Packet) is left for the frames whose upper layers are
+actually inspected.
+"""
+
+import struct
+
+ETH_TYPE_IP = 0x0800
+ETH_TYPE_ARP = 0x0806
+ETH_TYPE_8021Q = 0x8100
+ETH_TYPE_LLDP = 0x88cc
+
+ETH_HEADER_LEN = 14
+
+# dst (16 + 32 bit), src (16 + 32 bit), ethertype
+_ETH_HEADER = struct.Struct('!HIHIH')
+_ETH_TYPE = struct.Struct('!H')
+
+
+def parse_eth(data):
+    """
+    Return (dst, src, ethertype) of an Ethernet frame, with the MAC
+    addresses as 48-bit integers. For an 802.1Q tagged frame the
+    ethertype of the encapsulated packet is returned.
+    Raises ValueError if data is shorter than an Ethernet header.
+    """
+    if len(data) < ETH_HEADER_LEN:
+        raise ValueError('frame too short for an ethernet header: %d bytes' % len(data))
+    dst_hi, dst_lo, src_hi, src_lo, ethertype = _ETH_HEADER.unpack_from(data)
+    if ethertype == ETH_TYPE_8021Q and len(data) >= ETH_HEADER_LEN + 4:
+        ethertype, = _ETH_TYPE.unpack_from(data, ETH_HEADER_LEN + 2)
+    return (dst_hi << 32) | dst_lo, (src_hi << 32) | src_lo, ethertype
+
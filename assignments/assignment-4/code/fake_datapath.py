@@ -0,0 +1,69 @@
+"""
+A stand-in for ryu's Datapath, for driving the controller without a switch.
+
+The messages are serialized as they would be for the wire and kept instead
+of being sent: sent holds the message objects in the order the switch
+would get them, counts and bytes what went out by OFPT type, and barriers
+the xids of the barrier requests nobody answered yet. The tests and the
+benchmarks both drive the controller with it.
+"""
+
+import struct
+
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+# OFPT_* number -> name, for the messages written to the fake switches
+MESSAGE_TYPES = dict((value, name) for name, value in vars(ofproto_v1_3).items()
+                     if name.startswith('OFPT_'))
+_HEADER = struct.Struct('!BBHI')
+
+
+class FakeDatapath(object):
+    "Records what a component sends, serialized as for the switch, instead of sending it."
+
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+
+    def __init__(self, dpid):
+        self.id = dpid
+        self.xid = 0
+        self.sent = []
+        self.counts = {}
+        self.bytes = 0
+        # xids of the barrier requests not answered yet
+        self.barriers = []
+        self._serialized = {}
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        self._serialized[self.xid] = msg
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        else:
+            self._serialized[msg.xid] = msg
+        msg.serialize()
+        self.send(bytes(msg.buf))
+
+    def send(self, buf):
+        # map a raw batch (of SendQueue, say) back onto the message objects serialized for it
+        offset = 0
+        while offset < len(buf):
+            _, msg_type, length, xid = _HEADER.unpack_from(buf, offset)
+            name = MESSAGE_TYPES.get(msg_type, msg_type)
+            self.counts[name] = self.counts.get(name, 0) + 1
+            if msg_type == ofproto_v1_3.OFPT_BARRIER_REQUEST:
+                self.barriers.append(xid)
+            self.sent.append(self._serialized.pop(xid))
+            offset += length
+        self.bytes += len(buf)
+
+    def names(self):
+        return [type(msg).__name__ for msg in self.sent]
+
+    def reset(self):
+        self.sent = []
+        self.counts = {}
+        self.bytes = 0
@@ -0,0 +1,72 @@
+"""
+Sink-tree forwarding protected by OpenFlow fast-failover groups.
+
+Every switch of the sink tree of a destination gets, besides its primary
+next hop, a backup next hop towards the same destination whose path does
+not use the primary link. The eth_dst rule then points at an OFPGT_FF
+group with a bucket watching the primary port and one watching the backup
+port: when the primary port goes down the switch moves the traffic to the
+backup on its own, within the time it takes to notice the port is down,
+instead of blackholing it until LLDP times out and the controller
+reroutes.
+
+The backup is a loop-free alternate (RFC 5286). Preferably it is an
+equal-cost next hop, else the cheapest downstream neighbour (closer to the
+destination than the switch itself, so its own shortest path never comes
+back through the switch), else any neighbour n that meets the LFA
+inequality D(n, dst) < D(n, switch) + D(switch, dst). Downstream backups
+stay loop-free when several links fail at once; the last kind only protects
+against one failure. A switch without any alternate keeps a plain output
+rule.
+
+The backups follow the topology: refresh() recomputes primaries and backups
+of every installed destination, which SimpleSwitch13 does in the background
+after topology and link cost changes since the switches already have a
+working detour.
+"""
+
+from routing import INF, shortest_path_tree
+from sink_tree import SinkTreeInstaller
+
+
+class FastFailoverInstaller(SinkTreeInstaller):
+
+    group_type = 'OFPGT_FF'
+
+    def _entry(self, dpid, eth_dst, dst_dpid, host_port, next_hops, dist):
+        if dpid == dst_dpid:
+            return ('port', host_port)
+        primary = next_hops[dpid][0]
+        primary_port = self.topology.link_ports(dpid, primary)[0]
+        backup = self.backup_next_hop(dpid, primary, next_hops, dist)
+        if backup is None:
+            return ('port', primary_port)
+        return ('group', self._group_id(dpid, eth_dst),
+                (primary_port, self.topology.link_ports(dpid, backup)[0]))
+
+    def backup_next_hop(self, dpid, primary, next_hops, dist):
+        "The loop-free alternate of dpid to its primary next hop, or None."
+        alternates = [v for v in next_hops[dpid] if v != primary]
+        if alternates:
+            return alternates[0]
+
+        graph = self.topology.route_table.graph
+        neighbors = sorted((cost + dist[v], v) for v, cost in graph.get(dpid, {}).items()
+                           if v != primary and v in dist)
+        for _, v in neighbors:
+            if dist[v] < dist[dpid]:
+                return v
+        for _, v in neighbors:
+            back, _ = shortest_path_tree(graph, v, dpid)
+            if dist[v] < back.get(dpid, INF) + dist[dpid]:
+                return v
+        return None
+
+    @staticmethod
+    def _buckets(datapath, ports):
+        "Buckets in order of preference, each live while the port it outputs to is up."
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        return [parser.OFPBucket(watch_port=port, watch_group=ofproto.OFPG_ANY,
+                                 actions=[parser.OFPActionOutput(port)])
+                for port in ports]
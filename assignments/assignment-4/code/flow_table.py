@@ -0,0 +1,199 @@
+"""
+Flow table occupancy manager.
+
+Every FlowMod the controller installs goes through install(), which gives
+it the idle/hard timeouts of its traffic class, a unique cookie and the
+OFPFF_SEND_FLOW_REM flag, and records it per datapath in least recently
+used order. The switch's flow stats are polled every FLOW_STATS_INTERVAL:
+an entry whose packet count went up since the last reply (stats_reply())
+moves to the back, as does an entry installed again. The switch reports
+entries that time out or get deleted with a FlowRemoved message
+(removed()); when a datapath reaches its budget the least recently used
+entries are deleted proactively before the new one is added (evict(),
+which also calls the on_removed callback).
+
+Occupancy and removal/eviction counters per datapath come from stats().
+"""
+
+import collections
+import time
+
+# Entries tracked per switch before the least recently used are evicted
+FLOW_BUDGET = 1000
+# Seconds between two flow stats requests to a switch, which tell the entries in use
+FLOW_STATS_INTERVAL = 10
+
+# Traffic class -> (idle timeout, hard timeout) in seconds, 0 means none
+FLOW_CLASSES = {
+    # table-miss and other entries the controller relies on, never tracked
+    'permanent': (0, 0),
+    # shortest path / multipath rules towards a host, refreshed by the traffic itself
+    'path': (60, 0),
+    # learning switch rules, whose port can go stale when a host moves
+    'learning': (30, 300),
+}
+
+# FlowRemoved reasons, OFPRR_* in OpenFlow 1.3
+REMOVED_REASONS = {0: 'idle_timeout', 1: 'hard_timeout', 2: 'delete', 3: 'group_delete'}
+
+
+class _Entry(object):
+
+    def __init__(self, cookie, table_id, priority, match, flow_class, installed):
+        self.cookie = cookie
+        self.table_id = table_id
+        self.priority = priority
+        self.match = match
+        self.flow_class = flow_class
+        self.installed = installed
+        # packet count of the last flow stats reply
+        self.packets = 0
+
+
+class FlowTable(object):
+    "The entries of one datapath, least recently used first."
+
+    def __init__(self, budget):
+        self.budget = budget
+        # (table id, priority, match items) -> _Entry
+        self.entries = collections.OrderedDict()
+        self.max_entries = 0
+        self.installs = 0
+        self.evictions = 0
+        # FlowRemoved reason name -> count
+        self.removed = collections.Counter()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class FlowTableManager(object):
+
+    def __init__(self, send_queues, budget=FLOW_BUDGET, classes=FLOW_CLASSES, on_removed=None,
+                 clock=time.time):
+        self.send_queues = send_queues
+        self.budget = budget
+        self.classes = classes
+        # on_removed(datapath, match) is called for every entry evicted or reported removed
+        self.on_removed = on_removed
+        self.clock = clock
+        self.started = clock()
+        # dpid -> FlowTable
+        self.tables = {}
+        # per dpid budgets that differ from the default one
+        self.budgets = {}
+        self.last_cookie = 0
+
+    def table(self, dpid):
+        table = self.tables.get(dpid)
+        if table is None:
+            table = FlowTable(self.budgets.get(dpid, self.budget))
+            self.tables[dpid] = table
+        return table
+
+    def set_budget(self, dpid, budget):
+        self.budgets[dpid] = budget
+        if dpid in self.tables:
+            self.tables[dpid].budget = budget
+
+    def install(self, datapath, priority, match, flow_class, table_id=0):
+        """
+        Record an entry about to be added on datapath. Returns the
+        (cookie, idle_timeout, hard_timeout, flags) to put in its FlowMod.
+        Entries of the 'permanent' class are not tracked.
+        """
+        idle_timeout, hard_timeout = self.classes[flow_class]
+        if flow_class == 'permanent':
+            return 0, idle_timeout, hard_timeout, 0
+
+        table = self.table(datapath.id)
+        key = (table_id, priority, tuple(match.items()))
+        if key in table.entries:
+            # re-installing an entry replaces it on the switch, cookie included
+            del table.entries[key]
+        while len(table.entries) >= table.budget:
+            self.evict(datapath, table)
+        self.last_cookie += 1
+        table.entries[key] = _Entry(self.last_cookie, table_id, priority, match, flow_class, self.clock())
+        table.installs += 1
+        table.max_entries = max(table.max_entries, len(table.entries))
+        return self.last_cookie, idle_timeout, hard_timeout, datapath.ofproto.OFPFF_SEND_FLOW_REM
+
+    def has(self, dpid, priority, match, table_id=0):
+        table = self.tables.get(dpid)
+        return table is not None and (table_id, priority, tuple(match.items())) in table.entries
+
+    def touch(self, dpid, priority, match, table_id=0):
+        "Mark an entry as recently used."
+        table = self.tables.get(dpid)
+        key = (table_id, priority, tuple(match.items()))
+        if table is not None and key in table.entries:
+            table.entries.move_to_end(key)
+
+    def stats_reply(self, dpid, body):
+        """
+        Mark the entries that matched packets since the previous flow stats
+        reply of dpid as recently used. body is the list of OFPFlowStats.
+        Returns how many entries were touched.
+        """
+        table = self.tables.get(dpid)
+        if table is None:
+            return 0
+        touched = 0
+        for stat in body:
+            key = (stat.table_id, stat.priority, tuple(stat.match.items()))
+            entry = table.entries.get(key)
+            if entry is None or entry.cookie != stat.cookie or stat.packet_count <= entry.packets:
+                continue
+            entry.packets = stat.packet_count
+            table.entries.move_to_end(key)
+            touched += 1
+        return touched
+
+    def evict(self, datapath, table):
+        "Delete the least recently used entry of datapath."
+        _, entry = table.entries.popitem(last=False)
+        table.evictions += 1
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        self.send_queues.put(datapath, parser.OFPFlowMod(
+            datapath, cookie=entry.cookie, cookie_mask=0xffffffffffffffff, table_id=entry.table_id,
+            command=ofproto.OFPFC_DELETE_STRICT, priority=entry.priority,
+            out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY, match=entry.match))
+        if self.on_removed is not None:
+            self.on_removed(datapath, entry.match)
+
+    def removed(self, msg):
+        "Handle the FlowRemoved message of an entry that timed out or was deleted."
+        table = self.tables.get(msg.datapath.id)
+        if table is None:
+            return
+        table.removed[REMOVED_REASONS.get(msg.reason, msg.reason)] += 1
+        key = (msg.table_id, msg.priority, tuple(msg.match.items()))
+        entry = table.entries.get(key)
+        # a stale report for an entry that has been installed again since
+        if entry is None or entry.cookie != msg.cookie:
+            return
+        del table.entries[key]
+        if self.on_removed is not None:
+            self.on_removed(msg.datapath, msg.match)
+
+    def remove(self, dpid):
+        "Forget a datapath that disconnected, its tables are gone."
+        self.tables.pop(dpid, None)
+
+    def stats(self):
+        elapsed = max(self.clock() - self.started, 1e-9)
+        stats = {}
+        for dpid, table in self.tables.items():
+            stats[dpid] = {
+                'entries': len(table),
+                'budget': table.budget,
+                'occupancy': float(len(table)) / table.budget if table.budget else 0.0,
+                'max_entries': table.max_entries,
+                'installs': table.installs,
+                'evictions': table.evictions,
+                'evictions_per_s': table.evictions / elapsed,
+                'removed': dict(table.removed),
+            }
+        return stats
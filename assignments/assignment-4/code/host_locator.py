@@ -0,0 +1,83 @@
+"""
+Host location service: which switch port every known MAC address sits behind.
+
+Entries are keyed by the MAC as a 48-bit integer so a lookup is a single
+dict hit. They are filled from the topology discovery (EventHostAdd) and
+from packet-ins on edge ports, refreshed whenever the host is seen again
+and aged out when it has been silent for longer than max_age seconds.
+"""
+
+import time
+
+# Seconds a host stays known without being seen again
+HOST_MAX_AGE = 300
+
+
+def mac_to_int(mac):
+    "'00:00:00:00:00:01' -> 1. Integers are returned unchanged."
+    if isinstance(mac, int):
+        return mac
+    return int(mac.replace(':', ''), 16)
+
+
+def int_to_mac(value):
+    "1 -> '00:00:00:00:00:01'"
+    h = '%012x' % value
+    return ':'.join(h[i:i + 2] for i in range(0, 12, 2))
+
+
+class HostLocator(object):
+
+    def __init__(self, max_age=HOST_MAX_AGE, clock=time.time):
+        self.max_age = max_age
+        self.clock = clock
+        # mac (int) -> (dpid, port, last seen)
+        self.hosts = {}
+        self.moves = 0
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def __contains__(self, mac):
+        return mac_to_int(mac) in self.hosts
+
+    def learn(self, mac, dpid, port, now=None):
+        """
+        Record that mac was seen behind (dpid, port). Returns the previous
+        (dpid, port) if the host moved, otherwise None.
+        """
+        if now is None:
+            now = self.clock()
+        key = mac_to_int(mac)
+        old = self.hosts.get(key)
+        self.hosts[key] = (dpid, port, now)
+        if old is not None and (old[0], old[1]) != (dpid, port):
+            self.moves += 1
+            return old[0], old[1]
+        return None
+
+    def lookup(self, mac):
+        "Return (dpid, port) of mac, or None if the host is not known."
+        entry = self.hosts.get(mac_to_int(mac))
+        if entry is None:
+            return None
+        return entry[0], entry[1]
+
+    def dpid(self, mac):
+        entry = self.hosts.get(mac_to_int(mac))
+        if entry is None:
+            return None
+        return entry[0]
+
+    def forget(self, mac):
+        return self.hosts.pop(mac_to_int(mac), None) is not None
+
+    def expire(self, now=None):
+        "Drop the hosts not seen for max_age seconds and return their MACs."
+        if now is None:
+            now = self.clock()
+        deadline = now - self.max_age
+        expired = [mac for mac, entry in self.hosts.items() if entry[2] < deadline]
+        for mac in expired:
+            del self.hosts[mac]
+        return expired
@@ -0,0 +1,145 @@
+"""
+Coalescing of duplicate packet-ins while a path install is in flight.
+
+Until the flow entries of a new flow reach the switches, every packet of
+that flow is sent to the controller again. The first packet-in for a
+(src MAC, dst MAC, ingress dpid) key starts the route computation and
+installation; the later ones are only buffered on the key. When the
+barrier replies of every switch touched by the install have come back,
+the first packet and the buffered ones are handed back for release (a
+packet-out through the now installed flow table): a barrier only orders
+the messages of its own switch, so a packet sent before every reply is in
+could reach a downstream switch ahead of its flow entry. A key whose barriers never come back is expired
+after timeout seconds, so nothing waits forever.
+
+A short negative cache remembers the keys that were just flooded because
+their destination is unknown, so repeated packet-ins of the same flow are
+not flooded over and over again.
+"""
+
+import time
+
+# Seconds to wait for the barrier replies of an install
+INFLIGHT_TIMEOUT = 1.0
+# Packets buffered per in-flight key; later ones are dropped
+MAX_BUFFERED = 32
+# Seconds a flooded (unknown destination) key suppresses further floods
+NEGATIVE_TTL = 1.0
+
+
+class _Install(object):
+
+    def __init__(self, started, first=None):
+        self.started = started
+        # the packet-in that started the install, released with the buffered ones
+        self.first = first
+        # (dpid, xid) of the barriers still to be answered
+        self.barriers = set()
+        self.buffered = []
+        self.dropped = 0
+
+
+class InflightTable(object):
+
+    def __init__(self, timeout=INFLIGHT_TIMEOUT, max_buffered=MAX_BUFFERED,
+                 negative_ttl=NEGATIVE_TTL, clock=time.time):
+        self.timeout = timeout
+        self.max_buffered = max_buffered
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        # key -> _Install
+        self.pending = {}
+        # (dpid, xid) -> key
+        self.barriers = {}
+        # key -> time the flood expires
+        self.flooded = {}
+        self.coalesced = 0
+        self.suppressed = 0
+
+    def begin(self, key, msg):
+        """
+        Called for every packet-in of key. Returns True if the caller should
+        compute and install the route, False if msg has been buffered behind
+        an install already in flight (or dropped because the buffer is full).
+        """
+        install = self.pending.get(key)
+        if install is not None and self.clock() - install.started < self.timeout:
+            self.coalesced += 1
+            if len(install.buffered) < self.max_buffered:
+                install.buffered.append(msg)
+            else:
+                install.dropped += 1
+            return False
+        fresh = _Install(self.clock(), msg)
+        if install is not None:
+            # the previous install timed out, keep its packets for this one
+            fresh.buffered = self._finish(key)
+        self.pending[key] = fresh
+        return True
+
+    def installed(self, key, barriers):
+        """
+        The install for key has been sent; barriers are the barrier requests
+        ending it. Returns the first and the buffered packets right away if
+        there is nothing to wait for.
+        """
+        install = self.pending.get(key)
+        if install is None:
+            return []
+        for barrier in barriers:
+            ref = (barrier.datapath.id, barrier.xid)
+            install.barriers.add(ref)
+            self.barriers[ref] = key
+        if not install.barriers:
+            return self._finish(key)
+        return []
+
+    def abort(self, key):
+        "No route was installed; returns the packets buffered meanwhile, the caller handles the first."
+        install = self.pending.get(key)
+        if install is not None:
+            install.first = None
+        return self._finish(key)
+
+    def barrier_reply(self, dpid, xid):
+        "Returns the first and the buffered packets of the install this reply completes, if any."
+        key = self.barriers.pop((dpid, xid), None)
+        if key is None or key not in self.pending:
+            return []
+        install = self.pending[key]
+        install.barriers.discard((dpid, xid))
+        if install.barriers:
+            return []
+        return self._finish(key)
+
+    def expire(self):
+        "Give up on the installs older than timeout; returns their first and buffered packets."
+        now = self.clock()
+        released = []
+        for key, install in list(self.pending.items()):
+            if now - install.started >= self.timeout:
+                released.extend(self._finish(key))
+        for key, until in list(self.flooded.items()):
+            if until <= now:
+                del self.flooded[key]
+        return released
+
+    def should_flood(self, key):
+        "False if key was flooded less than negative_ttl ago."
+        now = self.clock()
+        until = self.flooded.get(key)
+        if until is not None and until > now:
+            self.suppressed += 1
+            return False
+        self.flooded[key] = now + self.negative_ttl
+        return True
+
+    def _finish(self, key):
+        install = self.pending.pop(key, None)
+        if install is None:
+            return []
+        for ref in install.barriers:
+            self.barriers.pop(ref, None)
+        if install.first is None:
+            return install.buffered
+        return [install.first] + install.buffered
@@ -0,0 +1,127 @@
+"""
+Link delay measurement.
+
+Every probe interval the controller sends a probe frame out of each
+inter-switch port with a packet-out; the switch at the other end of the
+link hands it back in a packet-in. The probe carries the dpid and port it
+was sent from and the time it was sent, so
+
+    one-way delay = (received - sent) - rtt(src) / 2 - rtt(dst) / 2
+
+where rtt(dpid) is the control channel round trip to a switch, measured
+with OFP echo requests that carry their own send time.
+
+The raw samples of a link are smoothed with an EWMA. The routing cost of a
+link is the smoothed delay in ms, rounded to the cost resolution, and it is
+only published when it moves away from the last published cost by more
+than the hysteresis band, so jitter does not make the routes flap.
+"""
+
+import struct
+import time
+
+# Ethertype of the probe frames (IEEE 802 local experimental)
+ETH_TYPE_PROBE = 0x88b5
+# Seconds between two rounds of probes and echo requests
+PROBE_INTERVAL = 1.0
+# Weight of a new sample in the moving averages
+EWMA_ALPHA = 0.2
+# Link costs are delays in ms rounded to this, and never below it
+COST_RESOLUTION = 1.0
+# A cost is republished when the smoothed delay moves more than
+# max(HYSTERESIS_MS, HYSTERESIS_RATIO * current cost) away from it
+HYSTERESIS_MS = 2.0
+HYSTERESIS_RATIO = 0.1
+
+# dst, src (16 + 32 bit each), ethertype, then dpid, port and send time
+_PROBE = struct.Struct('!HIHIHQId')
+# locally administered multicast, never a host address
+_PROBE_DST = (0x0300, 0x000088b5)
+_ECHO = struct.Struct('!4sd')
+_ECHO_MAGIC = b'dly1'
+
+
+def probe_frame(dpid, port_no, sent):
+    return _PROBE.pack(_PROBE_DST[0], _PROBE_DST[1], 0x0200, dpid & 0xffffffff,
+                       ETH_TYPE_PROBE, dpid, port_no, sent)
+
+
+def parse_probe(data):
+    "Return (dpid, port, send time) of a probe frame, or None."
+    if len(data) < _PROBE.size:
+        return None
+    fields = _PROBE.unpack_from(data)
+    if fields[4] != ETH_TYPE_PROBE:
+        return None
+    return fields[5], fields[6], fields[7]
+
+
+class DelayMonitor(object):
+
+    def __init__(self, alpha=EWMA_ALPHA, resolution=COST_RESOLUTION,
+                 hysteresis_ms=HYSTERESIS_MS, hysteresis_ratio=HYSTERESIS_RATIO, clock=time.time):
+        self.alpha = alpha
+        self.resolution = resolution
+        self.hysteresis_ms = hysteresis_ms
+        self.hysteresis_ratio = hysteresis_ratio
+        self.clock = clock
+        # dpid -> smoothed control channel round trip in seconds
+        self.rtt = {}
+        # (src, dst) -> last and smoothed one-way delay in ms
+        self.last_sample = {}
+        self.delays = {}
+        # (src, dst) -> cost last handed to the routing engine
+        self.costs = {}
+        self.samples = 0
+
+    def _smooth(self, table, key, sample):
+        old = table.get(key)
+        table[key] = sample if old is None else old + self.alpha * (sample - old)
+        return table[key]
+
+    def echo_data(self):
+        "Payload of an echo request, it comes back unchanged in the reply."
+        return _ECHO.pack(_ECHO_MAGIC, self.clock())
+
+    def echo_reply(self, dpid, data):
+        "Record the round trip of an echo request sent with echo_data()."
+        if len(data) != _ECHO.size:
+            return
+        magic, sent = _ECHO.unpack(data)
+        if magic == _ECHO_MAGIC:
+            self._smooth(self.rtt, dpid, self.clock() - sent)
+
+    def probe(self, dpid, port_no):
+        return probe_frame(dpid, port_no, self.clock())
+
+    def probe_received(self, src, dst, sent):
+        """
+        Add the sample of a probe sent by src and received from dst. Returns
+        the new cost of the (src, dst) link if it changed enough to be
+        published, otherwise None.
+        """
+        if src not in self.rtt or dst not in self.rtt:
+            # no control channel correction yet
+            return None
+        delay = (self.clock() - sent - self.rtt[src] / 2 - self.rtt[dst] / 2) * 1000.0
+        self.last_sample[(src, dst)] = max(delay, 0.0)
+        smoothed = self._smooth(self.delays, (src, dst), max(delay, 0.0))
+        self.samples += 1
+
+        cost = max(round(smoothed / self.resolution) * self.resolution, self.resolution)
+        old = self.costs.get((src, dst))
+        if old is not None and abs(smoothed - old) <= max(self.hysteresis_ms, self.hysteresis_ratio * old):
+            return None
+        if cost == old:
+            return None
+        self.costs[(src, dst)] = cost
+        return cost
+
+    def cost(self, src, dst, default=None):
+        return self.costs.get((src, dst), default)
+
+    def forget(self, src, dst):
+        "Drop the estimate of a link that went away."
+        self.last_sample.pop((src, dst), None)
+        self.delays.pop((src, dst), None)
+        self.costs.pop((src, dst), None)
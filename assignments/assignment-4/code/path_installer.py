@@ -0,0 +1,115 @@
+"""
+Installs the flow entries of a whole shortest path in one pass.
+
+A path [s1, s2, ..., sn] is turned into hops (dpid, in_port, out_port) with
+the switch-to-switch ports of the discovered links. The flow-mods
+are queued from the last hop back to the first, and every switch's send
+queue is then flushed, which ends with a barrier. A barrier only orders the
+messages of its own switch, so the caller holds the packet back until every
+barrier on the path is answered (see InflightTable) and only then sends it
+through the flow table of the ingress switch.
+
+The hops of every installed path are remembered: after a topology change
+refresh() deletes the entries of the paths that cross a link or switch
+that is gone, so the next packet of the flow comes back to the controller
+and is routed again instead of being sent into the failed link until its
+entries time out.
+"""
+
+
+def path_hops(path, link_ports, in_port, out_port):
+    """
+    Return [(dpid, in_port, out_port), ...] along path, entering the first
+    switch on in_port and leaving the last one on out_port. link_ports(src,
+    dst) gives the (egress, ingress) ports of a link, or None if the link
+    has not been discovered, in which case None is returned.
+    """
+    hops = []
+    for i, dpid in enumerate(path):
+        if i > 0:
+            link = link_ports(path[i - 1], dpid)
+            if link is None:
+                return None
+            in_port = link[1]
+        if i < len(path) - 1:
+            link = link_ports(dpid, path[i + 1])
+            if link is None:
+                return None
+            hop_out = link[0]
+        else:
+            hop_out = out_port
+        hops.append((dpid, in_port, hop_out))
+    return hops
+
+
+class PathInstaller(object):
+
+    def __init__(self, add_flow, send_queues, priority=1, table_id=0):
+        # add_flow(datapath, priority, match, actions), i.e. SimpleSwitch13.add_flow,
+        # queues its FlowMod on send_queues
+        self.add_flow = add_flow
+        self.send_queues = send_queues
+        self.priority = priority
+        # the table add_flow installs the entries in, for deleting them again
+        self.table_id = table_id
+        # (eth_dst, ingress dpid, ingress port) -> hops of the installed path
+        self.paths = {}
+
+    def install(self, datapaths, hops, eth_dst):
+        """
+        Push the flow entries for eth_dst along hops, last hop first, then
+        flush every switch on the path (one batch and barrier per switch).
+        Returns the barrier requests, or None without sending anything if
+        one of the switches is not connected.
+        """
+        if any(dpid not in datapaths for dpid, _, _ in hops):
+            return None
+
+        for dpid, in_port, out_port in reversed(hops):
+            datapath = datapaths[dpid]
+            parser = datapath.ofproto_parser
+            match = parser.OFPMatch(in_port=in_port, eth_dst=eth_dst)
+            actions = [parser.OFPActionOutput(out_port)]
+            self.add_flow(datapath, self.priority, match, actions)
+
+        self.paths[(eth_dst, hops[0][0], hops[0][1])] = hops
+        barriers = [self.send_queues.flush(datapaths[dpid]) for dpid, _, _ in hops]
+        return [barrier for barrier in barriers if barrier is not None]
+
+    def refresh(self, datapaths, link_ports):
+        """
+        Delete the entries of the installed paths that lost a link or a
+        switch after a topology change, except the ones a path still intact
+        shares. link_ports is as for path_hops(). Returns how many paths
+        were removed.
+        """
+        broken = [key for key, hops in self.paths.items() if not self._intact(datapaths, link_ports, hops)]
+        if not broken:
+            return 0
+        removed = [(key[0], self.paths.pop(key)) for key in broken]
+        kept = set((eth_dst, hop) for (eth_dst, _, _), hops in self.paths.items() for hop in hops)
+        for eth_dst, hops in removed:
+            for hop in hops:
+                datapath = datapaths.get(hop[0])
+                if datapath is not None and (eth_dst, hop) not in kept:
+                    self._delete_flow(datapath, hop[1], eth_dst)
+        return len(removed)
+
+    def forget(self, eth_dst):
+        "Forget the paths towards eth_dst, whose entries the caller deleted (e.g. the host moved)."
+        for key in [key for key in self.paths if key[0] == eth_dst]:
+            del self.paths[key]
+
+    @staticmethod
+    def _intact(datapaths, link_ports, hops):
+        if any(dpid not in datapaths for dpid, _, _ in hops):
+            return False
+        return all(link_ports(a[0], b[0]) == (a[2], b[1]) for a, b in zip(hops, hops[1:]))
+
+    def _delete_flow(self, datapath, in_port, eth_dst):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        self.send_queues.put(datapath, parser.OFPFlowMod(
+            datapath, command=ofproto.OFPFC_DELETE_STRICT, table_id=self.table_id,
+            priority=self.priority, out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY,
+            match=parser.OFPMatch(in_port=in_port, eth_dst=eth_dst)))
@@ -0,0 +1,144 @@
+"""
+Port statistics polling and link utilisation.
+
+OFPPortStatsRequests are sent in the background; the utilisation of a port
+is the rate of its tx_bytes counter between two replies (timed with the
+duration fields of the replies, so control channel delays do not skew it)
+over the port capacity, smoothed with an EWMA. Nothing is injected in the
+data plane.
+
+Every switch has its own polling interval: it is halved, down to
+min_interval, while one of its ports is busy or its utilisation moves, and
+doubled, up to max_interval, while it stays idle and steady. due() only
+returns the switches whose interval has elapsed, so the set polled each
+round follows the load.
+
+The capacity of a port is the one set with set_capacity(), else the
+curr_speed the switch reports, else DEFAULT_CAPACITY. Rate limits applied
+outside the switch (e.g. Mininet TCLink bw=) are invisible to it and have to
+be set explicitly.
+"""
+
+import time
+
+# Bounds of the per switch polling interval in seconds
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 16.0
+# Weight of a new sample in the smoothed utilisation
+UTIL_ALPHA = 0.5
+# A switch with a port above this utilisation is polled at the fastest rate
+BUSY_UTILISATION = 0.5
+# A utilisation change larger than this is reported to the routing
+UTIL_HYSTERESIS = 0.1
+# Capacity in bit/s of a port whose speed is unknown
+DEFAULT_CAPACITY = 10 * 10 ** 6
+# Cost in ms added to a fully utilised link: cost = delay + CONGESTION_WEIGHT * utilisation
+CONGESTION_WEIGHT = 20.0
+
+
+class _Switch(object):
+
+    def __init__(self, interval, next_poll):
+        self.interval = interval
+        self.next_poll = next_poll
+        # port -> (tx_bytes, rx_bytes, duration in seconds)
+        self.counters = {}
+
+
+class PortStatsMonitor(object):
+
+    def __init__(self, min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL,
+                 alpha=UTIL_ALPHA, clock=time.time):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self.clock = clock
+        self.switches = {}
+        # (dpid, port) -> smoothed tx utilisation, 0..1
+        self.utilisation = {}
+        # (dpid, port) -> utilisation last reported by stats_reply()
+        self.reported = {}
+        # (dpid, port) -> bit/s, set explicitly or from the port speed
+        self.capacities = {}
+        self.speeds = {}
+        self.polls = 0
+
+    def add(self, dpid):
+        if dpid not in self.switches:
+            self.switches[dpid] = _Switch(self.min_interval, self.clock())
+
+    def remove(self, dpid):
+        self.switches.pop(dpid, None)
+        for key in [key for key in self.utilisation if key[0] == dpid]:
+            del self.utilisation[key]
+            self.reported.pop(key, None)
+
+    def due(self):
+        "The switches to poll now; their next poll is scheduled one interval later."
+        now = self.clock()
+        polled = []
+        for dpid, switch in self.switches.items():
+            if switch.next_poll <= now:
+                switch.next_poll = now + switch.interval
+                polled.append(dpid)
+        self.polls += len(polled)
+        return polled
+
+    def next_due(self):
+        "Seconds until the next switch is due."
+        if not self.switches:
+            return self.min_interval
+        return max(min(s.next_poll for s in self.switches.values()) - self.clock(), 0.0)
+
+    def set_capacity(self, dpid, port_no, bps):
+        self.capacities[(dpid, port_no)] = bps
+
+    def capacity(self, dpid, port_no):
+        key = (dpid, port_no)
+        return self.capacities.get(key) or self.speeds.get(key) or DEFAULT_CAPACITY
+
+    def stats_reply(self, dpid, body, ports=None):
+        """
+        Take the OFPPortStats of one reply; ports is the {port_no: OFPPort}
+        description of the switch, for the port speeds. Returns the
+        (dpid, port) whose utilisation moved more than UTIL_HYSTERESIS since
+        it was last returned.
+        """
+        switch = self.switches.get(dpid)
+        if switch is None:
+            return []
+        changed = []
+        busy = False
+        for stat in body:
+            port_no = stat.port_no
+            if ports is not None and port_no in ports and ports[port_no].curr_speed:
+                # curr_speed is in kbit/s
+                self.speeds[(dpid, port_no)] = ports[port_no].curr_speed * 1000
+            duration = stat.duration_sec + stat.duration_nsec / 1e9
+            old = switch.counters.get(port_no)
+            switch.counters[port_no] = (stat.tx_bytes, stat.rx_bytes, duration)
+            if old is None or duration <= old[2] or stat.tx_bytes < old[0]:
+                # first sample, or the port was reset
+                continue
+            rate = (stat.tx_bytes - old[0]) * 8 / (duration - old[2])
+            sample = min(rate / self.capacity(dpid, port_no), 1.0)
+            key = (dpid, port_no)
+            util = self.utilisation.get(key, sample)
+            util += self.alpha * (sample - util)
+            self.utilisation[key] = util
+            if util >= BUSY_UTILISATION:
+                busy = True
+            if abs(util - self.reported.get(key, 0.0)) > UTIL_HYSTERESIS:
+                self.reported[key] = util
+                changed.append(key)
+
+        if busy or changed:
+            switch.interval = max(switch.interval / 2, self.min_interval)
+        else:
+            switch.interval = min(switch.interval * 2, self.max_interval)
+        switch.next_poll = min(switch.next_poll, self.clock() + switch.interval)
+        return changed
+
+    def link_utilisation(self, dpid, port_no):
+        "Utilisation of the link behind the egress port, as last reported."
+        return self.reported.get((dpid, port_no), 0.0)
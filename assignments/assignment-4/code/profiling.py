@@ -0,0 +1,146 @@
+"""
+Low overhead profiling of the controller's handlers.
+
+decorate_it in assignment-1 is a pass-through wrapper; profile() replaces
+it with the same wrapper and a stopwatch around the call (the assignment-1
+module reads from stdin when imported, so it is not imported here):
+
+    @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    @profiled()
+    def _packet_in_handler(self, ev):
+
+Every call is counted, and every sample-th call is timed with
+perf_counter_ns into an HDR-style histogram: log-linear buckets with
+SUB_BUCKETS per power of two, so any latency is recorded within ~3 % in a
+fixed array of counters, and percentiles are read off the buckets.
+
+The profiler also counts the messages sent per datapath and kind (e.g.
+packet-outs); report() gathers everything for a periodic dump.
+"""
+
+import collections
+import functools
+import time
+
+# Linear sub-buckets per power of two, the relative precision is 1 / (SUB_BUCKETS / 2)
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Largest latency recorded exactly, in ns (about 18 minutes); longer ones land in the last bucket
+MAX_VALUE_BITS = 40
+
+_HALF = SUB_BUCKETS // 2
+_BUCKETS = (MAX_VALUE_BITS - SUB_BUCKET_BITS) * _HALF + SUB_BUCKETS
+
+
+def bucket_index(value):
+    magnitude = max(value.bit_length() - SUB_BUCKET_BITS, 0)
+    return min(magnitude * _HALF + (value >> magnitude), _BUCKETS - 1)
+
+
+def bucket_value(index):
+    "Lowest value of a bucket."
+    if index < SUB_BUCKETS:
+        return index
+    magnitude = (index - _HALF) // _HALF
+    return (index - magnitude * _HALF) << magnitude
+
+
+class LatencyHistogram(object):
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        self.counts[bucket_index(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q):
+        "q-th percentile (0..100) in ns, or None if nothing was recorded."
+        if not self.count:
+            return None
+        rank = max(int(q / 100.0 * self.count + 0.5), 1)
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bucket_value(index + 1) - 1, self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / float(self.count) if self.count else None
+
+    def merge(self, other):
+        "Add the samples of another histogram, e.g. of another process."
+        for index, n in enumerate(other.counts):
+            self.counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+
+class Profiler(object):
+
+    def __init__(self, clock=time.perf_counter_ns):
+        self.clock = clock
+        # name -> number of calls, timed or not
+        self.calls = collections.Counter()
+        # name -> LatencyHistogram of the timed calls
+        self.latency = collections.defaultdict(LatencyHistogram)
+        # dpid -> Counter of the messages sent, by kind
+        self.messages = collections.defaultdict(collections.Counter)
+
+    def profile(self, name=None, sample=1):
+        """
+        Decorator counting the calls of a function and timing one call in
+        sample. name defaults to the function name.
+        """
+        def decorate_it(func):
+            key = name or func.__name__
+            calls = self.calls
+            latency = self.latency[key]
+            clock = self.clock
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                calls[key] += 1
+                if calls[key] % sample:
+                    return func(*args, **kwargs)
+                start = clock()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    latency.record(clock() - start)
+            return wrapper
+        return decorate_it
+
+    def count(self, dpid, kind, n=1):
+        self.messages[dpid][kind] += n
+
+    def report(self):
+        "{'handlers': {name: stats}, 'datapaths': {dpid: {kind: count}}}, latencies in us."
+        handlers = {}
+        for name, calls in self.calls.items():
+            hist = self.latency[name]
+            handlers[name] = {
+                'calls': calls,
+                'timed': hist.count,
+                'mean_us': hist.mean() / 1e3 if hist.count else None,
+                'p50_us': hist.percentile(50) / 1e3 if hist.count else None,
+                'p99_us': hist.percentile(99) / 1e3 if hist.count else None,
+                'max_us': hist.max / 1e3,
+            }
+        return {
+            'handlers': handlers,
+            'datapaths': dict((dpid, dict(kinds)) for dpid, kinds in self.messages.items()),
+        }
+
+
+# The profiler of the controller, shared by the modules that decorate with profiled()
+PROFILER = Profiler()
+profiled = PROFILER.profile
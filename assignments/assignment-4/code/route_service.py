@@ -0,0 +1,169 @@
+"""
+Route computations in a pool of worker processes.
+
+Ryu runs every handler on one eventlet hub, so a recomputation of all the
+shortest path trees or of the ECMP next hops of every installed
+destination, done inline, holds back the packet-ins, echo replies and LLDP
+of all the switches until it is over. The RouteService runs them in a
+process pool instead and the hub only checks for finished jobs.
+
+A job is one kind of result for one route table version, computed from a
+CSRGraph of that version (immutable and cheap to pickle):
+
+    'trees'      {src dpid: (dist, parent)}, the RouteTable trees
+    'next_hops'  {dst dpid: (dist, next_hops)}, the routing.ecmp_next_hops DAGs
+
+Its sources or destinations are split into tasks of chunk_size, so that
+submitting a newer job of the same kind cancels the tasks of the older one
+that did not start yet; the result of a superseded task that was already
+running is dropped. collect() hands the finished jobs back to the caller,
+which loads a result only if the route table is still at its version.
+
+Below min_switches switches offload() is False: the computations take less
+than the round trip to the workers and are done inline as before.
+"""
+
+import concurrent.futures
+import concurrent.futures.process
+import multiprocessing
+import time
+
+from routing import ecmp_next_hops, shortest_path_tree
+
+# Worker processes, one core is left to the hub
+WORKERS = max(1, min(4, multiprocessing.cpu_count() - 1))
+# Sources or destinations computed per task
+CHUNK_SIZE = 64
+# Smallest topology whose computations go to the pool
+OFFLOAD_MIN_SWITCHES = 64
+# The workers do not fork the controller with its sockets and eventlet hub
+START_METHOD = 'spawn'
+
+
+def shortest_path_trees(graph, sources):
+    "{src: (dist, parent)} of the CSRGraph graph for the source dpids."
+    adj = graph.adjacency()
+    return dict((src, shortest_path_tree(adj, src)) for src in sources)
+
+
+def next_hop_tables(graph, destinations):
+    "{dst: (dist, next_hops)} of the CSRGraph graph for the destination dpids."
+    adj = graph.adjacency()
+    return dict((dst, ecmp_next_hops(adj, dst)) for dst in destinations)
+
+
+COMPUTATIONS = {
+    'trees': shortest_path_trees,
+    'next_hops': next_hop_tables,
+}
+
+
+class RouteJob(object):
+
+    def __init__(self, kind, version, futures, submitted):
+        self.kind = kind
+        self.version = version
+        self.futures = futures
+        self.submitted = submitted
+        self.cancelled = False
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def cancel(self):
+        "Cancel the tasks that did not start yet."
+        self.cancelled = True
+        for future in self.futures:
+            future.cancel()
+
+    def result(self):
+        "The merged results of the tasks. Raises the error of a failed task."
+        merged = {}
+        for future in self.futures:
+            merged.update(future.result())
+        return merged
+
+
+class RouteService(object):
+
+    def __init__(self, workers=WORKERS, chunk_size=CHUNK_SIZE, min_switches=OFFLOAD_MIN_SWITCHES,
+                 clock=time.time):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.min_switches = min_switches
+        self.clock = clock
+        # started on the first submit
+        self.executor = None
+        # kind -> the newest RouteJob of that kind not collected yet
+        self.jobs = {}
+        self.submitted = 0
+        self.superseded = 0
+        self.completed = 0
+        self.failed = 0
+        self.last_time = None
+
+    def offload(self, switches):
+        "Whether the computations for a topology of this many switches go to the pool."
+        return switches >= self.min_switches
+
+    def submit(self, kind, version, graph, items):
+        """
+        Compute kind for the items (source or destination dpids) of the
+        CSRGraph graph at the route table version. Supersedes the pending job
+        of the same kind unless it is for the same version.
+        """
+        old = self.jobs.get(kind)
+        if old is not None:
+            if old.version == version:
+                return old
+            old.cancel()
+            self.superseded += 1
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context(START_METHOD))
+        compute = COMPUTATIONS[kind]
+        items = sorted(items)
+        futures = [self.executor.submit(compute, graph, items[i:i + self.chunk_size])
+                   for i in range(0, len(items), self.chunk_size)]
+        job = RouteJob(kind, version, futures, self.clock())
+        self.jobs[kind] = job
+        self.submitted += 1
+        return job
+
+    def busy(self, kind):
+        return kind in self.jobs
+
+    def collect(self):
+        "The jobs that finished since the last call, in submission order."
+        finished = sorted((job for job in self.jobs.values() if job.done()), key=lambda job: job.submitted)
+        now = self.clock()
+        for job in finished:
+            del self.jobs[job.kind]
+            errors = [future.exception() for future in job.futures if future.exception() is not None]
+            if errors:
+                self.failed += 1
+                if any(isinstance(e, concurrent.futures.process.BrokenProcessPool) for e in errors):
+                    # a worker died, the pool cannot be used any more
+                    self.executor = None
+            else:
+                self.completed += 1
+                self.last_time = now - job.submitted
+        return finished
+
+    def close(self):
+        for job in self.jobs.values():
+            job.cancel()
+        self.jobs = {}
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def stats(self):
+        return {
+            'pending': sorted(self.jobs),
+            'submitted': self.submitted,
+            'superseded': self.superseded,
+            'completed': self.completed,
+            'failed': self.failed,
+            'last_time': self.last_time,
+        }
@@ -0,0 +1,247 @@
+"""
+All-pairs route table kept up to date incrementally.
+
+One shortest path tree is held for every source switch. A link change only
+repairs the trees that actually contain (or would now use) the changed
+link, instead of re-running Dijkstra from every source:
+
+  * cheaper/new link u->v: relax from v in every tree where it helps;
+  * dearer/removed link u->v: in every tree where u is the parent of v,
+    detach the subtree below v and re-settle it from its remaining
+    neighbours (dynamic SSSP repair).
+
+Every change bumps RouteTable.version and every tree remembers the version
+of its last change, so a cached path is only ever served from the tree
+state it was built from.
+
+Between begin_batch() and end_batch() the links change without any repair
+and end_batch() rebuilds every tree once, which is cheaper than repairing
+them link by link when a whole burst of changes (e.g. the discovery of
+the network) is applied at once. end_batch(rebuild=False) only marks the
+trees outdated: load_trees() then replaces them with trees computed
+elsewhere (by the RouteService, or restored from a snapshot), and until it
+does a lookup rebuilds the one tree it needs.
+"""
+
+import heapq
+
+from routing import INF, build_path, shortest_path_tree
+
+
+class RouteTable(object):
+
+    def __init__(self):
+        # graph[u][v] = cost and its reverse pred[v][u] = cost
+        self.graph = {}
+        self.pred = {}
+        # src -> (dist, parent)
+        self.trees = {}
+        # src -> version at which the tree last changed
+        self.tree_version = {}
+        # (src, dst) -> (tree version, path, cost)
+        self.paths = {}
+        self.version = 0
+        # inside begin_batch()/end_batch(), and whether a link changed since
+        self.batching = False
+        self.stale = False
+        # sources whose tree is behind the links since end_batch(rebuild=False)
+        self.outdated = set()
+
+    def __contains__(self, node):
+        return node in self.graph
+
+    def nodes(self):
+        return list(self.graph)
+
+    def cost(self, u, v):
+        return self.graph.get(u, {}).get(v)
+
+    def add_node(self, node):
+        if node in self.graph:
+            return
+        self.graph[node] = {}
+        self.pred[node] = {}
+        self.version += 1
+        self.trees[node] = ({node: 0}, {node: None})
+        self.tree_version[node] = self.version
+
+    def remove_node(self, node):
+        if node not in self.graph:
+            return
+        for v in list(self.graph[node]):
+            self.remove_link(node, v)
+        for u in list(self.pred[node]):
+            self.remove_link(u, node)
+        del self.graph[node]
+        del self.pred[node]
+        del self.trees[node]
+        del self.tree_version[node]
+        self.outdated.discard(node)
+        self.version += 1
+
+    def set_link(self, u, v, cost):
+        "Add the directed link u->v or change its cost. Returns the repaired sources."
+        self.add_node(u)
+        self.add_node(v)
+        old = self.graph[u].get(v)
+        if old == cost:
+            return []
+        self.graph[u][v] = cost
+        self.pred[v][u] = cost
+        self.version += 1
+        if self.batching:
+            self.stale = True
+            return []
+        if old is None or cost < old:
+            return self._repair_decrease(u, v, cost)
+        return self._repair_increase(u, v)
+
+    def remove_link(self, u, v):
+        "Remove the directed link u->v. Returns the repaired sources."
+        if v not in self.graph.get(u, {}):
+            return []
+        del self.graph[u][v]
+        del self.pred[v][u]
+        self.version += 1
+        if self.batching:
+            self.stale = True
+            return []
+        return self._repair_increase(u, v)
+
+    def lookup(self, src, dst):
+        "Return (path, cost) from src to dst, or (None, INF) if there is none."
+        if src not in self.trees:
+            return None, INF
+        if src in self.outdated:
+            self.outdated.discard(src)
+            self.trees[src] = shortest_path_tree(self.graph, src)
+            self.tree_version[src] = self.version
+        version = self.tree_version[src]
+        cached = self.paths.get((src, dst))
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+        dist, parent = self.trees[src]
+        if dst in dist:
+            path, cost = build_path(parent, dst), dist[dst]
+        else:
+            path, cost = None, INF
+        self.paths[(src, dst)] = (version, path, cost)
+        return path, cost
+
+    def next_hop(self, src, dst):
+        path, _ = self.lookup(src, dst)
+        if path is None or len(path) < 2:
+            return None
+        return path[1]
+
+    def begin_batch(self):
+        self.batching = True
+
+    def end_batch(self, rebuild=True):
+        """
+        Rebuild the trees if a link changed during the batch, or with
+        rebuild=False only mark them outdated. Returns whether a link changed.
+        """
+        self.batching = False
+        if not self.stale:
+            return False
+        self.stale = False
+        if rebuild:
+            self.rebuild()
+        else:
+            self.outdated.update(self.graph)
+        return True
+
+    def load_trees(self, trees, version=None):
+        """
+        Replace the outdated trees with {src: (dist, parent)} computed
+        elsewhere for the links at version (the current links if None). The
+        outdated sources missing from trees are rebuilt. Returns False, and
+        changes nothing, if the links changed after version.
+        """
+        if version is not None and version != self.version:
+            return False
+        for src in self.outdated:
+            tree = trees.get(src)
+            self.trees[src] = tree if tree is not None else shortest_path_tree(self.graph, src)
+            self.tree_version[src] = self.version
+        self.outdated.clear()
+        return True
+
+    def rebuild(self):
+        "Recompute every tree from scratch."
+        self.version += 1
+        for src in self.graph:
+            self.trees[src] = shortest_path_tree(self.graph, src)
+            self.tree_version[src] = self.version
+        self.outdated.clear()
+        self.paths.clear()
+
+    def _repair_decrease(self, u, v, cost):
+        repaired = []
+        for src, (dist, parent) in self.trees.items():
+            du = dist.get(u)
+            if src in self.outdated or du is None or du + cost >= dist.get(v, INF):
+                continue
+            dist[v] = du + cost
+            parent[v] = u
+            self._settle(dist, parent, [(dist[v], v)])
+            self.tree_version[src] = self.version
+            repaired.append(src)
+        return repaired
+
+    def _repair_increase(self, u, v):
+        repaired = []
+        for src, (dist, parent) in self.trees.items():
+            if src in self.outdated or parent.get(v) != u:
+                # the link is not on this tree, so no distance changes
+                continue
+            affected = self._subtree(parent, v)
+            for x in affected:
+                del dist[x]
+                del parent[x]
+            # seed every detached node with its best still-settled neighbour
+            heap = []
+            for x in affected:
+                best, via = INF, None
+                for y, c in self.pred[x].items():
+                    dy = dist.get(y)
+                    if dy is not None and dy + c < best:
+                        best, via = dy + c, y
+                if via is not None:
+                    dist[x] = best
+                    parent[x] = via
+                    heap.append((best, x))
+            heapq.heapify(heap)
+            self._settle(dist, parent, heap)
+            self.tree_version[src] = self.version
+            repaired.append(src)
+        return repaired
+
+    def _settle(self, dist, parent, heap):
+        "Run Dijkstra relaxation from the seeded heap until nothing improves."
+        while heap:
+            d, x = heapq.heappop(heap)
+            if d > dist.get(x, INF):
+                continue
+            for y, c in self.graph[x].items():
+                nd = d + c
+                if nd < dist.get(y, INF):
+                    dist[y] = nd
+                    parent[y] = x
+                    heapq.heappush(heap, (nd, y))
+
+    @staticmethod
+    def _subtree(parent, root):
+        children = {}
+        for x, p in parent.items():
+            if p is not None:
+                children.setdefault(p, []).append(x)
+        subtree = []
+        stack = [root]
+        while stack:
+            x = stack.pop()
+            subtree.append(x)
+            stack.extend(children.get(x, ()))
+        return subtree
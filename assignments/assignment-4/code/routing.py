@@ -0,0 +1,90 @@
+"""
+Shortest path routing engine used by the controller.
+
+The topology is given as an adjacency map of the form
+{node: {neighbor: cost, ...}, ...}, the same shape as SimpleSwitch13.topo.
+All state lives in local variables of the call, so nothing leaks between
+successive lookups.
+"""
+
+import heapq
+
+INF = float('inf')
+
+
+def shortest_path_tree(graph, src, dest=None):
+    "Binary-heap Dijkstra from src. Stops early once dest is settled."
+    if src not in graph:
+        raise TypeError('The root of the shortest path tree cannot be found')
+
+    dist = {src: 0}
+    parent = {src: None}
+    visited = set()
+    heap = [(0, src)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in visited:
+            # stale heap entry, a shorter distance was already settled
+            continue
+        visited.add(u)
+        if u == dest:
+            break
+        for v, cost in graph.get(u, {}).items():
+            nd = d + cost
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                parent[v] = u
+                heapq.heappush(heap, (nd, v))
+    return dist, parent
+
+
+def build_path(parent, dest):
+    "Walk the parent pointers back from dest and return the path root first."
+    path = []
+    p = dest
+    while p is not None:
+        path.append(p)
+        p = parent.get(p)
+    path.reverse()
+    return path
+
+
+def dijkstra(graph, src, dest):
+    """
+    Return (path, cost) of the cheapest path from src to dest.
+    The path is ordered from src to dest; it is None if dest is unreachable.
+    """
+    if dest not in graph:
+        raise TypeError('The target of the shortest path cannot be found')
+
+    dist, parent = shortest_path_tree(graph, src, dest)
+    if dest not in dist:
+        return None, INF
+    return build_path(parent, dest), dist[dest]
+
+
+def reverse(graph):
+    "The graph with every link turned around, for distances towards a node."
+    rev = dict((u, {}) for u in graph)
+    for u, nbrs in graph.items():
+        for v, cost in nbrs.items():
+            rev.setdefault(v, {})[u] = cost
+    return rev
+
+
+def ecmp_next_hops(graph, dest, tolerance=1e-9):
+    """
+    Equal-cost multipath DAG towards dest. Returns (dist, next_hops) where
+    dist[u] is the cost from u to dest and next_hops[u] lists every neighbor
+    of u that lies on one of its shortest paths, so len(next_hops[u]) > 1
+    wherever there are equal-cost alternatives.
+    """
+    dist, _ = shortest_path_tree(reverse(graph), dest)
+    next_hops = {}
+    for u, du in dist.items():
+        if u == dest:
+            continue
+        next_hops[u] = sorted(v for v, cost in graph.get(u, {}).items()
+                              if v in dist and abs(cost + dist[v] - du) <= tolerance)
+    return dist, next_hops
+
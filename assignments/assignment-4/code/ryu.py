@@ -18,50 +18,182 @@ from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
-from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet
 from ryu.lib.packet import ether_types
 from ryu.topology import event
-# Below is the library used for topo discovery
+# Below is the library used for topo discovery, importing it also loads the
+# ryu.topology.switches app which raises the topology events handled here
 from ryu.topology.api import get_switch, get_link, get_host
+from ryu.lib import hub
 
-import copy
+import os
 import subprocess
-import networkx as nx
+import time
+
+from arp_proxy import ArpProxy
+from convergence import ConvergenceManager
+from ecmp import EcmpInstaller
+from ethframe import ETH_TYPE_ARP, parse_eth
+from fast_failover import FastFailoverInstaller
+from flow_table import FLOW_STATS_INTERVAL, FlowTableManager
+from host_locator import int_to_mac
+from inflight import InflightTable
+from link_delay import ETH_TYPE_PROBE, PROBE_INTERVAL, DelayMonitor, parse_probe
+from path_installer import PathInstaller, path_hops
+from port_stats import CONGESTION_WEIGHT, PortStatsMonitor
+from profiling import PROFILER, profiled
+from route_service import RouteService
+from send_queue import SendQueues
+from shard import COORDINATOR_ADDRESS, ShardClient, own_events, parse_address, plain_events, topology_changes
+from sink_tree import SinkTreeInstaller
+import snapshot
+from timeseries import TimeSeriesStore
+from topology_state import TopologyState
+
+# Cost of a discovered link until its delay has been measured
+DEFAULT_LINK_COST = 1
+# Seconds between two sweeps for hosts that went silent
+HOST_AGING_INTERVAL = 30
+# Seconds between two reports of the flow table occupancy
+FLOW_REPORT_INTERVAL = 60
+# Seconds between two dumps of the handler latencies and message counts
+PROFILE_REPORT_INTERVAL = 60
+# Directory the history of the link measurements is memory-mapped to and reopened from after a
+# restart, in memory unless set
+TIMESERIES_DIR = os.environ.get('SIMPLE_SWITCH_TIMESERIES') or None
+# CSV file the history is written to when the controller stops (see dump_timeseries), off unless set
+TIMESERIES_CSV = os.environ.get('SIMPLE_SWITCH_TIMESERIES_CSV') or None
+# Table 0 learns sources and drops invalid ones, table 1 forwards on eth_dst
+CLASSIFIER_TABLE = 0
+FORWARD_TABLE = 1
+# Group bit of the first octet of a MAC address (as a 48-bit int)
+MULTICAST_BIT = 1 << 40
+# Installer of the per destination rules of every forwarding mode but 'path'
+DEST_INSTALLERS = {
+    'sink_tree': SinkTreeInstaller,
+    'ecmp': EcmpInstaller,
+    'fast_failover': FastFailoverInstaller,
+}
+# Forwarding mode, 'path' or one of DEST_INSTALLERS (see SimpleSwitch13.__init__)
+FORWARDING = os.environ.get('SIMPLE_SWITCH_FORWARDING', 'ecmp')
+# Seconds between two checks for backup paths to repair in 'fast_failover' mode
+BACKUP_REPAIR_INTERVAL = 0.1
+# A batch of topology changes with this many link changes rebuilds the route table at once
+# instead of repairing it link by link
+REBUILD_MIN_CHANGES = 8
+# Topology changes that add or remove links
+LINK_CHANGES = ('link_add', 'link_delete', 'port_down', 'port_delete', 'switch_leave',
+                'add_link', 'drop_link', 'drop_port', 'drop_switch')
+# File the warm-restart snapshot is written to and restored from at startup, off unless set
+SNAPSHOT_PATH = os.environ.get('SIMPLE_SWITCH_SNAPSHOT') or None
+# Seconds between two snapshots
+SNAPSHOT_INTERVAL = 30
+# A snapshot older than this is not restored
+SNAPSHOT_MAX_AGE = 3600
+# Seconds discovery has to report the restored switches and links again before they are dropped
+RECONCILE_TIMEOUT = 15
+# Seconds between two checks for route computations finished by the worker pool
+ROUTE_POLL_INTERVAL = 0.01
+# Write every batch of FlowMods/GroupMods as an atomic ONF bundle instead of plain messages (see
+# send_queue.py), for switches that support the bundle extension in OpenFlow 1.3
+USE_BUNDLES = os.environ.get('SIMPLE_SWITCH_BUNDLES', '0') not in ('', '0')
+# Sharded deployment (see shard.py): number of controller processes the datapaths are hashed over,
+# 0 for a single controller, and the shard this process serves
+SHARDS = int(os.environ.get('SIMPLE_SWITCH_SHARDS', 0))
+SHARD_INDEX = int(os.environ.get('SIMPLE_SWITCH_SHARD', 0))
+# host:port (or Unix socket path) of the shard coordinator
+SHARD_COORDINATOR = os.environ.get('SIMPLE_SWITCH_COORDINATOR', '%s:%d' % COORDINATOR_ADDRESS)
+# Seconds between two exchanges with the shard coordinator
+SHARD_SYNC_INTERVAL = 0.05
 
 class SimpleSwitch13(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
 
     def __init__(self, *args, **kwargs):
         super(SimpleSwitch13, self).__init__(*args, **kwargs)
+        # a mistyped forwarding mode fails the start instead of running another one
+        if FORWARDING != 'path' and FORWARDING not in DEST_INSTALLERS:
+            raise ValueError("unknown forwarding mode %r in SIMPLE_SWITCH_FORWARDING, one of %s" % (
+                FORWARDING, ', '.join(['path'] + sorted(DEST_INSTALLERS))))
+        if FORWARDING == 'path' and SHARDS:
+            raise ValueError("a shard forwards per destination, 'path' is for a single controller")
         # USed for learning switch functioning
         self.mac_to_port = {}
         self.bandwidth = {}
-        # Holds the topology data and structure
-        self.topo_raw_switches = []
-        self.topo_raw_links = []
-        self.topo_raw_hosts = {}
-        # Maximum count to wait before printing the topology and measuring the link-costs
-        self.MAX_COUNT = 300
-        # Count to print topology data after convergence
-        self.count = 0
-        self.g = nx.DiGraph()
-        self.host_locate = {'1': {'00:00:00:00:00:01'},
-                            '2': {'00:00:00:00:00:02'},
-                            '4': {'00:00:00:00:00:04'},
-                            '5': {'00:00:00:00:00:05'},
-                            '6': {'00:00:00:00:00:06'}
-                            }
-        self.topo = {'1': {'2': 10, '3': 10, '5': 15},
-                     '2': {'1': 10, '3': 15, '4': 15},
-                     '3': {'1': 10, '2': 15, '4': 5},
-                     '4': {'2': 15, '3': 5, '6': 10},
-                     '5': {'1': 15, '6': 15},
-                     '6': {'5': 15, '4': 10}
-                     }
+        # Connected datapaths by dpid
+        self.datapaths = {}
+        # Link costs are the link delays in ms, measured with probes instead of copied from topo.py
+        self.delay_monitor = DelayMonitor()
+        self.probe_thread = hub.spawn(self._probe_links)
+        # Link utilisation from polled port counters, added to the delay: delay + alpha * utilisation
+        self.port_stats = PortStatsMonitor()
+        self.port_stats_thread = hub.spawn(self._poll_port_stats)
+        # History of the delay, utilisation and cost of every link
+        self.timeseries = TimeSeriesStore(TIMESERIES_DIR)
+        # Call counts and latency histograms of the handlers decorated with profiled()
+        self.profiler = PROFILER
+        self.profile_report_thread = hub.spawn(self._report_profile)
+        # Holds the topology data and structure: switches, links with their ports and costs,
+        # host locations and the shortest paths, updated one topology event at a time
+        self.topology = TopologyState(self.link_cost)
+        self.route_table = self.topology.route_table
+        self.hosts = self.topology.hosts
+        # In a sharded deployment this process only serves the datapaths of its shard and the topology
+        # comes from the coordinator: the changes seen here are sent to it, its snapshots applied here
+        self.shard = None
+        if SHARDS:
+            self.shard = ShardClient(SHARD_INDEX, SHARDS, parse_address(SHARD_COORDINATOR),
+                                     announce=lambda: own_events(self.topology, self.shard.owns))
+        # Discovery events and link cost changes are applied in batches once the topology is quiet,
+        # with a single recomputation per batch; convergence.stable() tells the topology converged
+        self.convergence = ConvergenceManager(self._apply_topology if self.shard is None
+                                              else self._publish_topology)
+        self.convergence_thread = hub.spawn(self._converge)
+        # On large topologies the shortest path trees and the ECMP next hops are recomputed by worker
+        # processes, the hub keeps serving packet-ins and LLDP meanwhile
+        self.route_service = RouteService()
+        self.route_service_thread = hub.spawn(self._collect_routes)
+        # ARP requests for known hosts are answered by the controller instead of being broadcast
+        self.arp_proxy = ArpProxy(self.hosts)
+        # FlowMods and GroupMods are batched per datapath, one barrier per batch
+        self.send_queues = SendQueues(use_bundles=USE_BUNDLES)
+        # Timeouts and a per switch budget for the installed entries, evicting the least recently used
+        self.flow_tables = FlowTableManager(self.send_queues, on_removed=self.flow_removed)
+        self.flow_report_thread = hub.spawn(self._report_flow_tables)
+        self.flow_stats_thread = hub.spawn(self._poll_flow_stats)
+        self.path_installer = PathInstaller(self.add_flow, self.send_queues, table_id=FORWARD_TABLE)
+        # Forwarding mode: 'path' installs (in_port, eth_dst) rules along one shortest path,
+        # 'sink_tree' one eth_dst rule per switch and destination along the shortest paths towards
+        # it, 'ecmp' the same but spreading the traffic over the equal-cost paths with select groups,
+        # 'fast_failover' the sink tree with a backup next hop per switch in fast-failover groups.
+        # A shard only programs its own switches, which takes one of the per destination modes
+        self.forwarding = FORWARDING
+        # in 'path' mode the per destination installer only ever forgets rules
+        installer = DEST_INSTALLERS.get(self.forwarding, EcmpInstaller)
+        self.dest_installer = installer(self.topology, self.add_flow, self.send_queues,
+                                        table_id=FORWARD_TABLE,
+                                        owns=None if self.shard is None else self.shard.owns)
+        # Set by topology changes in 'fast_failover' mode, the switches detour on their own meanwhile
+        self.repair_pending = False
+        self.repair_thread = hub.spawn(self._repair_backups)
+        # (dpid, port) of the inter-switch ports let through the classifier table
+        self.trunk_ports = set()
+        self.host_aging_thread = hub.spawn(self._age_hosts)
+        self.flush_thread = hub.spawn(self._flush_send_queues)
+        # Packet-ins held back while the path of their flow is being installed
+        self.inflight = InflightTable()
+        self.inflight_thread = hub.spawn(self._expire_inflight)
+        # Switches and links restored from the snapshot that discovery has not reported again yet
+        self.restored_switches = set()
+        self.restored_links = set()
+        # the snapshot read at startup, restored once the first switch to connect matches it
+        self.pending_snapshot = self._load_snapshot()
+        self.snapshot_thread = hub.spawn(self._save_snapshots)
+        if self.shard is not None:
+            self.shard_thread = hub.spawn(self._sync_shard)
 
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
+    @profiled()
     def switch_features_handler(self, ev):
         datapath = ev.msg.datapath
         ofproto = datapath.ofproto
@@ -77,7 +209,32 @@ class SimpleSwitch13(app_manager.RyuApp):
         match = parser.OFPMatch()
         actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
                                           ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, 0, match, actions)
+        self.add_flow(datapath, 0, match, actions, flow_class='permanent', table_id=CLASSIFIER_TABLE)
+        self.add_flow(datapath, 0, match, actions, flow_class='permanent', table_id=FORWARD_TABLE)
+
+        # delay probes sent by the controller come back to it from the next switch
+        match = parser.OFPMatch(eth_type=ETH_TYPE_PROBE)
+        self.add_flow(datapath, 3, match, actions, flow_class='permanent', table_id=CLASSIFIER_TABLE)
+
+        # a multicast source address is never valid
+        match = parser.OFPMatch(eth_src=('01:00:00:00:00:00', '01:00:00:00:00:00'))
+        self.add_flow(datapath, 2, match, [], flow_class='permanent', table_id=CLASSIFIER_TABLE)
+
+    """
+    Keep track of the connected datapaths, the flows of a path are pushed to all of them at once
+    """
+    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
+    def state_change_handler(self, ev):
+        datapath = ev.datapath
+        if ev.state == MAIN_DISPATCHER:
+            self.datapaths[datapath.id] = datapath
+            self.port_stats.add(datapath.id)
+        elif ev.state == DEAD_DISPATCHER:
+            self.datapaths.pop(datapath.id, None)
+            self.send_queues.remove(datapath.id)
+            self.flow_tables.remove(datapath.id)
+            self.port_stats.remove(datapath.id)
+            self.trunk_ports = set(port for port in self.trunk_ports if port[0] != datapath.id)
 
     # We are not using this function
     def delete_flow(self, datapath):
@@ -92,26 +249,88 @@ class SimpleSwitch13(app_manager.RyuApp):
                 priority=1, match=match)
             datapath.send_msg(mod)
 
-    def add_flow(self, datapath, priority, match, actions, buffer_id=None):
+    @profiled(sample=4)
+    def add_flow(self, datapath, priority, match, actions, buffer_id=None, flow_class='path',
+                 table_id=FORWARD_TABLE, goto_table=None):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
-                                             actions)]
+        # the traffic class picks the timeouts, the flow table manager may evict older entries
+        cookie, idle_timeout, hard_timeout, flags = self.flow_tables.install(
+            datapath, priority, match, flow_class, table_id)
+        inst = []
+        if actions:
+            inst.append(parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                                     actions))
+        if goto_table is not None:
+            inst.append(parser.OFPInstructionGotoTable(goto_table))
         if buffer_id:
-            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
-                                    priority=priority, match=match,
-                                    instructions=inst)
+            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id, cookie=cookie,
+                                    table_id=table_id, idle_timeout=idle_timeout,
+                                    hard_timeout=hard_timeout, flags=flags, priority=priority,
+                                    match=match, instructions=inst)
         else:
-            mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
+            mod = parser.OFPFlowMod(datapath=datapath, cookie=cookie, table_id=table_id,
+                                    idle_timeout=idle_timeout, hard_timeout=hard_timeout,
+                                    flags=flags, priority=priority,
                                     match=match, instructions=inst)
-        datapath.send_msg(mod)
+        self.send_queues.put(datapath, mod)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    @profiled()
+    def flow_removed_handler(self, ev):
+        self.flow_tables.removed(ev.msg)
+
+    """
+    An entry timed out, was deleted or evicted: forget the per destination state that relied on it
+    """
+    def flow_removed(self, datapath, match):
+        if [key for key, value in match.items()] == ['eth_dst']:
+            self.dest_installer.flow_removed(datapath, match['eth_dst'])
+
+    """
+    Request the flow counters of the switches with tracked entries, so eviction goes by the entries
+    the traffic actually uses
+    """
+    def _poll_flow_stats(self):
+        while True:
+            hub.sleep(FLOW_STATS_INTERVAL)
+            for dpid in list(self.flow_tables.tables):
+                datapath = self.datapaths.get(dpid)
+                if datapath is not None:
+                    ofproto = datapath.ofproto
+                    parser = datapath.ofproto_parser
+                    datapath.send_msg(parser.OFPFlowStatsRequest(
+                        datapath, 0, ofproto.OFPTT_ALL, ofproto.OFPP_ANY, ofproto.OFPG_ANY,
+                        0, 0, parser.OFPMatch()))
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    @profiled()
+    def flow_stats_reply_handler(self, ev):
+        self.flow_tables.stats_reply(ev.msg.datapath.id, ev.msg.body)
+
+    def _report_flow_tables(self):
+        while True:
+            hub.sleep(FLOW_REPORT_INTERVAL)
+            for dpid, stats in sorted(self.flow_tables.stats().items()):
+                self.logger.info("flow table %s: %d/%d entries, %d evictions (%.3f/s), removed %s",
+                                 dpid, stats['entries'], stats['budget'], stats['evictions'],
+                                 stats['evictions_per_s'], stats['removed'])
+
+    """
+    Write out the FlowMods/GroupMods that have been waiting for longer than the flush interval
+    """
+    def _flush_send_queues(self):
+        while True:
+            hub.sleep(self.send_queues.flush_interval)
+            self.send_queues.flush_due()
 
     """
     This is called when Ryu receives an OpenFlow packet_in message. The trick is set_ev_cls decorator. This decorator
     tells Ryu when the decorated function should be called.
     """
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    @profiled()
     def _packet_in_handler(self, ev):
         if ev.msg.msg_len < ev.msg.total_len:
             self.logger.debug("packet truncated: only %s of %s bytes",
@@ -122,23 +341,28 @@ class SimpleSwitch13(app_manager.RyuApp):
         parser = datapath.ofproto_parser
         in_port = msg.match['in_port']
 
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocols(ethernet.ethernet)[0]
+        # only the ethernet header is decoded here, without building a ryu packet.Packet
+        try:
+            eth_dst, eth_src, ethertype = parse_eth(msg.data)
+        except ValueError:
+            self.logger.debug("dropping runt frame of %s bytes", len(msg.data))
+            return
 
-        # self.logger.info('  _packet_in_handler: src_mac -> %s' % eth.src)
-        # self.logger.info('  _packet_in_handler: dst_mac -> %s' % eth.dst)
-        # self.logger.info('  _packet_in_handler: %s' % pkt)
+        # self.logger.info('  _packet_in_handler: src_mac -> %s' % eth_src)
+        # self.logger.info('  _packet_in_handler: dst_mac -> %s' % eth_dst)
         # self.logger.info('  ------')
 
-        if eth.ethertype == ether_types.ETH_TYPE_LLDP:
+        if ethertype == ether_types.ETH_TYPE_LLDP:
             # ignore lldp packet
             return
-        dst = eth.dst
-        src = eth.src
+        if ethertype == ETH_TYPE_PROBE:
+            self.probe_received(datapath, in_port, msg.data)
+            return
+        dst = int_to_mac(eth_dst)
+        src = int_to_mac(eth_src)
 
         dpid = datapath.id
-        src_dpid = self.dpid_hostLookup(src)
-        dst_dpid = self.dpid_hostLookup(dst)
+        dst_dpid = self.hosts.dpid(dst)
         self.mac_to_port.setdefault(dpid, {})
 
         if dst_dpid is not None:
@@ -146,38 +370,57 @@ class SimpleSwitch13(app_manager.RyuApp):
 
         # learn a mac address to avoid FLOOD next time.
         self.mac_to_port[dpid][src] = in_port
+        if not self.topology.is_switch_port(dpid, in_port):
+            self.learn_host(src, dpid, in_port)
+            self.learn_source(datapath, in_port, src)
+
+        if ethertype == ETH_TYPE_ARP:
+            reply = self.arp_proxy.handle(msg.data)
+            if reply is not None:
+                self.send_packet(datapath, in_port, reply)
+                return
 
         if dst in self.mac_to_port[dpid]:
             out_port = self.mac_to_port[dpid][dst]
+            actions = [parser.OFPActionOutput(out_port)]
         else:
             out_port = ofproto.OFPP_FLOOD
-
-        actions = [parser.OFPActionOutput(out_port)]
+            actions = self.flood_actions(datapath, in_port)
 
         # self.print_topo();
-        # build graph
-        self.g.add_nodes_from([switch.dp.id for switch in self.topo_raw_switches])
-        # run dijkstra to find path
-        if str(src_dpid) in self.topo and str(dst_dpid) in self.topo:
-            self.logger.info("calling to dijkstra with source %s destination %s", src_dpid, dst_dpid)
-            path = self.dijkstra(str(src_dpid), str(dst_dpid))
-
-        # todo: forward packets based on the Dijkstra's shortest path
-        # Resource:
-            # https://www.grotto-networking.com/SDNfun.html
-            # https://github.com/amitsk1994/mininet-RYU-ShortestPath
-            # https://sdn-lab.com/2014/12/25/shortest-path-forwarding-with-openflow-on-ryu/
+        # forward packets based on the Dijkstra's shortest path, installing
+        # the flows of the whole path at once. Only the first packet-in of a
+        # flow does so; it and the ones raised meanwhile wait for the barrier
+        # replies of every switch on the way before they are sent on.
+        flow = (eth_src, eth_dst, dpid)
+        if dst_dpid is not None:
+            if not self.inflight.begin(flow, msg):
+                return
+            route = self.install_shortest_path(dpid, in_port, dst, dst_dpid)
+            if route is None:
+                self.release_packets(self.inflight.abort(flow))
+            else:
+                # released through the ingress flow table, see InflightTable
+                self.release_packets(self.inflight.installed(flow, route[1]))
+                return
+
+        if out_port == ofproto.OFPP_FLOOD:
+            # unknown unicast destination: flood it once, not for every retransmission
+            if not eth_dst & MULTICAST_BIT and not self.inflight.should_flood(flow):
+                return
+            if not actions:
+                return
 
         # install a flow to avoid packet_in next time
-        if out_port != ofproto.OFPP_FLOOD:
+        else:
             match = parser.OFPMatch(in_port=in_port, eth_dst=dst)
             # verify if we have a valid buffer_id, if yes avoid to send both
             # flow_mod & packet_out
             if msg.buffer_id != ofproto.OFP_NO_BUFFER:
-                self.add_flow(datapath, 1, match, actions, msg.buffer_id)
+                self.add_flow(datapath, 1, match, actions, msg.buffer_id, flow_class='learning')
                 return
             else:
-                self.add_flow(datapath, 1, match, actions)
+                self.add_flow(datapath, 1, match, actions, flow_class='learning')
         data = None
         if msg.buffer_id == ofproto.OFP_NO_BUFFER:
             data = msg.data
@@ -185,106 +428,637 @@ class SimpleSwitch13(app_manager.RyuApp):
         out = parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
                                   in_port=in_port, actions=actions, data=data)
         datapath.send_msg(out)
-        # print(type(get_host(self, None)))
-        # self.topo_raw_hosts |= list(get_host(self, None))
-        for host in list(get_host(self, None)):
-            self.topo_raw_hosts[host.port.dpid] = host
-
-    """
-    Calculate shortest path tree from the src
-    """
-    def dijkstra(self, src, dest, visited=[], dist={}, parent={}):
-        # sanity checks
-        if src not in self.topo:
-            raise TypeError('The root of the shortest path tree cannot be found')
-        if dest not in self.topo:
-            raise TypeError('The target of the shortest path cannot be found')
-
-        # base condition
-        if src == dest:
-            # build the shortest path
-            path = []
-            p = dest
-            while p is not None:
-                path.append(p)
-                p = parent.get(p, None)
-            print('shortest path found: ' + str(path) + " with delay cost= " + str(dist[dest]))
-
-            # clear the local variables
-            dist.clear()
-            parent.clear()
-            del visited[:]
-            return path
+        self.profiler.count(dpid, 'OFPPacketOut')
 
-        else:
-            # it will reach for the root-source vertex
-            # initializing the cost with 0
-            if len(visited) == 0:
-                dist[src] = 0
+    """
+    Output actions flooding a packet over the spanning tree, so broadcasts do not loop. Empty if
+    the packet came in on a link off the tree (it is a copy the tree already delivered).
+    """
+    def flood_actions(self, datapath, in_port):
+        parser = datapath.ofproto_parser
+        ports = self.topology.flood_ports(datapath.id)
+        if ports is None:
+            # switch not discovered yet
+            return [parser.OFPActionOutput(datapath.ofproto.OFPP_FLOOD)]
+        if in_port not in ports:
+            return []
+        return [parser.OFPActionOutput(port) for port in ports if port != in_port]
 
-            # visit the neighbors
-            for neighbor in self.topo[src]:
-                if neighbor not in visited:
-                    new_distance = dist[src] + self.topo[src][neighbor]
-                    if new_distance < dist.get(neighbor, float('inf')):
-                        dist[neighbor] = new_distance
-                        parent[neighbor] = src
+    """
+    Packet-out of a frame built by the controller, e.g. an ARP reply
+    """
+    def send_packet(self, datapath, port, data):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        out = parser.OFPPacketOut(datapath=datapath, buffer_id=ofproto.OFP_NO_BUFFER,
+                                  in_port=ofproto.OFPP_CONTROLLER,
+                                  actions=[parser.OFPActionOutput(port)], data=data)
+        datapath.send_msg(out)
+        self.profiler.count(datapath.id, 'OFPPacketOut')
+
+    """
+    Send packet-ins that were held back while their path was installed through the flow table
+    """
+    def release_packets(self, msgs):
+        for msg in msgs:
+            datapath = msg.datapath
+            ofproto = datapath.ofproto
+            parser = datapath.ofproto_parser
+            data = None
+            if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+                data = msg.data
+            actions = [parser.OFPActionOutput(ofproto.OFPP_TABLE)]
+            datapath.send_msg(parser.OFPPacketOut(datapath=datapath, buffer_id=msg.buffer_id,
+                                                  in_port=msg.match['in_port'], actions=actions,
+                                                  data=data))
+            self.profiler.count(datapath.id, 'OFPPacketOut')
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    @profiled()
+    def barrier_reply_handler(self, ev):
+        msg = ev.msg
+        self.release_packets(self.inflight.barrier_reply(msg.datapath.id, msg.xid))
+
+    def _expire_inflight(self):
+        while True:
+            hub.sleep(self.inflight.timeout)
+            self.release_packets(self.inflight.expire())
+
+    """
+    Install the flows for dst along the shortest path from dpid to the switch of dst (all the
+    equal-cost paths in ecmp mode, the whole sink tree in sink_tree mode). Returns the actions to apply to the packet at the
+    ingress switch and the barrier requests that end the install, or None if there is no path
+    """
+    @profiled()
+    def install_shortest_path(self, dpid, in_port, dst, dst_dpid):
+        if dpid not in self.route_table or dst_dpid not in self.route_table:
+            return None
+        host_port = self.host_port(dst_dpid, dst)
+        if host_port is None:
+            return None
+        if self.forwarding != 'path':
+            return self.dest_installer.install(self.datapaths, dpid, dst, dst_dpid, host_port)
+
+        path, cost = self.route_table.lookup(dpid, dst_dpid)
+        if path is None:
+            return None
+        self.logger.info("shortest path from %s to %s: %s with delay cost= %s (topology version %s)",
+                         dpid, dst_dpid, path, cost, self.route_table.version)
+
+        hops = path_hops(path, self.topology.link_ports, in_port, host_port)
+        if hops is None:
+            return None
+        barriers = self.path_installer.install(self.datapaths, hops, dst)
+        if barriers is None:
+            return None
+        return [self.datapaths[dpid].ofproto_parser.OFPActionOutput(hops[0][2])], barriers
+
+    """
+    Bring the installed per destination rules and the trunk ports of the classifier table in line
+    with the topology after a link or switch change
+    """
+    @profiled()
+    def topology_changed(self):
+        offloaded = self.submit_routes()
+        if self.forwarding == 'fast_failover':
+            # the fast-failover groups already route around a failed link, a burst of events is
+            # repaired at once by _repair_backups
+            self.repair_pending = True
+        elif self.forwarding == 'path':
+            # the paths are not kept on the controller's routes, drop the ones that lost a link
+            self.path_installer.refresh(self.datapaths, self.topology.link_ports)
+        elif not offloaded:
+            self.dest_installer.refresh(self.datapaths)
+        self.sync_trunk_ports()
+
+    """
+    Hand the outdated shortest path trees and the next hops of the installed destinations to the
+    worker pool. Returns False, submitting nothing, if the topology is small enough to compute inline
+    """
+    def submit_routes(self):
+        if not self.route_service.offload(len(self.topology.graph)):
+            return False
+        version = self.route_table.version
+        graph = self.topology.csr()
+        # a shard only forwards per destination and never looks its trees up
+        if self.route_table.outdated and self.shard is None:
+            self.route_service.submit('trees', version, graph, self.route_table.outdated)
+        if self.forwarding != 'path':
+            destinations = self.dest_installer.destination_switches()
+            if destinations:
+                self.route_service.submit('next_hops', version, graph, destinations)
+        return True
 
-            # mark the source as visited
-            visited.append(src)
+    """
+    Load the results of the worker pool that are still for the current topology; the installed rules
+    are refreshed once their next hops are in
+    """
+    def _collect_routes(self):
+        while True:
+            hub.sleep(ROUTE_POLL_INTERVAL)
+            self.collect_routes()
 
-            # all neighbors distance have been updated
-            # now select the non-visited node with lowest distance
-            # and run Dijkstra sourcing from that lowest distance vertex
-            unvisited = {}
-            for k in self.topo:
-                if k not in visited:
-                    unvisited[k] = dist.get(k, float('inf'))
-            if len(unvisited) > 0:
-                next_vertex = min(unvisited, key=unvisited.get)
-                return self.dijkstra(next_vertex, dest, visited, dist, parent)
+    def collect_routes(self):
+        for job in self.route_service.collect():
+            try:
+                result = job.result()
+            except Exception as e:
+                # the trees stay outdated and the next hops are computed inline as they are needed
+                self.logger.warning("computing the %s of topology version %s failed: %r", job.kind,
+                                    job.version, e)
+                result = None
+            if result is not None:
+                if job.kind == 'trees':
+                    loaded = self.route_table.load_trees(result, job.version)
+                else:
+                    loaded = self.dest_installer.load_dags(result, job.version)
+                if not loaded:
+                    # a newer job for the current version is on its way
+                    self.logger.debug("dropped the %s of superseded topology version %s", job.kind,
+                                      job.version)
+                    continue
+                self.logger.debug("%s of topology version %s computed in %.3f s", job.kind,
+                                  job.version, self.route_service.last_time)
+            if job.kind == 'next_hops':
+                if self.forwarding == 'fast_failover':
+                    self.repair_pending = True
+                elif self.forwarding != 'path':
+                    self.dest_installer.refresh(self.datapaths)
+
+    """
+    Recompute the primary and backup next hops of the installed destinations after topology changes,
+    once the worker pool is done with them. Returns whether they were recomputed
+    """
+    def _repair_backups(self):
+        while True:
+            hub.sleep(BACKUP_REPAIR_INTERVAL)
+            self.repair_backups()
 
+    def repair_backups(self):
+        # next hops still being computed by the worker pool are waited for
+        if self.repair_pending and not self.route_service.busy('next_hops'):
+            self.repair_pending = False
+            self.dest_installer.refresh(self.datapaths)
+            return True
+        return False
 
     """
-        Find dpid from mac address
+    Packets entering on an inter-switch port skip source learning, they were checked at their edge
     """
-    def dpid_hostLookup(self, lmac):
-        for dpid, mac in self.host_locate.iteritems():
-            if lmac in mac:
-                return dpid
+    def sync_trunk_ports(self):
+        ports = set(port for port in self.topology.switch_ports if port[0] in self.datapaths)
+        for dpid, port_no in ports - self.trunk_ports:
+            datapath = self.datapaths[dpid]
+            match = datapath.ofproto_parser.OFPMatch(in_port=port_no)
+            self.add_flow(datapath, 1, match, [], flow_class='permanent',
+                          table_id=CLASSIFIER_TABLE, goto_table=FORWARD_TABLE)
+        for dpid, port_no in self.trunk_ports - ports:
+            datapath = self.datapaths.get(dpid)
+            if datapath is None:
+                continue
+            ofproto = datapath.ofproto
+            parser = datapath.ofproto_parser
+            self.send_queues.put(datapath, parser.OFPFlowMod(
+                datapath, table_id=CLASSIFIER_TABLE, command=ofproto.OFPFC_DELETE_STRICT,
+                priority=1, out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY,
+                match=parser.OFPMatch(in_port=port_no)))
+        self.trunk_ports = ports
+
+    """
+    Let the packets of a host seen on an edge port through the classifier table from now on
+    """
+    def learn_source(self, datapath, in_port, mac):
+        match = datapath.ofproto_parser.OFPMatch(in_port=in_port, eth_src=mac)
+        if not self.flow_tables.has(datapath.id, 1, match, CLASSIFIER_TABLE):
+            self.add_flow(datapath, 1, match, [], flow_class='learning',
+                          table_id=CLASSIFIER_TABLE, goto_table=FORWARD_TABLE)
+
+    """
+    Port of the switch dpid the host with the given mac is attached to
+    """
+    def host_port(self, dpid, mac):
+        location = self.hosts.lookup(mac)
+        if location is not None and location[0] == dpid:
+            return location[1]
+        return self.mac_to_port.get(dpid, {}).get(mac)
+
+    """
+    Record where a host was seen; when it moved, the flows towards its old location are removed
+    """
+    def learn_host(self, mac, dpid, port):
+        old = self.hosts.learn(mac, dpid, port)
+        if old is not None:
+            self.logger.info("host %s moved from %s to %s", mac, old, (dpid, port))
+            self.remove_host_flows(mac)
+
+    def remove_host_flows(self, mac):
+        self.dest_installer.forget(self.datapaths, mac)
+        self.path_installer.forget(mac)
+        for datapath in self.datapaths.values():
+            ofproto = datapath.ofproto
+            parser = datapath.ofproto_parser
+            match = parser.OFPMatch(eth_dst=mac)
+            mod = parser.OFPFlowMod(
+                datapath, command=ofproto.OFPFC_DELETE, table_id=FORWARD_TABLE,
+                out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY,
+                priority=1, match=match)
+            self.send_queues.put(datapath, mod)
+
+    """
+    Forget a host that went away: its flows, its ARP entries and where it was learned by MAC
+    """
+    def forget_host(self, mac):
+        self.remove_host_flows(mac)
+        self.arp_proxy.forget(mac)
+        for ports in self.mac_to_port.values():
+            ports.pop(mac, None)
+
+    """
+    Forget the hosts not seen for the host locator's max_age. Returns their MACs
+    """
+    def _age_hosts(self):
+        while True:
+            hub.sleep(HOST_AGING_INTERVAL)
+            self.age_hosts()
+
+    def age_hosts(self, now=None):
+        expired = [int_to_mac(mac) for mac in self.hosts.expire(now)]
+        for mac in expired:
+            self.logger.info("host %s aged out", mac)
+            self.forget_host(mac)
+        return expired
+
+    """
+    The discovery events EventHostAdd/EventHostMove/EventHostDelete keep the host locations up to date.
+    """
+    @set_ev_cls(event.EventHostAdd)
+    @profiled()
+    def handler_host_add(self, ev):
+        if self.topology.is_switch_port(ev.host.port.dpid, ev.host.port.port_no):
+            # a host of the switch on the other end, e.g. of a link LLDP cannot see between two shards
+            return
+        old = self.topology.host_add(ev.host)
+        for ip in ev.host.ipv4:
+            self.arp_proxy.learn(ip, ev.host.mac)
+        if old is not None:
+            self.remove_host_flows(ev.host.mac)
+
+    @set_ev_cls(event.EventHostMove)
+    def handler_host_move(self, ev):
+        self.learn_host(ev.dst.mac, ev.dst.port.dpid, ev.dst.port.port_no)
+
+    @set_ev_cls(event.EventHostDelete)
+    def handler_host_delete(self, ev):
+        self.hosts.forget(ev.host.mac)
+        self.forget_host(ev.host.mac)
 
 
     """
     The event EventLinkAdd will trigger the activation of handler_link_add().
     """
     @set_ev_cls(event.EventLinkAdd)
+    @profiled()
     def handler_link_add(self, ev):
-        # The Function get_link(self, None) outputs the list of links.
-        # del self.topo_raw_links[:]
-        self.topo_raw_links = copy.copy(get_link(self, None))
+        self.convergence.add('link_add', ev.link)
+
+    """
+    Cost of the link between two switches: its measured delay (DEFAULT_LINK_COST if not measured yet)
+    plus CONGESTION_WEIGHT times its utilisation
+    """
+    def link_cost(self, src, dst):
+        cost = self.delay_monitor.cost(src, dst, DEFAULT_LINK_COST)
+        ports = self.topology.link_ports(src, dst)
+        if ports is not None:
+            resolution = self.delay_monitor.resolution
+            utilisation = self.port_stats.link_utilisation(src, ports[0])
+            cost += round(CONGESTION_WEIGHT * utilisation / resolution) * resolution
+        return cost
+
+    """
+    Send a delay probe over every link and an echo request to every switch, once per PROBE_INTERVAL.
+    A shard also probes the ports without a known link: LLDP does not find the links to the switches
+    of other shards, their probes do
+    """
+    def _probe_links(self):
+        while True:
+            hub.sleep(PROBE_INTERVAL)
+            for datapath in list(self.datapaths.values()):
+                datapath.send_msg(datapath.ofproto_parser.OFPEchoRequest(
+                    datapath, data=self.delay_monitor.echo_data()))
+            for src, dst, data in list(self.topology.graph.edges(data=True)):
+                datapath = self.datapaths.get(src)
+                if datapath is not None:
+                    self.send_packet(datapath, data['port'], self.delay_monitor.probe(src, data['port']))
+            if self.shard is not None:
+                # the ports hosts were seen on lead nowhere, only the others may reach another shard
+                host_ports = set((dpid, port) for dpid, port, _ in self.hosts.hosts.values())
+                for dpid, datapath in list(self.datapaths.items()):
+                    for port_no in sorted(self.topology.ports.get(dpid, ())):
+                        if self.topology.is_switch_port(dpid, port_no) or (dpid, port_no) in host_ports:
+                            continue
+                        self.send_packet(datapath, port_no, self.delay_monitor.probe(dpid, port_no))
+
+    @set_ev_cls(ofp_event.EventOFPEchoReply, MAIN_DISPATCHER)
+    def echo_reply_handler(self, ev):
+        self.delay_monitor.echo_reply(ev.msg.datapath.id, ev.msg.data)
+
+    """
+    A probe came back from the far end of a link: update its delay and reroute if the cost moved
+    """
+    def probe_received(self, datapath, in_port, data):
+        probe = parse_probe(data)
+        if probe is None:
+            return
+        src, port_no, sent = probe
+        dst = datapath.id
+        if self.topology.link_ports(src, dst) != (port_no, in_port):
+            if self.shard is not None and not self.shard.owns(src):
+                # a link from a switch of another shard, reported by the switch it enters
+                self.convergence.add('add_link', src, dst, port_no, in_port)
+            return
+        delay = self.delay_monitor.probe_received(src, dst, sent)
+        if (src, dst) in self.delay_monitor.last_sample:
+            self.timeseries.record('delay', (src, dst), time.time(), self.delay_monitor.last_sample[(src, dst)])
+        if delay is not None:
+            self.logger.info("link %s -> %s: delay %s ms", src, dst, delay)
+            self.set_link_cost(src, dst)
+            self.convergence.add('link_cost')
+
+    """
+    Request the port counters of the switches whose polling interval has elapsed
+    """
+    def _poll_port_stats(self):
+        while True:
+            hub.sleep(self.port_stats.next_due())
+            for dpid in self.port_stats.due():
+                datapath = self.datapaths.get(dpid)
+                if datapath is not None:
+                    ofproto = datapath.ofproto
+                    datapath.send_msg(datapath.ofproto_parser.OFPPortStatsRequest(
+                        datapath, 0, ofproto.OFPP_ANY))
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    @profiled()
+    def port_stats_reply_handler(self, ev):
+        datapath = ev.msg.datapath
+        changed = self.port_stats.stats_reply(datapath.id, ev.msg.body, getattr(datapath, 'ports', None))
+        now = time.time()
+        for src, dst, data in list(self.topology.graph.out_edges(datapath.id, data=True)):
+            utilisation = self.port_stats.utilisation.get((src, data['port']))
+            if utilisation is not None:
+                self.timeseries.record('utilisation', (src, dst), now, utilisation)
+            if (src, data['port']) in changed:
+                self.logger.info("link %s -> %s: utilisation %.2f", src, dst,
+                                 self.port_stats.link_utilisation(src, data['port']))
+                self.set_link_cost(src, dst)
+        if changed:
+            self.convergence.add('link_cost')
+
+    """
+    Log the p50/p99 latency of every profiled handler and the messages sent to every datapath
+    """
+    def _report_profile(self):
+        while True:
+            hub.sleep(PROFILE_REPORT_INTERVAL)
+            report = self.profile_report()
+            for name, stats in sorted(report['handlers'].items()):
+                if stats['timed']:
+                    self.logger.info("%s: %d calls, p50 %.1f us, p99 %.1f us, max %.1f us", name,
+                                     stats['calls'], stats['p50_us'], stats['p99_us'], stats['max_us'])
+            for dpid, kinds in sorted(report['datapaths'].items()):
+                self.logger.info("datapath %s sent %s", dpid, kinds)
+            self.logger.info("route service: %s", report['route_service'])
+
+    def profile_report(self):
+        report = self.profiler.report()
+        for dpid, stats in self.send_queues.stats().items():
+            report['datapaths'].setdefault(dpid, {}).update(stats['kinds'])
+        report['route_service'] = self.route_service.stats()
+        return report
+
+    def set_link_cost(self, src, dst):
+        cost = self.link_cost(src, dst)
+        if self.shard is None:
+            self.topology.set_link_cost(src, dst, cost)
+        else:
+            # applied with the next snapshot of the coordinator, like every other change
+            self.convergence.add('set_link_cost', src, dst, cost)
+        self.timeseries.record('cost', (src, dst), time.time(), cost)
+
+    """
+    Write the recorded link history as metric,src,dst,time,value rows
+    """
+    def dump_timeseries(self, path):
+        with open(path, 'w') as out:
+            self.timeseries.dump_csv(out)
+
+    def close(self):
+        self.timeseries.flush()
+        if TIMESERIES_CSV is not None:
+            self.dump_timeseries(TIMESERIES_CSV)
+        self.save_snapshot()
+        self.route_service.close()
+        if self.shard is not None:
+            self.shard.close()
+        super(SimpleSwitch13, self).close()
+
+    """
+    Warm restart: start from the last snapshot, routes and host locations included, instead of an
+    empty topology. It is only restored once the first switch that connects is in it with the same
+    ports, so a snapshot of another network is never installed; what discovery does not confirm
+    within RECONCILE_TIMEOUT is dropped again
+    """
+    def _load_snapshot(self):
+        # a shard gets the topology from the coordinator
+        if SNAPSHOT_PATH is None or self.shard is not None:
+            return None
+        arrays = snapshot.load(SNAPSHOT_PATH)
+        if arrays is None:
+            return None
+        age = time.time() - snapshot.written_at(arrays)
+        if age > SNAPSHOT_MAX_AGE:
+            self.logger.info("snapshot %s is %.0f s old, starting from scratch", SNAPSHOT_PATH, age)
+            return None
+        return arrays
+
+    def _restore_snapshot(self, switch):
+        arrays, self.pending_snapshot = self.pending_snapshot, None
+        ports = [port.port_no for port in switch.ports]
+        if len(self.topology.graph) or not snapshot.has_switch(arrays, switch.dp.id, ports):
+            self.logger.info("snapshot %s does not match switch %s, starting from scratch",
+                             SNAPSHOT_PATH, switch.dp.id)
+            return
+        age = time.time() - snapshot.written_at(arrays)
+        self.restored_switches, self.restored_links = snapshot.restore(
+            arrays, self.topology, self.arp_proxy, self.mac_to_port, self.delay_monitor.costs)
+        self.logger.info("restored %d switches, %d links and %d hosts from %s (%.0f s old)",
+                         len(self.restored_switches), len(self.restored_links), len(self.hosts),
+                         SNAPSHOT_PATH, age)
+        self.reconcile_thread = hub.spawn_after(RECONCILE_TIMEOUT, self._reconcile_snapshot)
+
+    def _reconcile_snapshot(self):
+        for src, dst in self.restored_links:
+            self.convergence.add('drop_link', src, dst)
+        for dpid in self.restored_switches:
+            self.convergence.add('drop_switch', dpid)
+            self.mac_to_port.pop(dpid, None)
+        for mac, (dpid, _, _) in list(self.hosts.hosts.items()):
+            if dpid in self.restored_switches:
+                self.remove_host_flows(int_to_mac(mac))
+                self.hosts.forget(mac)
+        if self.restored_switches or self.restored_links:
+            self.logger.info("dropping %d switches and %d links of the snapshot that were not rediscovered",
+                             len(self.restored_switches), len(self.restored_links))
+        self.restored_switches = set()
+        self.restored_links = set()
+
+    def _save_snapshots(self):
+        while True:
+            hub.sleep(SNAPSHOT_INTERVAL)
+            # a topology in the middle of a burst or not reconciled yet is not worth keeping
+            if self.convergence.stable() and not self.restored_switches and not self.restored_links:
+                self.save_snapshot()
+
+    def save_snapshot(self):
+        if SNAPSHOT_PATH is None or self.shard is not None:
+            return
+        try:
+            size = snapshot.save(SNAPSHOT_PATH, self.topology, self.arp_proxy, self.mac_to_port,
+                                 self.delay_monitor.costs)
+        except (IOError, OSError) as e:
+            self.logger.warning("cannot write the snapshot %s: %s", SNAPSHOT_PATH, e)
+            return
+        self.logger.debug("snapshot of %d bytes written to %s", size, SNAPSHOT_PATH)
+
+    """
+    The event EventLinkDelete is raised when a link times out or one of its ports goes down.
+    """
+    @set_ev_cls(event.EventLinkDelete)
+    @profiled()
+    def handler_link_delete(self, ev):
+        self.convergence.add('link_delete', ev.link)
+
+    """
+    A port that went down takes its links with it, before the LLDP timeout notices.
+    """
+    @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
+    @profiled()
+    def port_status_handler(self, ev):
+        msg = ev.msg
+        ofproto = msg.datapath.ofproto
+        if msg.reason == ofproto.OFPPR_DELETE or msg.desc.state & ofproto.OFPPS_LINK_DOWN:
+            self.convergence.add('port_down', msg.datapath.id, msg.desc.port_no)
 
+    """
+    Ports added to or removed from a switch change where broadcasts are flooded
+    """
+    @set_ev_cls(event.EventPortAdd)
+    def handler_port_add(self, ev):
+        self.convergence.add('port_add', ev.port)
+
+    @set_ev_cls(event.EventPortDelete)
+    def handler_port_delete(self, ev):
+        self.convergence.add('port_delete', ev.port)
 
     """
     The event EventSwitchEnter will trigger the activation of handler_switch_enter().
     """
     @set_ev_cls(event.EventSwitchEnter)
+    @profiled()
     def handler_switch_enter(self, ev):
-        # The Function get_switch(self, None) outputs the list of switches.
-        # del self.topo_raw_switches[:]
-        self.topo_raw_switches = copy.copy(get_switch(self, None))
+        if self.pending_snapshot is not None:
+            self._restore_snapshot(ev.switch)
+        self.convergence.add('switch_enter', ev.switch)
+
+    """
+    The event EventSwitchLeave removes the switch and all its links.
+    """
+    @set_ev_cls(event.EventSwitchLeave)
+    @profiled()
+    def handler_switch_leave(self, ev):
+        self.convergence.add('switch_leave', ev.switch)
+
+    """
+    Apply the queued topology changes once the discovery burst is over
+    """
+    def _converge(self):
+        while True:
+            hub.sleep(self.convergence.next_due())
+            if self.convergence.due():
+                batch = self.convergence.flush()
+                self.logger.info("topology converged: %d changes over %.3f s, applied %.3f s after the "
+                                 "first (%.3f s to apply)", batch.events, batch.burst, batch.convergence,
+                                 batch.apply)
+
+    """
+    Apply a batch of topology changes, named after the TopologyState methods, then recompute the
+    routes and the installed rules once
+    """
+    @profiled()
+    def _apply_topology(self, batch):
+        rebuild = sum(1 for kind, _ in batch if kind in LINK_CHANGES) >= REBUILD_MIN_CHANGES
+        if rebuild:
+            self.route_table.begin_batch()
+        for kind, args in batch:
+            if kind == 'link_cost':
+                # already in the route table, only the installed rules are behind
+                continue
+            if kind == 'link_add':
+                self.restored_links.discard((args[0].src.dpid, args[0].dst.dpid))
+            elif kind == 'switch_enter':
+                self.restored_switches.discard(args[0].dp.id)
+            elif kind == 'link_delete':
+                self.delay_monitor.forget(args[0].src.dpid, args[0].dst.dpid)
+            elif kind == 'drop_link':
+                self.delay_monitor.forget(*args)
+            getattr(self.topology, kind)(*args)
+        if rebuild:
+            # on a large topology the trees are left to the worker pool, see submit_routes
+            self.route_table.end_batch(rebuild=self.shard is None and
+                                       not self.route_service.offload(len(self.topology.graph)))
+        self.topology_changed()
+
+    """
+    Sharded: the topology changes seen by this process go to the coordinator, they come back with the
+    snapshots of the whole topology it publishes
+    """
+    def _publish_topology(self, batch):
+        self.shard.send_events(plain_events(batch))
+
+    def _sync_shard(self):
+        while True:
+            hub.sleep(SHARD_SYNC_INTERVAL)
+            self.sync_shard()
+
+    """
+    Send the hosts and ARP entries learned here to the coordinator and apply its latest snapshot, as a
+    batch of the topology changes since the previous one. Returns whether there was a snapshot
+    """
+    def sync_shard(self):
+        self.shard.send_hosts(self.hosts, self.arp_proxy)
+        arrays = self.shard.receive()
+        if arrays is None:
+            return False
+        changes = topology_changes(arrays, self.topology)
+        if changes:
+            self._apply_topology(changes)
+        for mac in self.shard.apply_hosts(arrays, self.hosts, self.arp_proxy):
+            self.remove_host_flows(int_to_mac(mac))
+        return True
 
     """
     Print saved topology data
     """
     def print_topo(self):
         print(" \t" + "Current Hosts:")
-        for h in self.topo_raw_hosts.values():
-            print(" \t\t" + str(h))
+        for mac, (dpid, port, seen) in self.hosts.hosts.items():
+            print(" \t\t" + "Host<mac={}, dpid={}, port={}>".format(int_to_mac(mac), dpid, port))
 
         print(" \t" + "Current Switches:")
-        for s in self.topo_raw_switches:
-            print(" \t\t" + str(s))
+        for dpid, data in self.topology.graph.nodes(data=True):
+            print(" \t\t" + str(data.get('switch', dpid)))
 
         print(" \t" + "Current Links:")
-        for l in self.topo_raw_links:
-            print(" \t\t" + str(l))
+        for src, dst, data in self.topology.graph.edges(data=True):
+            print(" \t\t" + "Link<{}:{} -> {}:{}, cost={}>".format(
+                src, data['port'], dst, data['peer_port'], data['weight']))
@@ -0,0 +1,152 @@
+"""
+Per-datapath outbound queue for FlowMods and GroupMods.
+
+Instead of one send_msg() per FlowMod, the messages for a datapath are
+collected and written out together when the queue is flushed: explicitly
+(e.g. before the packet-out of a freshly installed path), when it reaches
+max_batch messages, or by the periodic flush_due() sweep once the oldest
+message has waited flush_interval seconds. A flush is either a single
+socket write of all the serialized messages or, with use_bundles, an
+OpenFlow 1.3 (ONF extension) atomic bundle; in both cases it ends with
+one barrier.
+
+Queue depth, flush latency and the messages queued by type are counted per
+datapath (see stats()).
+"""
+
+import collections
+import itertools
+import time
+
+# Seconds a message may wait in the queue before the periodic sweep flushes it
+FLUSH_INTERVAL = 0.01
+# A queue is flushed as soon as it holds this many messages
+MAX_BATCH = 64
+
+
+class SendQueue(object):
+
+    def __init__(self, datapath, max_batch=MAX_BATCH, use_bundles=False, clock=time.time):
+        self.datapath = datapath
+        self.max_batch = max_batch
+        self.use_bundles = use_bundles
+        self.clock = clock
+        self.messages = []
+        # time the oldest queued message was put
+        self.since = None
+        self.bundle_ids = itertools.count(1)
+
+        self.max_depth = 0
+        # message type name -> messages queued
+        self.kinds = collections.Counter()
+        self.flushes = 0
+        self.sent = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def __len__(self):
+        return len(self.messages)
+
+    def put(self, msg):
+        if not self.messages:
+            self.since = self.clock()
+        self.messages.append(msg)
+        self.kinds[type(msg).__name__] += 1
+        self.max_depth = max(self.max_depth, len(self.messages))
+        if len(self.messages) >= self.max_batch:
+            self.flush()
+
+    def flush(self):
+        """
+        Write out the queued messages followed by a barrier. Returns the
+        barrier request (its xid identifies the batch), or None if the
+        queue was empty.
+        """
+        if not self.messages:
+            return None
+        datapath = self.datapath
+        parser = datapath.ofproto_parser
+        messages, self.messages = self.messages, []
+
+        if self.use_bundles:
+            ofproto = datapath.ofproto
+            bundle_id = next(self.bundle_ids)
+            flags = ofproto.ONF_BF_ATOMIC | ofproto.ONF_BF_ORDERED
+            batch = [parser.ONFBundleCtrlMsg(datapath, bundle_id, ofproto.ONF_BCT_OPEN_REQUEST, flags, [])]
+            batch.extend(parser.ONFBundleAddMsg(datapath, bundle_id, flags, msg, []) for msg in messages)
+            batch.append(parser.ONFBundleCtrlMsg(datapath, bundle_id, ofproto.ONF_BCT_COMMIT_REQUEST, flags, []))
+        else:
+            batch = list(messages)
+        barrier = parser.OFPBarrierRequest(datapath)
+        batch.append(barrier)
+
+        buf = bytearray()
+        for msg in batch:
+            datapath.set_xid(msg)
+            msg.serialize()
+            buf += msg.buf
+        datapath.send(bytes(buf))
+
+        latency = self.clock() - self.since
+        self.since = None
+        self.flushes += 1
+        self.sent += len(messages)
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+        return barrier
+
+    def due(self, now, interval):
+        return self.since is not None and now - self.since >= interval
+
+    def stats(self):
+        return {
+            'depth': len(self.messages),
+            'max_depth': self.max_depth,
+            'flushes': self.flushes,
+            'sent': self.sent,
+            'last_flush_latency': self.last_latency,
+            'max_flush_latency': self.max_latency,
+            'avg_flush_latency': self.total_latency / self.flushes if self.flushes else 0.0,
+            'kinds': dict(self.kinds),
+        }
+
+
+class SendQueues(object):
+    "The SendQueue of every datapath, created on first use."
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH, use_bundles=False,
+                 clock=time.time):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.use_bundles = use_bundles
+        self.clock = clock
+        self.queues = {}
+
+    def queue(self, datapath):
+        q = self.queues.get(datapath.id)
+        if q is None or q.datapath is not datapath:
+            # first message, or the switch reconnected with a new datapath object
+            q = SendQueue(datapath, self.max_batch, self.use_bundles, self.clock)
+            self.queues[datapath.id] = q
+        return q
+
+    def put(self, datapath, msg):
+        self.queue(datapath).put(msg)
+
+    def flush(self, datapath):
+        return self.queue(datapath).flush()
+
+    def flush_due(self):
+        "Flush the queues whose oldest message has waited flush_interval."
+        now = self.clock()
+        for q in list(self.queues.values()):
+            if q.due(now, self.flush_interval):
+                q.flush()
+
+    def remove(self, dpid):
+        self.queues.pop(dpid, None)
+
+    def stats(self):
+        return dict((dpid, q.stats()) for dpid, q in self.queues.items())
@@ -0,0 +1,534 @@
+#!/usr/bin/python
+
+"""
+Sharded deployment: the datapaths spread over several controller processes.
+
+A single SimpleSwitch13 handles every packet-in on one eventlet hub, so on
+one core. In a sharded deployment N copies of the app (the workers) each
+serve the datapaths with shard_of(dpid, N) equal to their index, and a
+coordinator process owns the topology:
+
+  * every worker sends it the discovery events of its own switches (the
+    batches of its ConvergenceManager, reduced by plain_events() to
+    TopologyState calls with plain arguments), the hosts seen on its edge
+    ports and the ARP entries it learned;
+  * the coordinator applies them to its TopologyState, debounced once more
+    to merge the batches of several workers, and publishes the topology
+    with the hosts and the ARP table as a snapshot (snapshot.dumps without
+    the trees) to every worker over a local socket;
+  * every worker brings its own TopologyState in line with the latest
+    snapshot (topology_changes() and apply_hosts(), diffs so the route
+    table is repaired and not rebuilt), computes the routes of its own
+    packet-ins from it and programs only its own switches. Where a path enters another shard the
+    first packet raises a packet-in at that shard's worker, which programs
+    the rest of the path.
+
+Ryu's LLDP discovery only pairs ports of switches connected to the same
+process, so the links between two shards are found by the delay probes:
+the workers send them out of every port of their switches without a known
+link as well, and the worker receiving one reports the link. Those links
+keep the default cost, their delay cannot be measured (the control channel
+round trip of the sending switch is only known to the other worker), and
+they only go away with their port or switch.
+
+A host is placed where it was seen last: the workers report the time they
+saw it and a snapshot never overrides a newer sighting on a worker's own
+switch. A worker that disconnects takes its switches and hosts out of the
+topology until it reconnects and announces them again.
+
+Running it, the coordinator first, all of them with the same secret for
+the connections to the coordinator in SIMPLE_SWITCH_SHARD_KEY:
+
+    export SIMPLE_SWITCH_SHARD_KEY=$(openssl rand -hex 16)
+    python shard.py coordinator --shards 2
+    SIMPLE_SWITCH_SHARDS=2 SIMPLE_SWITCH_SHARD=0 ryu-manager --observe-links \\
+        --ofp-tcp-listen-port 6653 ryu.py
+    SIMPLE_SWITCH_SHARDS=2 SIMPLE_SWITCH_SHARD=1 ryu-manager --observe-links \\
+        --ofp-tcp-listen-port 6654 ryu.py
+    python shard.py assign --shards 2 --switches 6 | sh
+
+assign prints the ovs-vsctl commands pointing every switch (named s<dpid>
+as in Mininet) at the port of its worker.
+"""
+
+import argparse
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener, wait
+
+import snapshot
+from arp_proxy import ArpProxy
+from convergence import ConvergenceManager
+from topology_state import TopologyState
+
+LOG = logging.getLogger('shard')
+
+# Where the coordinator listens for the workers
+COORDINATOR_ADDRESS = ('127.0.0.1', 6690)
+# Shared secret of the connections between the workers and the coordinator, required
+AUTHKEY = os.environ.get('SIMPLE_SWITCH_SHARD_KEY', '').encode()
+# OpenFlow port of the worker of shard 0, shard i listens on BASE_OFP_PORT + i
+BASE_OFP_PORT = 6653
+# The workers batch their events already, the coordinator only merges those of several workers
+QUIET_PERIOD = 0.05
+MAX_BATCH_DELAY = 0.5
+# Seconds the coordinator waits for a message when nothing is queued, a worker that just connected
+# is only listened to from the next wait on
+POLL_INTERVAL = 0.05
+# Cost of a link no worker reported a cost for, as DEFAULT_LINK_COST of the controller
+DEFAULT_LINK_COST = 1
+# Last seen time of the hosts of other shards in a worker: they never age out
+# there, their own worker ages them and the next snapshot drops them
+REMOTE_HOST_SEEN = float('inf')
+
+# The TopologyState calls a worker may send
+TOPOLOGY_CALLS = ('add_switch', 'drop_switch', 'add_port', 'drop_port', 'port_down', 'add_link',
+                  'drop_link', 'set_link_cost')
+
+_DPID = struct.Struct('!Q')
+
+
+def shard_of(dpid, shards):
+    "Shard of a datapath: a hash of its dpid, the same in every process and run."
+    return zlib.crc32(_DPID.pack(dpid)) % shards
+
+
+def parse_address(text):
+    "'host:port' -> (host, port), anything else is the path of a Unix socket."
+    host, sep, port = text.rpartition(':')
+    if sep and port.isdigit():
+        return host, int(port)
+    return text
+
+
+def require_authkey(authkey):
+    "authkey, or AUTHKEY if it is None; there is no default secret to fall back on."
+    if authkey is None:
+        authkey = AUTHKEY
+    if not authkey:
+        raise ValueError("no secret for the coordinator connections, set SIMPLE_SWITCH_SHARD_KEY")
+    return authkey
+
+
+def plain_events(batch):
+    """
+    A SimpleSwitch13 convergence batch [(kind, args)] as the TopologyState
+    calls with plain arguments the coordinator applies. The Ryu discovery
+    objects are reduced to dpids and port numbers; 'link_cost' is left out,
+    the costs travel as 'set_link_cost'.
+    """
+    events = []
+    for kind, args in batch:
+        if kind == 'switch_enter':
+            switch = args[0]
+            events.append(('add_switch', (switch.dp.id, [port.port_no for port in switch.ports])))
+        elif kind == 'switch_leave':
+            events.append(('drop_switch', (args[0].dp.id,)))
+        elif kind == 'link_add':
+            link = args[0]
+            events.append(('add_link', (link.src.dpid, link.dst.dpid, link.src.port_no, link.dst.port_no)))
+        elif kind == 'link_delete':
+            events.append(('drop_link', (args[0].src.dpid, args[0].dst.dpid)))
+        elif kind == 'port_add':
+            events.append(('add_port', (args[0].dpid, args[0].port_no)))
+        elif kind == 'port_delete':
+            events.append(('drop_port', (args[0].dpid, args[0].port_no)))
+        elif kind in TOPOLOGY_CALLS:
+            events.append((kind, tuple(args)))
+    return events
+
+
+def own_events(topology, owns):
+    "The switches of owns() and the links into them, as plain events announcing them again."
+    events = [('add_switch', (dpid, sorted(topology.ports.get(dpid, ()))))
+              for dpid in topology.graph if owns(dpid)]
+    events.extend(('add_link', (src, dst, data['port'], data['peer_port']))
+                  for src, dst, data in topology.graph.edges(data=True) if owns(dst))
+    return events
+
+
+def topology_changes(arrays, topology):
+    """
+    The TopologyState calls [(kind, args)] that bring topology in line with
+    the snapshot arrays of the coordinator: a diff, so that applied like a
+    discovery batch the route table is repaired rather than rebuilt.
+    """
+    graph = topology.graph
+    ports = {}
+    for dpid, port in arrays['ports'].tolist():
+        ports.setdefault(dpid, set()).add(port)
+    switches = set(arrays['switches'].tolist())
+    links = {}
+    for (src, dst, port, peer_port), cost in zip(arrays['links'].tolist(), arrays['link_costs'].tolist()):
+        links[(src, dst)] = (port, peer_port, cost)
+
+    changes = [('drop_switch', (dpid,)) for dpid in graph if dpid not in switches]
+    changes.extend(('drop_link', (src, dst)) for src, dst in graph.edges()
+                   if (src, dst) not in links and src in switches and dst in switches)
+    for dpid in sorted(switches):
+        if dpid not in graph:
+            changes.append(('add_switch', (dpid, sorted(ports.get(dpid, ())))))
+            continue
+        old, new = topology.ports.get(dpid, set()), ports.get(dpid, set())
+        changes.extend(('drop_port', (dpid, port)) for port in sorted(old - new))
+        changes.extend(('add_port', (dpid, port)) for port in sorted(new - old))
+    for (src, dst), (port, peer_port, cost) in sorted(links.items()):
+        data = graph.get_edge_data(src, dst)
+        if data is not None and (data['port'], data['peer_port']) == (port, peer_port):
+            if data['weight'] != cost:
+                changes.append(('set_link_cost', (src, dst, cost)))
+            continue
+        if data is not None:
+            # the same switches, other ports
+            changes.append(('drop_link', (src, dst)))
+        changes.append(('add_link', (src, dst, port, peer_port, cost)))
+    return changes
+
+
+def apply_hosts(arrays, hosts, owns):
+    """
+    Bring the HostLocator hosts in line with the snapshot arrays. A host on
+    a switch owns() keeps its place unless the snapshot saw it elsewhere
+    later. Returns the MACs of the hosts that moved or went away.
+    """
+    seen = dict((mac, (dpid, port, at)) for (mac, dpid, port), at in
+                zip(arrays['hosts'].tolist(), arrays['host_seen'].tolist()))
+    moved = []
+    for mac, (dpid, port, _) in list(hosts.hosts.items()):
+        if not owns(dpid) and mac not in seen:
+            hosts.forget(mac)
+            moved.append(mac)
+    for mac, (dpid, port, at) in seen.items():
+        entry = hosts.hosts.get(mac)
+        if entry is not None and (entry[0], entry[1]) == (dpid, port):
+            continue
+        if owns(dpid) or (entry is not None and owns(entry[0]) and entry[2] >= at):
+            # this worker knows its own hosts first hand
+            continue
+        hosts.learn(mac, dpid, port, REMOTE_HOST_SEEN)
+        if entry is not None:
+            moved.append(mac)
+    return moved
+
+
+class ShardClient(object):
+    """
+    The worker end of the coordinator connection. Messages are queued while
+    the coordinator cannot be reached and sent once it can; after connecting
+    (again) the worker announces its switches, links and hosts from scratch.
+    """
+
+    def __init__(self, index, shards, address=COORDINATOR_ADDRESS, authkey=None, announce=None):
+        if not 0 <= index < shards:
+            raise ValueError("shard %d of %d" % (index, shards))
+        self.index = index
+        self.shards = shards
+        self.address = address
+        self.authkey = require_authkey(authkey)
+        # () -> plain events re-announcing this worker's part of the topology
+        self.announce = announce
+        self.conn = None
+        self.outbox = []
+        # mac -> (dpid, port) and ip -> mac as last sent
+        self.hosts_sent = {}
+        self.arp_sent = {}
+        self.connects = 0
+        self.snapshots = 0
+
+    def owns(self, dpid):
+        return shard_of(dpid, self.shards) == self.index
+
+    def connected(self):
+        return self.conn is not None
+
+    def send_events(self, events):
+        if events:
+            self._send(('events', self.index, events))
+
+    def send_hosts(self, hosts, arp_proxy):
+        "Send the hosts of the own switches and the ARP entries that changed since the last call."
+        own = dict((mac, entry) for mac, entry in hosts.hosts.items() if self.owns(entry[0]))
+        learned = [(mac, dpid, port, seen) for mac, (dpid, port, seen) in own.items()
+                   if self.hosts_sent.get(mac) != (dpid, port)]
+        forgotten = [(mac,) + self.hosts_sent[mac] for mac in self.hosts_sent if mac not in own]
+        if learned or forgotten:
+            self._send(('hosts', self.index, learned, forgotten))
+            self.hosts_sent = dict((mac, (dpid, port)) for mac, (dpid, port, _) in own.items())
+        entries = [(ip, mac) for ip, mac in arp_proxy.ip_to_mac.items() if self.arp_sent.get(ip) != mac]
+        if entries:
+            self._send(('arp', self.index, entries))
+            self.arp_sent.update(entries)
+
+    def receive(self):
+        "The arrays of the newest snapshot published since the last call, or None."
+        if self.conn is None and not self._flush():
+            return None
+        data = None
+        try:
+            while self.conn.poll(0):
+                data = self.conn.recv_bytes()
+        except (OSError, EOFError):
+            self._disconnected()
+        if data is None:
+            return None
+        self.snapshots += 1
+        return snapshot.loads(data)
+
+    def apply_hosts(self, arrays, hosts, arp_proxy):
+        "apply_hosts() plus the ARP table of the snapshot. Returns the MACs of the hosts that moved."
+        moved = apply_hosts(arrays, hosts, self.owns)
+        for ip, mac in arrays['arp'].tolist():
+            arp_proxy.learn(ip, mac)
+            # only the entries learned by this worker are sent back
+            self.arp_sent[ip] = mac
+        return moved
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _send(self, message):
+        self.outbox.append(message)
+        self._flush()
+
+    def _flush(self):
+        if self.conn is None:
+            try:
+                self.conn = Client(self.address, authkey=self.authkey)
+            except (OSError, EOFError, AuthenticationError):
+                return False
+            self.connects += 1
+            # a new coordinator knows nothing of this worker, the hosts and ARP entries are resent too
+            self.hosts_sent, self.arp_sent = {}, {}
+            hello = [('hello', self.index)]
+            if self.announce is not None:
+                hello.append(('events', self.index, self.announce()))
+            self.outbox[:0] = hello
+        try:
+            while self.outbox:
+                self.conn.send(self.outbox[0])
+                self.outbox.pop(0)
+        except (OSError, EOFError):
+            self._disconnected()
+            return False
+        return True
+
+    def _disconnected(self):
+        self.conn.close()
+        self.conn = None
+        # what was sent may not have arrived, it is announced again on the next connection
+        self.outbox = [message for message in self.outbox if message[0] != 'hello']
+
+
+class Coordinator(object):
+    "Owns the topology of a sharded deployment and publishes it to the workers."
+
+    def __init__(self, shards, address=COORDINATOR_ADDRESS, authkey=None, clock=time.time):
+        self.shards = shards
+        # (src, dst) -> cost reported by a worker
+        self.costs = {}
+        self.topology = TopologyState(self.link_cost)
+        self.arp_proxy = ArpProxy(self.topology.hosts)
+        self.convergence = ConvergenceManager(self.apply, QUIET_PERIOD, MAX_BATCH_DELAY, clock)
+        self.clock = clock
+        self.listener = Listener(address, authkey=require_authkey(authkey))
+        self.address = self.listener.address
+        # shard index -> connection, and the connections that did not say hello yet
+        self.workers = {}
+        self.accepted = []
+        self._lock = threading.Lock()
+        self._closed = False
+        # the last published snapshot, sent to every worker saying hello
+        self.data = None
+        self.published = 0
+
+    def link_cost(self, src, dst):
+        return self.costs.get((src, dst), DEFAULT_LINK_COST)
+
+    def serve(self, duration=None):
+        "Serve the workers, for duration seconds or until close()."
+        accept = threading.Thread(target=self._accept)
+        accept.daemon = True
+        accept.start()
+        deadline = None if duration is None else self.clock() + duration
+        while not self._closed and (deadline is None or self.clock() < deadline):
+            # next_due() is already relative to now; the accept thread's new connections are
+            # picked up within POLL_INTERVAL
+            timeout = POLL_INTERVAL
+            if len(self.convergence):
+                timeout = min(timeout, self.convergence.next_due())
+            with self._lock:
+                conns = self.accepted + list(self.workers.values())
+            if conns:
+                ready = wait(conns, timeout)
+            else:
+                time.sleep(timeout)
+                ready = []
+            for conn in ready:
+                try:
+                    message = conn.recv()
+                except (OSError, EOFError):
+                    self._drop(conn)
+                    continue
+                self.handle(conn, message)
+            if self.convergence.due():
+                self.convergence.flush()
+
+    def handle(self, conn, message):
+        kind = message[0]
+        if kind == 'hello':
+            index = message[1]
+            with self._lock:
+                if conn in self.accepted:
+                    self.accepted.remove(conn)
+                old = self.workers.get(index)
+                self.workers[index] = conn
+            if old is not None and old is not conn:
+                # the worker reconnected before its old connection was noticed to be gone
+                old.close()
+                self._forget_shard(index)
+            LOG.info("shard %d connected", index)
+            self._send(conn, self.data if self.data is not None else self._dumps())
+        elif kind == 'events':
+            for event, args in message[2]:
+                self.convergence.add(event, *args)
+        elif kind == 'hosts':
+            self.convergence.add('hosts', message[2], message[3])
+        elif kind == 'arp':
+            self.convergence.add('arp', message[2])
+
+    def apply(self, batch):
+        "Apply a batch of worker messages and publish the result."
+        topology = self.topology
+        hosts = topology.hosts
+        route_table = topology.route_table
+        # the coordinator routes nothing itself, the trees are only marked outdated
+        route_table.begin_batch()
+        for kind, args in batch:
+            if kind == 'hosts':
+                learned, forgotten = args
+                for mac, dpid, port, seen in learned:
+                    entry = hosts.hosts.get(mac)
+                    if entry is None or entry[2] <= seen:
+                        hosts.learn(mac, dpid, port, seen)
+                for mac, dpid, port in forgotten:
+                    if hosts.lookup(mac) == (dpid, port):
+                        hosts.forget(mac)
+            elif kind == 'arp':
+                for ip, mac in args[0]:
+                    self.arp_proxy.learn(ip, mac)
+            elif kind == 'add_link':
+                src, dst, port, peer_port = args
+                topology.add_link(src, dst, port, peer_port, self.link_cost(src, dst))
+            elif kind == 'set_link_cost':
+                src, dst, cost = args
+                self.costs[(src, dst)] = cost
+                topology.set_link_cost(src, dst, cost)
+            elif kind == 'drop_link':
+                self.costs.pop(args, None)
+                topology.drop_link(*args)
+            elif kind in TOPOLOGY_CALLS:
+                getattr(topology, kind)(*args)
+        route_table.end_batch(rebuild=False)
+        self.publish()
+
+    def publish(self):
+        self.data = self._dumps()
+        self.published += 1
+        with self._lock:
+            conns = list(self.workers.values())
+        for conn in conns:
+            self._send(conn, self.data)
+
+    def close(self):
+        self._closed = True
+        self.listener.close()
+        with self._lock:
+            conns = self.accepted + list(self.workers.values())
+            self.accepted, self.workers = [], {}
+        for conn in conns:
+            conn.close()
+
+    def _dumps(self):
+        return snapshot.dumps(self.topology, self.arp_proxy, {}, self.costs, trees=False)
+
+    def _send(self, conn, data):
+        try:
+            conn.send_bytes(data)
+        except (OSError, EOFError):
+            self._drop(conn)
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue
+            with self._lock:
+                self.accepted.append(conn)
+
+    def _drop(self, conn):
+        "Forget a worker that went away, with its switches and hosts."
+        with self._lock:
+            if conn in self.accepted:
+                self.accepted.remove(conn)
+            index = next((i for i, c in self.workers.items() if c is conn), None)
+            if index is not None:
+                del self.workers[index]
+        conn.close()
+        if index is not None:
+            LOG.info("shard %d disconnected", index)
+            self._forget_shard(index)
+
+    def _forget_shard(self, index):
+        "Queue the removal of the switches and hosts of a shard, it announces them again on hello."
+        for dpid in list(self.topology.graph):
+            if shard_of(dpid, self.shards) == index:
+                self.convergence.add('drop_switch', dpid)
+        forgotten = [(mac, dpid, port) for mac, (dpid, port, _) in self.topology.hosts.hosts.items()
+                     if shard_of(dpid, self.shards) == index]
+        if forgotten:
+            self.convergence.add('hosts', [], forgotten)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command')
+    coordinator = commands.add_parser('coordinator', help='run the topology coordinator')
+    coordinator.add_argument('--shards', type=int, required=True)
+    coordinator.add_argument('--address', default='%s:%d' % COORDINATOR_ADDRESS,
+                             help='host:port or path of a Unix socket')
+    assign = commands.add_parser('assign', help='print the ovs-vsctl commands connecting the switches')
+    assign.add_argument('--shards', type=int, required=True)
+    assign.add_argument('--switches', type=int, required=True, help='switches s1 to sN')
+    assign.add_argument('--host', default='127.0.0.1', help='address of the workers')
+    assign.add_argument('--base-port', type=int, default=BASE_OFP_PORT)
+    args = parser.parse_args()
+
+    if args.command == 'coordinator':
+        if not AUTHKEY:
+            parser.error("set SIMPLE_SWITCH_SHARD_KEY to the secret shared with the workers")
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+        server = Coordinator(args.shards, parse_address(args.address))
+        LOG.info("coordinating %d shards on %s", args.shards, args.address)
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            pass
+        server.close()
+    elif args.command == 'assign':
+        for dpid in range(1, args.switches + 1):
+            print("ovs-vsctl set-controller s%d tcp:%s:%d" % (
+                dpid, args.host, args.base_port + shard_of(dpid, args.shards)))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
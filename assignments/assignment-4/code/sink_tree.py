@@ -0,0 +1,23 @@
+"""
+Destination based forwarding over sink trees.
+
+For every destination host the shortest paths towards its switch form a
+tree rooted at that switch (the sink tree). Each switch of the tree gets a
+single eth_dst rule pointing at its parent, whatever port or switch the
+traffic enters from, so a switch holds one entry per destination instead of
+one per (ingress port, destination) pair. The whole tree is programmed on
+the first packet towards a destination.
+"""
+
+from ecmp import EcmpInstaller
+
+
+class SinkTreeInstaller(EcmpInstaller):
+
+    whole_tree = True
+
+    def _entry(self, dpid, eth_dst, dst_dpid, host_port, next_hops, dist):
+        if dpid == dst_dpid:
+            return ('port', host_port)
+        # the equal-cost next hops are sorted, taking the first of each keeps it a tree
+        return ('port', self.topology.link_ports(dpid, next_hops[dpid][0])[0])
@@ -0,0 +1,170 @@
+"""
+Warm-restart snapshots of the controller state.
+
+save() writes the topology (switches, their ports and the links with ports,
+costs and measured delays), the host locations, the ARP table, mac_to_port and the shortest
+path trees of the RouteTable as flat NumPy arrays in one uncompressed .npz
+file, written next to the target and renamed over it so a crash never
+leaves half a snapshot. load() reads it back, and restore() puts it into
+a fresh TopologyState so the routes are served from the first packet-in
+after a restart, without waiting for LLDP and without flooding for the
+hosts.
+
+Before restoring, the caller checks with has_switch() that the first switch
+to connect is in the snapshot with the same ports. The restored switches
+and links are only provisional: restore() returns them, the caller
+confirms the ones discovery reports again and drops the others after a
+while (see SimpleSwitch13._reconcile_snapshot).
+
+dumps() and loads() do the same in memory; the shard coordinator publishes
+its topology this way, without the trees (see shard.py).
+"""
+
+import io
+import os
+import time
+import zipfile
+
+import numpy as np
+
+from host_locator import int_to_mac, mac_to_int
+
+# Bumped when the layout of the arrays changes, older files are ignored
+FORMAT_VERSION = 1
+
+
+def _rows(rows, width, dtype=np.uint64):
+    return np.array(rows, dtype=dtype).reshape(-1, width)
+
+
+def snapshot_arrays(topology, arp_proxy, mac_to_port, delays=None, now=None, trees=True):
+    """
+    The arrays of a snapshot. delays is {(src, dst): delay cost} of the
+    measured links (DelayMonitor.costs); with trees=False the route table
+    trees are left out.
+    """
+    delays = delays or {}
+    if now is None:
+        now = time.time()
+    graph = topology.graph
+    route_table = topology.route_table
+
+    tree_rows, tree_dist = [], []
+    for src, (dist, parent) in (route_table.trees.items() if trees else ()):
+        if src in route_table.outdated:
+            # rebuilt after the restore
+            continue
+        for node, d in dist.items():
+            p = parent.get(node)
+            tree_rows.append((src, node, node if p is None else p))
+            tree_dist.append(d)
+
+    links = list(graph.edges(data=True))
+    return {
+        'header': np.array([FORMAT_VERSION, now], dtype=np.float64),
+        'switches': np.array(sorted(graph.nodes), dtype=np.uint64),
+        'ports': _rows([(dpid, port) for dpid, ports in topology.ports.items() for port in ports], 2),
+        'links': _rows([(src, dst, data['port'], data['peer_port']) for src, dst, data in links], 4),
+        'link_costs': np.array([data['weight'] for _, _, data in links], dtype=np.float64),
+        # nan where the delay was not measured yet
+        'link_delays': np.array([delays.get((src, dst), np.nan) for src, dst, _ in links], dtype=np.float64),
+        'hosts': _rows([(mac, dpid, port) for mac, (dpid, port, _) in topology.hosts.hosts.items()], 3),
+        # when each host was last seen, restore() ages them from the restart instead
+        'host_seen': np.array([seen for _, _, seen in topology.hosts.hosts.values()], dtype=np.float64),
+        'arp': _rows(list(arp_proxy.ip_to_mac.items()), 2),
+        'mac_to_port': _rows([(dpid, mac_to_int(mac), port)
+                              for dpid, macs in mac_to_port.items() for mac, port in macs.items()], 3),
+        'trees': _rows(tree_rows, 3),
+        'tree_dist': np.array(tree_dist, dtype=np.float64),
+    }
+
+
+def save(path, topology, arp_proxy, mac_to_port, delays=None, now=None):
+    "Write the snapshot to path. Returns the size in bytes."
+    arrays = snapshot_arrays(topology, arp_proxy, mac_to_port, delays, now)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def dumps(topology, arp_proxy, mac_to_port, delays=None, now=None, trees=True):
+    "The snapshot as bytes."
+    buf = io.BytesIO()
+    np.savez(buf, **snapshot_arrays(topology, arp_proxy, mac_to_port, delays, now, trees))
+    return buf.getvalue()
+
+
+def load(path):
+    "The arrays of a snapshot, or None if there is none or it cannot be read."
+    return _read(path)
+
+
+def loads(data):
+    "The arrays of a snapshot given as bytes, or None if they cannot be read."
+    return _read(io.BytesIO(data))
+
+
+def _read(source):
+    try:
+        with np.load(source) as data:
+            arrays = dict((name, data[name]) for name in data.files)
+    except (IOError, OSError, ValueError, zipfile.BadZipfile):
+        return None
+    if 'header' not in arrays or int(arrays['header'][0]) != FORMAT_VERSION:
+        return None
+    return arrays
+
+
+def written_at(arrays):
+    return float(arrays['header'][1])
+
+
+def has_switch(arrays, dpid, ports):
+    "Whether the snapshot has the switch dpid with exactly these port numbers."
+    if dpid not in arrays['switches'].tolist():
+        return False
+    return set(port for d, port in arrays['ports'].tolist() if d == dpid) == set(ports)
+
+
+def restore(arrays, topology, arp_proxy, mac_to_port, delays=None, now=None):
+    """
+    Load the snapshot arrays into an empty TopologyState (plus the ARP table,
+    mac_to_port and the measured delays into the delays dict). The hosts
+    count as seen at now, so they age from the restart. Returns (set of
+    dpids, set of (src, dst) links) restored.
+    """
+    if now is None:
+        now = time.time()
+    ports = {}
+    for dpid, port in arrays['ports'].tolist():
+        ports.setdefault(dpid, []).append(port)
+    switches = set(arrays['switches'].tolist())
+    for dpid in switches:
+        topology.add_switch(dpid, ports.get(dpid, ()))
+
+    route_table = topology.route_table
+    route_table.begin_batch()
+    links = set()
+    for (src, dst, port, peer_port), cost, delay in zip(arrays['links'].tolist(), arrays['link_costs'].tolist(),
+                                                        arrays['link_delays'].tolist()):
+        topology.add_link(src, dst, port, peer_port, cost)
+        links.add((src, dst))
+        if delays is not None and not np.isnan(delay):
+            delays[(src, dst)] = delay
+    trees = {}
+    for (src, node, parent), d in zip(arrays['trees'].tolist(), arrays['tree_dist'].tolist()):
+        dist, parents = trees.setdefault(src, ({}, {}))
+        dist[node] = d
+        parents[node] = None if parent == node else parent
+    route_table.end_batch(rebuild=False)
+    route_table.load_trees(trees)
+
+    for mac, dpid, port in arrays['hosts'].tolist():
+        topology.hosts.learn(mac, dpid, port, now)
+    for ip, mac in arrays['arp'].tolist():
+        arp_proxy.learn(ip, mac)
+    for dpid, mac, port in arrays['mac_to_port'].tolist():
+        mac_to_port.setdefault(dpid, {})[int_to_mac(mac)] = port
+    return switches, links
@@ -0,0 +1,10 @@
+import os
+import sys
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# The controller's ryu.py would shadow the ryu package: import the package first, with the code
+# directory (the working directory under `python -m pytest`) off the path, then append it
+sys.path[:] = [path for path in sys.path if os.path.abspath(path or '.') != os.path.abspath(CODE_DIR)]
+import ryu.ofproto.ofproto_v1_3_parser  # noqa: E402,F401
+sys.path.append(CODE_DIR)
@@ -0,0 +1,85 @@
+from ryu.lib.packet import arp, ethernet, ether_types, packet, vlan
+
+from arp_proxy import ARP_REPLY, ARP_REQUEST, ArpProxy, ip_to_int, parse_arp
+from host_locator import HostLocator, mac_to_int
+
+MAC_A, IP_A = '00:00:00:00:00:0a', '10.0.0.10'
+MAC_B, IP_B = '00:00:00:00:00:0b', '10.0.0.11'
+
+
+def arp_frame(opcode, src_mac, src_ip, dst_ip, dst_mac='00:00:00:00:00:00', vlan_id=None):
+    pkt = packet.Packet()
+    eth_dst = 'ff:ff:ff:ff:ff:ff' if opcode == arp.ARP_REQUEST else dst_mac
+    if vlan_id is None:
+        pkt.add_protocol(ethernet.ethernet(dst=eth_dst, src=src_mac, ethertype=ether_types.ETH_TYPE_ARP))
+    else:
+        pkt.add_protocol(ethernet.ethernet(dst=eth_dst, src=src_mac, ethertype=ether_types.ETH_TYPE_8021Q))
+        pkt.add_protocol(vlan.vlan(vid=vlan_id, ethertype=ether_types.ETH_TYPE_ARP))
+    pkt.add_protocol(arp.arp_ip(opcode, src_mac, src_ip, dst_mac, dst_ip))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def proxy():
+    hosts = HostLocator()
+    hosts.learn(MAC_B, 2, 1, now=100.0)
+    arp_proxy = ArpProxy(hosts)
+    arp_proxy.learn(IP_B, MAC_B)
+    return arp_proxy
+
+
+def test_parse_arp_reads_plain_and_tagged_requests():
+    expected = (ARP_REQUEST, mac_to_int(MAC_A), ip_to_int(IP_A), 0, ip_to_int(IP_B))
+    assert parse_arp(arp_frame(arp.ARP_REQUEST, MAC_A, IP_A, IP_B)) == expected
+    assert parse_arp(arp_frame(arp.ARP_REQUEST, MAC_A, IP_A, IP_B, vlan_id=10)) == expected
+
+
+def test_parse_arp_rejects_other_and_truncated_frames():
+    frame = arp_frame(arp.ARP_REQUEST, MAC_A, IP_A, IP_B)
+    # the ethernet header and 27 of the 28 bytes of the ARP header
+    assert parse_arp(frame[:14 + 27]) is None
+    # an IPv6 ptype is not IPv4 ARP
+    assert parse_arp(frame[:16] + b'\x86\xdd' + frame[18:]) is None
+
+
+def test_a_request_for_a_known_host_is_answered():
+    arp_proxy = proxy()
+    reply = arp_proxy.handle(arp_frame(arp.ARP_REQUEST, MAC_A, IP_A, IP_B))
+    assert arp_proxy.answered == 1
+    # the sender was learned on the way
+    assert arp_proxy.ip_to_mac[ip_to_int(IP_A)] == mac_to_int(MAC_A)
+
+    pkt = packet.Packet(reply)
+    eth = pkt.get_protocol(ethernet.ethernet)
+    assert (eth.src, eth.dst, eth.ethertype) == (MAC_B, MAC_A, ether_types.ETH_TYPE_ARP)
+    answer = pkt.get_protocol(arp.arp)
+    assert answer.opcode == ARP_REPLY
+    assert (answer.src_mac, answer.src_ip, answer.dst_mac, answer.dst_ip) == (MAC_B, IP_B, MAC_A, IP_A)
+
+
+def test_requests_that_cannot_be_answered_are_left_to_flood():
+    arp_proxy = proxy()
+    # nobody ever announced 10.0.0.12
+    assert arp_proxy.handle(arp_frame(arp.ARP_REQUEST, MAC_A, IP_A, '10.0.0.12')) is None
+    # B's address is known, but the host went away
+    arp_proxy.hosts.forget(MAC_B)
+    assert arp_proxy.handle(arp_frame(arp.ARP_REQUEST, MAC_A, IP_A, IP_B)) is None
+    assert (arp_proxy.answered, arp_proxy.missed) == (0, 2)
+
+
+def test_replies_gratuitous_arp_and_probes_are_not_answered():
+    arp_proxy = proxy()
+    assert arp_proxy.handle(arp_frame(arp.ARP_REPLY, MAC_A, IP_A, IP_B, dst_mac=MAC_B)) is None
+    assert arp_proxy.ip_to_mac[ip_to_int(IP_A)] == mac_to_int(MAC_A)
+    assert arp_proxy.handle(arp_frame(arp.ARP_REQUEST, MAC_B, IP_B, IP_B)) is None
+    # an address probe comes from 0.0.0.0, which is not learned
+    assert arp_proxy.handle(arp_frame(arp.ARP_REQUEST, MAC_A, '0.0.0.0', IP_B)) is not None
+    assert 0 not in arp_proxy.ip_to_mac
+
+
+def test_a_forgotten_host_loses_all_its_addresses():
+    arp_proxy = proxy()
+    arp_proxy.learn('10.0.0.12', MAC_B)
+    arp_proxy.learn(IP_A, MAC_A)
+    assert arp_proxy.forget(MAC_B) == 2 and arp_proxy.forget(MAC_B) == 0
+    assert arp_proxy.ip_to_mac == {ip_to_int(IP_A): mac_to_int(MAC_A)}
@@ -0,0 +1,89 @@
+import pytest
+
+from ecmp import EcmpInstaller
+from fakes import FakeDatapath, load_controller
+from sink_tree import SinkTreeInstaller
+
+
+def start(monkeypatch, **environ):
+    "A SimpleSwitch13 of a fresh controller module, started with environ, and the module."
+    for name in ('SIMPLE_SWITCH_FORWARDING', 'SIMPLE_SWITCH_SHARDS', 'SIMPLE_SWITCH_TIMESERIES',
+                 'SIMPLE_SWITCH_TIMESERIES_CSV'):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in environ.items():
+        monkeypatch.setenv(name, value)
+    controller = load_controller()
+    controller.SNAPSHOT_PATH = None
+    return controller, controller.SimpleSwitch13()
+
+
+def test_the_forwarding_mode_defaults_to_ecmp(monkeypatch):
+    _, app = start(monkeypatch)
+    try:
+        assert app.forwarding == 'ecmp' and type(app.dest_installer) is EcmpInstaller
+    finally:
+        app.close()
+
+
+def test_the_forwarding_mode_comes_from_the_environment(monkeypatch):
+    _, app = start(monkeypatch, SIMPLE_SWITCH_FORWARDING='sink_tree')
+    try:
+        assert app.forwarding == 'sink_tree' and type(app.dest_installer) is SinkTreeInstaller
+    finally:
+        app.close()
+
+
+def test_an_unknown_forwarding_mode_is_rejected(monkeypatch):
+    with pytest.raises(ValueError, match='shortest'):
+        start(monkeypatch, SIMPLE_SWITCH_FORWARDING='shortest')
+
+
+def test_a_shard_does_not_forward_along_paths(monkeypatch):
+    with pytest.raises(ValueError, match="'path'"):
+        start(monkeypatch, SIMPLE_SWITCH_FORWARDING='path', SIMPLE_SWITCH_SHARDS='2')
+
+
+def test_the_link_history_is_kept_on_disk_and_dumped_on_close(monkeypatch, tmp_path):
+    directory, csv = tmp_path / 'timeseries', tmp_path / 'links.csv'
+    _, app = start(monkeypatch, SIMPLE_SWITCH_TIMESERIES=str(directory),
+                   SIMPLE_SWITCH_TIMESERIES_CSV=str(csv))
+    app.timeseries.record('delay', (1, 2), 100.0, 0.5)
+    app.close()
+    assert csv.read_text().splitlines() == ['delay,1,2,100.000000,0.5']
+
+    _, app = start(monkeypatch, SIMPLE_SWITCH_TIMESERIES=str(directory))
+    try:
+        assert app.timeseries.get('delay', (1, 2)).last() == (100.0, 0.5)
+    finally:
+        app.close()
+
+
+def test_aged_out_hosts_are_forgotten_everywhere(monkeypatch):
+    _, app = start(monkeypatch)
+    try:
+        app._apply_topology([('add_switch', (1, [1, 2])), ('add_switch', (2, [1, 2])),
+                             ('add_link', (1, 2, 1, 1, 1.0)), ('add_link', (2, 1, 1, 1, 1.0))])
+        for dpid in (1, 2):
+            app.datapaths[dpid] = FakeDatapath(dpid)
+        silent, recent = '00:00:00:00:00:0a', '00:00:00:00:00:0b'
+        for mac, ip, seen in ((silent, '10.0.0.10', 0.0), (recent, '10.0.0.11', 100.0)):
+            app.hosts.learn(mac, 2, 2, now=seen)
+            app.arp_proxy.learn(ip, mac)
+            app.mac_to_port.setdefault(2, {})[mac] = 2
+        assert app.dest_installer.install(app.datapaths, 1, silent, 2, 2) is not None
+        for datapath in app.datapaths.values():
+            app.send_queues.flush(datapath)
+            datapath.reset()
+
+        assert app.age_hosts(now=app.hosts.max_age + 50.0) == [silent]
+        assert silent not in app.dest_installer.destinations and silent not in app.mac_to_port[2]
+        assert sorted(app.arp_proxy.ip_to_mac.values()) == [0xb]
+        assert app.hosts.lookup(recent) == (2, 2) and app.mac_to_port[2] == {recent: 2}
+        for datapath in app.datapaths.values():
+            app.send_queues.flush(datapath)
+            # the rules towards the host are deleted on every switch
+            deletes = [msg for msg in datapath.sent if type(msg).__name__ == 'OFPFlowMod' and
+                       msg.command == datapath.ofproto.OFPFC_DELETE and msg.match['eth_dst'] == silent]
+            assert deletes
+    finally:
+        app.close()
@@ -0,0 +1,54 @@
+from convergence import ConvergenceManager
+from fakes import FakeClock
+
+
+def make_manager(clock):
+    batches = []
+    return ConvergenceManager(batches.append, quiet_period=0.2, max_delay=2.0, clock=clock), batches
+
+
+def test_a_burst_is_applied_once_the_topology_is_quiet():
+    clock = FakeClock()
+    manager, batches = make_manager(clock)
+    assert manager.next_due() == 0.2 and not manager.due()
+    manager.add('link_add', 1, 2)
+    clock.advance(0.1)
+    manager.add('link_add', 2, 1)
+    assert not manager.due()
+    assert abs(manager.next_due() - 0.2) < 1e-9
+    clock.advance(0.2)
+    assert manager.due()
+
+    batch = manager.flush()
+    assert batches == [[('link_add', (1, 2)), ('link_add', (2, 1))]]
+    assert batch.events == 2
+    assert abs(batch.burst - 0.1) < 1e-9 and abs(batch.convergence - 0.3) < 1e-9
+    assert manager.stable() and manager.flush() is None
+
+
+def test_a_flapping_link_cannot_hold_the_batch_back():
+    clock = FakeClock()
+    manager, _ = make_manager(clock)
+    for _ in range(19):
+        manager.add('port_down', 1, 1)
+        clock.advance(0.1)
+        assert not manager.due()
+    manager.add('port_down', 1, 1)
+    clock.advance(0.1)
+    assert manager.due()
+    assert manager.next_due() == 0.0
+
+
+def test_stats_summarise_the_batches():
+    clock = FakeClock()
+    manager, _ = make_manager(clock)
+    assert not manager.stable()
+    for events in (1, 3):
+        for _ in range(events):
+            manager.add('link_cost')
+        clock.advance(0.5)
+        manager.flush()
+    stats = manager.stats()
+    assert stats['batches'] == 2 and stats['events'] == 4
+    assert stats['events_per_batch'] == 2.0
+    assert stats['pending'] == 0 and stats['stable']
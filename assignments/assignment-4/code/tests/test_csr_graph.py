@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+import pytest
+
+from csr_graph import CSRGraph
+from routing import shortest_path_tree
+
+
+def random_adjacency(seed, n=15, links=40):
+    rng = random.Random(seed)
+    adj = dict((dpid, {}) for dpid in range(1, n + 1))
+    for _ in range(links):
+        u, v = rng.sample(sorted(adj), 2)
+        adj[u][v] = float(rng.randint(1, 9))
+    return adj
+
+
+def ports_of(adj):
+    return dict(((u, v), 100 + v) for u in adj for v in adj[u])
+
+
+def expected_from(adj, src):
+    return shortest_path_tree(adj, src)[0]
+
+
+@pytest.mark.parametrize('method', ['floyd', 'dijkstra'])
+@pytest.mark.parametrize('seed', range(5))
+def test_all_pairs_matches_dijkstra(method, seed):
+    adj = random_adjacency(seed)
+    graph = CSRGraph.from_adjacency(adj, ports_of(adj))
+    dist, next_edge = graph.all_pairs(method, batch=4)
+    for src in adj:
+        expected, _ = shortest_path_tree(adj, src)
+        for dst in adj:
+            i, j = graph.index[src], graph.index[dst]
+            assert dist[i, j] == expected.get(dst, np.inf)
+            hop = graph.next_hop(next_edge, src, dst)
+            if src == dst or dst not in expected:
+                assert hop is None
+                continue
+            # the first link lies on a shortest path
+            nxt, port = hop
+            assert port == 100 + nxt
+            assert adj[src][nxt] + expected_from(adj, nxt).get(dst, np.inf) == expected[dst]
+
+
+def test_floyd_and_dijkstra_agree():
+    adj = random_adjacency(7, n=30, links=90)
+    graph = CSRGraph.from_adjacency(adj)
+    floyd, _ = graph.all_pairs('floyd')
+    dijkstra, _ = graph.all_pairs('dijkstra', batch=7)
+    assert np.array_equal(floyd, dijkstra)
+
+
+def test_adjacency_round_trip_and_unknown_method():
+    adj = random_adjacency(3)
+    graph = CSRGraph.from_adjacency(adj)
+    assert graph.adjacency() == adj
+    assert len(graph) == len(adj)
+    with pytest.raises(ValueError):
+        graph.all_pairs('bellman-ford')
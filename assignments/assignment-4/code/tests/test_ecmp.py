@@ -0,0 +1,149 @@
+from ecmp import EcmpInstaller
+from fakes import FakeClock, FakeDatapath
+from routing import ecmp_next_hops
+from send_queue import SendQueues
+from topology_state import TopologyState
+
+HOST = '00:00:00:00:00:04'
+OTHER_HOST = '00:00:00:00:00:05'
+HOST_PORT = 9
+
+# 1 reaches 4 over 2 and over 3 at the same cost, 5 hangs off 2 and 6 off 3
+LINKS = [(1, 2, 1, 1, 1.0), (1, 3, 2, 1, 1.0), (2, 4, 2, 1, 1.0), (3, 4, 2, 2, 1.0),
+         (5, 2, 1, 3, 1.0), (6, 3, 1, 3, 1.0)]
+
+
+def topology_of(links):
+    "A TopologyState of the undirected links [(a, b, port on a, port on b, cost)]."
+    topology = TopologyState(lambda src, dst: 1)
+    for dpid in sorted(set(a for a, _, _, _, _ in links) | set(b for _, b, _, _, _ in links)):
+        topology.add_switch(dpid, [])
+    for a, b, port_a, port_b, cost in links:
+        topology.add_link(a, b, port_a, port_b, cost)
+        topology.add_link(b, a, port_b, port_a, cost)
+    return topology
+
+
+def add_flow(send_queues):
+    "SimpleSwitch13.add_flow reduced to the FlowMod it queues."
+    def add(datapath, priority, match, actions, **kwargs):
+        parser = datapath.ofproto_parser
+        inst = [parser.OFPInstructionActions(datapath.ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        send_queues.put(datapath, parser.OFPFlowMod(datapath, priority=priority, match=match,
+                                                    instructions=inst))
+    return add
+
+
+def setup(links=LINKS):
+    topology = topology_of(links)
+    queues = SendQueues(clock=FakeClock())
+    installer = EcmpInstaller(topology, add_flow(queues), queues)
+    datapaths = dict((dpid, FakeDatapath(dpid)) for dpid in topology.graph)
+    return topology, installer, datapaths
+
+
+def sent(datapaths):
+    "{dpid: [message type names]} of what went out since the last call, barriers left out."
+    names = {}
+    for dpid, datapath in datapaths.items():
+        kinds = [name for name in datapath.names() if name != 'OFPBarrierRequest']
+        if kinds:
+            names[dpid] = kinds
+        datapath.reset()
+    return names
+
+
+def test_the_dag_keeps_every_equal_cost_next_hop():
+    topology = topology_of(LINKS + [(1, 4, 3, 3, 2.5)])
+    dist, next_hops = ecmp_next_hops(topology.route_table.graph, 4)
+    assert dist == {4: 0.0, 2: 1.0, 3: 1.0, 1: 2.0, 5: 2.0, 6: 2.0}
+    # the direct link costs more than the two hop paths and is not on the DAG
+    assert next_hops == {1: [2, 3], 2: [4], 3: [4], 5: [2], 6: [3]}
+
+
+def test_a_switch_with_equal_cost_next_hops_gets_a_select_group():
+    topology, installer, datapaths = setup()
+    actions, barriers = installer.install(datapaths, 1, HOST, 4, HOST_PORT)
+
+    # only the switches reachable from the ingress are programmed
+    assert sorted(installer.installed[HOST]) == [1, 2, 3, 4]
+    assert len(barriers) == 4
+    ofproto = datapaths[1].ofproto
+    group, flow_mod, _ = datapaths[1].sent
+    assert group.type == ofproto.OFPGT_SELECT and group.command == ofproto.OFPGC_ADD
+    assert [(bucket.weight, bucket.actions[0].port) for bucket in group.buckets] == [(1, 1), (1, 2)]
+    assert flow_mod.match['eth_dst'] == HOST
+    assert flow_mod.instructions[0].actions[0].group_id == group.group_id
+    assert [action.group_id for action in actions] == [group.group_id]
+    for dpid, port in ((2, 2), (3, 2), (4, HOST_PORT)):
+        assert datapaths[dpid].names() == ['OFPFlowMod', 'OFPBarrierRequest']
+        assert datapaths[dpid].sent[0].instructions[0].actions[0].port == port
+
+
+def test_group_ids_are_allocated_per_switch_and_reused_per_destination():
+    topology, installer, datapaths = setup()
+    installer.install(datapaths, 1, HOST, 4, HOST_PORT)
+    installer.install(datapaths, 1, OTHER_HOST, 4, HOST_PORT + 1)
+    assert installer.installed[HOST][1][1] == 1 and installer.installed[OTHER_HOST][1][1] == 2
+    assert installer.last_group_id == {1: 2}
+    installer.refresh(datapaths)
+    assert installer.group_ids == {(1, HOST): 1, (1, OTHER_HOST): 2}
+
+
+def test_refresh_only_sends_what_changed():
+    topology, installer, datapaths = setup()
+    installer.install(datapaths, 1, HOST, 4, HOST_PORT)
+    for datapath in datapaths.values():
+        installer.send_queues.flush(datapath)
+    sent(datapaths)
+
+    # nothing moved, nothing is sent
+    installer.refresh(datapaths)
+    for datapath in datapaths.values():
+        installer.send_queues.flush(datapath)
+    assert sent(datapaths) == {}
+
+    # 1-3 gets dearer: 1 swaps its group for a plain output towards 2, the rest stays as it was
+    topology.set_link_cost(1, 3, 5.0)
+    installer.refresh(datapaths)
+    for datapath in datapaths.values():
+        installer.send_queues.flush(datapath)
+    assert sent(datapaths) == {1: ['OFPFlowMod', 'OFPGroupMod']}
+    assert installer.installed[HOST][1] == ('port', 1)
+    assert (1, HOST) not in installer.group_ids
+
+    # the link 2-4 fails: 1 turns to 3 and 2 sends back to 1, only those two rules change
+    topology.drop_link(2, 4)
+    topology.drop_link(4, 2)
+    installer.refresh(datapaths)
+    for datapath in datapaths.values():
+        installer.send_queues.flush(datapath)
+    assert sent(datapaths) == {1: ['OFPFlowMod'], 2: ['OFPFlowMod']}
+    assert installer.installed[HOST][1] == ('port', 2) and installer.installed[HOST][2] == ('port', 1)
+
+
+def test_a_new_ingress_keeps_the_rules_of_the_earlier_ones():
+    topology, installer, datapaths = setup()
+    installer.install(datapaths, 5, HOST, 4, HOST_PORT)
+    assert sorted(installer.installed[HOST]) == [2, 4, 5]
+    installer.install(datapaths, 6, HOST, 4, HOST_PORT)
+    # the switches programmed for 5 stay, the rules 5 relies on are not deleted
+    assert sorted(installer.installed[HOST]) == [2, 3, 4, 5, 6]
+    for datapath in datapaths.values():
+        installer.send_queues.flush(datapath)
+    deletes = [msg for datapath in datapaths.values() for msg in datapath.sent
+               if type(msg).__name__ == 'OFPFlowMod' and msg.command == datapath.ofproto.OFPFC_DELETE]
+    assert deletes == []
+
+
+def test_load_dags_fills_the_cache_for_the_current_version_only():
+    topology, installer, datapaths = setup()
+    version = topology.route_table.version
+    dag = ({4: 0.0, 1: 1.0}, {1: [4]})
+    assert not installer.load_dags({4: dag}, version - 1)
+    assert installer.load_dags({4: dag}, version)
+    assert installer.dag(4) is dag
+    # the next topology change invalidates the cache, the DAG is computed inline again
+    topology.set_link_cost(1, 2, 3.0)
+    assert installer.dag(4) is not dag
+    assert installer.dag(4)[1][1] == [3]
@@ -0,0 +1,40 @@
+import pytest
+from ryu.lib.packet import ethernet, ether_types, ipv4, packet, vlan
+
+from ethframe import ETH_TYPE_8021Q, ETH_TYPE_ARP, ETH_TYPE_IP, parse_eth
+from host_locator import mac_to_int
+
+DST, SRC = 'ff:00:00:00:01:0a', '02:00:00:00:00:0b'
+
+
+def frame(ethertype=ETH_TYPE_IP, vlan_id=None):
+    pkt = packet.Packet()
+    if vlan_id is None:
+        pkt.add_protocol(ethernet.ethernet(dst=DST, src=SRC, ethertype=ethertype))
+    else:
+        pkt.add_protocol(ethernet.ethernet(dst=DST, src=SRC, ethertype=ether_types.ETH_TYPE_8021Q))
+        pkt.add_protocol(vlan.vlan(vid=vlan_id, ethertype=ethertype))
+    pkt.add_protocol(ipv4.ipv4(src='10.0.0.1', dst='10.0.0.2'))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def test_a_plain_frame_gives_its_addresses_and_ethertype():
+    data = frame()
+    assert parse_eth(data) == (mac_to_int(DST), mac_to_int(SRC), ETH_TYPE_IP)
+    # the header alone is enough, and the data is read in place
+    assert parse_eth(data[:14]) == parse_eth(bytearray(data)) == parse_eth(memoryview(data))
+    assert parse_eth(frame(ETH_TYPE_ARP))[2] == ETH_TYPE_ARP
+
+
+def test_a_tagged_frame_gives_the_inner_ethertype():
+    assert parse_eth(frame(vlan_id=10)) == (mac_to_int(DST), mac_to_int(SRC), ETH_TYPE_IP)
+    assert parse_eth(frame(ETH_TYPE_ARP, vlan_id=4095))[2] == ETH_TYPE_ARP
+    # without the whole tag the outer ethertype is all there is
+    assert parse_eth(frame(vlan_id=10)[:17])[2] == ETH_TYPE_8021Q
+
+
+@pytest.mark.parametrize('length', [0, 6, 13])
+def test_a_truncated_frame_is_rejected(length):
+    with pytest.raises(ValueError, match='%d bytes' % length):
+        parse_eth(frame()[:length])
@@ -0,0 +1,125 @@
+from fakes import FakeClock, FakeDatapath, load_controller
+from fast_failover import FastFailoverInstaller
+from routing import ecmp_next_hops
+from send_queue import SendQueues
+from topology_state import TopologyState
+
+HOST = '00:00:00:00:00:04'
+HOST_PORT = 9
+
+
+def topology_of(links):
+    "A TopologyState of the undirected links [(a, b, port on a, port on b, cost)]."
+    topology = TopologyState(lambda src, dst: 1)
+    for dpid in sorted(set(a for a, _, _, _, _ in links) | set(b for _, b, _, _, _ in links)):
+        topology.add_switch(dpid, [])
+    for a, b, port_a, port_b, cost in links:
+        topology.add_link(a, b, port_a, port_b, cost)
+        topology.add_link(b, a, port_b, port_a, cost)
+    return topology
+
+
+def backup(links, dpid, primary, dst):
+    topology = topology_of(links)
+    installer = FastFailoverInstaller(topology, None, None)
+    dist, next_hops = ecmp_next_hops(topology.route_table.graph, dst)
+    assert next_hops[dpid][0] == primary
+    return installer.backup_next_hop(dpid, primary, next_hops, dist)
+
+
+# switch 1 reaches 4 over 2 at cost 2; 3 is downstream of it (1.5 from 4, 3.5 over it) and
+# 5 is only a loop-free alternate (2.5 from 4, not closer than 1, but not back through it)
+DOWNSTREAM = [(1, 2, 1, 1, 1.0), (2, 4, 2, 1, 1.0), (1, 3, 2, 1, 2.0), (3, 4, 2, 2, 1.5)]
+LFA = [(1, 5, 3, 1, 0.6), (5, 4, 2, 3, 2.5)]
+
+
+def test_an_equal_cost_next_hop_comes_first():
+    square = [(1, 2, 1, 1, 1.0), (2, 4, 2, 1, 1.0), (1, 3, 2, 1, 1.0), (3, 4, 2, 2, 1.0)]
+    assert backup(square + LFA, 1, 2, 4) == 3
+
+
+def test_a_downstream_neighbour_comes_before_a_cheaper_loop_free_alternate():
+    assert backup(DOWNSTREAM + LFA, 1, 2, 4) == 3
+
+
+def test_a_neighbour_meeting_the_lfa_inequality_is_the_last_resort():
+    assert backup(DOWNSTREAM[:2] + LFA, 1, 2, 4) == 5
+
+
+def test_no_backup_when_every_neighbour_routes_back_through_the_switch():
+    # 5 hangs off 1 only, its shortest path to 4 is through 1
+    assert backup(DOWNSTREAM[:2] + [(1, 5, 3, 1, 1.0)], 1, 2, 4) is None
+
+
+def add_flow(send_queues):
+    "SimpleSwitch13.add_flow reduced to the FlowMod it queues."
+    def add(datapath, priority, match, actions, **kwargs):
+        parser = datapath.ofproto_parser
+        inst = [parser.OFPInstructionActions(datapath.ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        send_queues.put(datapath, parser.OFPFlowMod(datapath, priority=priority, match=match,
+                                                    instructions=inst))
+    return add
+
+
+def test_the_switches_get_fast_failover_groups_watching_primary_and_backup():
+    topology = topology_of(DOWNSTREAM + LFA)
+    queues = SendQueues(clock=FakeClock())
+    installer = FastFailoverInstaller(topology, add_flow(queues), queues)
+    datapaths = dict((dpid, FakeDatapath(dpid)) for dpid in topology.graph)
+
+    actions, barriers = installer.install(datapaths, 1, HOST, 4, HOST_PORT)
+    assert len(barriers) == len(datapaths)
+
+    ofproto = datapaths[1].ofproto
+    group_mods = [msg for msg in datapaths[1].sent if type(msg).__name__ == 'OFPGroupMod']
+    assert len(group_mods) == 1
+    group = group_mods[0]
+    assert group.type == ofproto.OFPGT_FF and group.command == ofproto.OFPGC_ADD
+    # the primary towards 2 on port 1, then the backup over 3 on port 2, each watching its port
+    assert [(bucket.watch_port, bucket.actions[0].port) for bucket in group.buckets] == [(1, 1), (2, 2)]
+    assert [action.group_id for action in actions] == [group.group_id]
+
+    flow_mods = [msg for msg in datapaths[1].sent if type(msg).__name__ == 'OFPFlowMod']
+    assert flow_mods[0].match['eth_dst'] == HOST
+    assert flow_mods[0].instructions[0].actions[0].group_id == group.group_id
+    # 4 delivers to the host, without a group
+    assert datapaths[4].names() == ['OFPFlowMod', 'OFPBarrierRequest']
+    assert datapaths[4].sent[0].instructions[0].actions[0].port == HOST_PORT
+
+
+def test_the_backups_are_repaired_periodically_after_a_topology_change(monkeypatch):
+    monkeypatch.delenv('SIMPLE_SWITCH_SHARDS', raising=False)
+    monkeypatch.setenv('SIMPLE_SWITCH_FORWARDING', 'fast_failover')
+    controller = load_controller()
+    controller.SNAPSHOT_PATH = None
+    app = controller.SimpleSwitch13()
+    try:
+        assert isinstance(app.dest_installer, FastFailoverInstaller)
+        links = DOWNSTREAM + LFA
+        app._apply_topology([('add_switch', (dpid, [])) for dpid in (1, 2, 3, 4, 5)] +
+                            [('add_link', link) for a, b, port_a, port_b, cost in links
+                             for link in ((a, b, port_a, port_b, cost), (b, a, port_b, port_a, cost))])
+        app.repair_pending = False
+        for dpid in (1, 2, 3, 4, 5):
+            app.datapaths[dpid] = FakeDatapath(dpid)
+        app.dest_installer.install(app.datapaths, 1, HOST, 4, HOST_PORT)
+        group_id = app.dest_installer.installed[HOST][1][1]
+        for datapath in app.datapaths.values():
+            app.send_queues.flush(datapath)
+            datapath.reset()
+
+        # the link 1-2 fails: switch 1 already detours over its backup, nothing is reprogrammed yet
+        app._apply_topology([('drop_link', (1, 2)), ('drop_link', (2, 1))])
+        assert app.repair_pending
+        assert app.dest_installer.installed[HOST][1] == ('group', group_id, (1, 2))
+
+        assert app.repair_backups()
+        assert not app.repair_pending and not app.repair_backups()
+        # 5 is the primary now (3.1 over it) and the downstream 3 the backup
+        assert app.dest_installer.installed[HOST][1] == ('group', group_id, (3, 2))
+        app.send_queues.flush(app.datapaths[1])
+        group = next(msg for msg in app.datapaths[1].sent if type(msg).__name__ == 'OFPGroupMod')
+        assert group.command == app.datapaths[1].ofproto.OFPGC_MODIFY
+        assert [bucket.watch_port for bucket in group.buckets] == [3, 2]
+    finally:
+        app.close()
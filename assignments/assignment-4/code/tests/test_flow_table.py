@@ -0,0 +1,99 @@
+from collections import namedtuple
+
+from fakes import FakeClock, FakeDatapath, Recorder
+from flow_table import FlowTableManager
+
+FlowStats = namedtuple('FlowStats', 'table_id priority match cookie packet_count')
+FlowRemoved = namedtuple('FlowRemoved', 'datapath table_id priority match cookie reason')
+
+
+def make_manager(budget=3):
+    removed = []
+    manager = FlowTableManager(Recorder(), budget=budget, clock=FakeClock(),
+                               on_removed=lambda datapath, match: removed.append(match['eth_dst']))
+    return manager, removed
+
+
+def install(manager, datapath, eth_dst, table_id=1):
+    match = datapath.ofproto_parser.OFPMatch(eth_dst=eth_dst)
+    cookie = manager.install(datapath, 1, match, 'path', table_id)[0]
+    return match, cookie
+
+
+def test_install_gives_the_class_timeouts_and_a_new_cookie():
+    manager, _ = make_manager()
+    datapath = FakeDatapath(1)
+    parser = datapath.ofproto_parser
+    first = manager.install(datapath, 1, parser.OFPMatch(eth_dst='00:00:00:00:00:01'), 'path')
+    second = manager.install(datapath, 1, parser.OFPMatch(eth_dst='00:00:00:00:00:02'), 'learning')
+    assert first == (1, 60, 0, datapath.ofproto.OFPFF_SEND_FLOW_REM)
+    assert second[:3] == (2, 30, 300)
+    assert manager.install(datapath, 0, parser.OFPMatch(), 'permanent') == (0, 0, 0, 0)
+    assert len(manager.tables[1]) == 2
+
+
+def test_the_least_recently_installed_entry_is_evicted():
+    manager, removed = make_manager()
+    datapath = FakeDatapath(1)
+    for n in range(4):
+        install(manager, datapath, '00:00:00:00:00:0%d' % n)
+    assert removed == ['00:00:00:00:00:00']
+    (dpid, mod), = manager.send_queues.messages
+    assert dpid == 1 and mod.command == datapath.ofproto.OFPFC_DELETE_STRICT
+    assert mod.cookie == 1 and mod.table_id == 1
+    assert manager.stats()[1]['evictions'] == 1
+
+
+def test_an_entry_the_flow_stats_show_in_use_survives_eviction():
+    manager, removed = make_manager()
+    datapath = FakeDatapath(1)
+    used, used_cookie = install(manager, datapath, '00:00:00:00:00:00')
+    install(manager, datapath, '00:00:00:00:00:01')
+    idle, idle_cookie = install(manager, datapath, '00:00:00:00:00:02')
+
+    touched = manager.stats_reply(1, [FlowStats(1, 1, used, used_cookie, 5),
+                                      FlowStats(1, 1, idle, idle_cookie, 0)])
+    assert touched == 1
+    install(manager, datapath, '00:00:00:00:00:03')
+    assert removed == ['00:00:00:00:00:01']
+
+    # no new packets since the last reply: the entry ages like the others
+    manager.stats_reply(1, [FlowStats(1, 1, used, used_cookie, 5)])
+    install(manager, datapath, '00:00:00:00:00:04')
+    install(manager, datapath, '00:00:00:00:00:05')
+    assert removed == ['00:00:00:00:00:01', '00:00:00:00:00:02', '00:00:00:00:00:00']
+
+
+def test_touch_marks_an_entry_recently_used():
+    manager, removed = make_manager()
+    datapath = FakeDatapath(1)
+    first, _ = install(manager, datapath, '00:00:00:00:00:00')
+    install(manager, datapath, '00:00:00:00:00:01')
+    install(manager, datapath, '00:00:00:00:00:02')
+    manager.touch(1, 1, first, table_id=1)
+    install(manager, datapath, '00:00:00:00:00:03')
+    assert removed == ['00:00:00:00:00:01']
+
+
+def test_flow_stats_of_an_older_install_are_ignored():
+    manager, removed = make_manager()
+    datapath = FakeDatapath(1)
+    match, old_cookie = install(manager, datapath, '00:00:00:00:00:00')
+    install(manager, datapath, '00:00:00:00:00:01')
+    install(manager, datapath, '00:00:00:00:00:00')
+    assert manager.stats_reply(1, [FlowStats(1, 1, match, old_cookie, 7)]) == 0
+
+
+def test_flow_removed_of_a_replaced_entry_is_ignored():
+    manager, removed = make_manager()
+    datapath = FakeDatapath(1)
+    match, old_cookie = install(manager, datapath, '00:00:00:00:00:00')
+    _, new_cookie = install(manager, datapath, '00:00:00:00:00:00')
+    assert new_cookie != old_cookie
+
+    manager.removed(FlowRemoved(datapath, 1, 1, match, old_cookie, 0))
+    assert removed == [] and manager.has(1, 1, match, table_id=1)
+
+    manager.removed(FlowRemoved(datapath, 1, 1, match, new_cookie, 0))
+    assert removed == ['00:00:00:00:00:00'] and not manager.has(1, 1, match, table_id=1)
+    assert manager.stats()[1]['removed'] == {'idle_timeout': 2}
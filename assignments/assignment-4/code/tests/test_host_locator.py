@@ -0,0 +1,42 @@
+from fakes import FakeClock
+from host_locator import HostLocator, int_to_mac, mac_to_int
+
+
+def test_mac_conversion_round_trips():
+    assert mac_to_int('00:00:00:00:01:0a') == 266
+    assert mac_to_int(266) == 266
+    assert int_to_mac(266) == '00:00:00:00:01:0a'
+
+
+def test_learn_reports_a_move():
+    hosts = HostLocator(clock=FakeClock())
+    assert hosts.learn('00:00:00:00:00:01', 1, 3) is None
+    assert hosts.learn('00:00:00:00:00:01', 1, 3) is None
+    assert hosts.learn('00:00:00:00:00:01', 2, 1) == (1, 3)
+    assert hosts.moves == 1
+    assert hosts.lookup(1) == (2, 1)
+    assert hosts.dpid('00:00:00:00:00:01') == 2
+    assert hosts.lookup('00:00:00:00:00:02') is None
+
+
+def test_silent_hosts_age_out():
+    clock = FakeClock()
+    hosts = HostLocator(max_age=300, clock=clock)
+    hosts.learn('00:00:00:00:00:01', 1, 1)
+    hosts.learn('00:00:00:00:00:02', 2, 1)
+    clock.advance(200)
+    # seen again, its age starts over
+    hosts.learn('00:00:00:00:00:02', 2, 1)
+    clock.advance(101)
+    assert hosts.expire() == [1]
+    assert '00:00:00:00:00:01' not in hosts and '00:00:00:00:00:02' in hosts
+    clock.advance(200)
+    assert hosts.expire() == [2]
+    assert len(hosts) == 0
+
+
+def test_forget():
+    hosts = HostLocator(clock=FakeClock())
+    hosts.learn('00:00:00:00:00:01', 1, 1)
+    assert hosts.forget('00:00:00:00:00:01') is True
+    assert hosts.forget('00:00:00:00:00:01') is False
@@ -0,0 +1,85 @@
+from fakes import FakeClock, FakeDatapath
+from inflight import InflightTable
+
+KEY = ('00:00:00:00:00:01', '00:00:00:00:00:02', 1)
+
+
+def barrier(dpid, xid):
+    datapath = FakeDatapath(dpid)
+    request = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+    request.xid = xid
+    return request
+
+
+def test_packets_are_held_until_every_barrier_is_answered():
+    table = InflightTable(clock=FakeClock())
+    assert table.begin(KEY, 'first') is True
+    assert table.begin(KEY, 'second') is False
+    assert table.begin(KEY, 'third') is False
+    assert table.installed(KEY, [barrier(1, 10), barrier(2, 20)]) == []
+
+    assert table.barrier_reply(1, 10) == []
+    # a reply nobody waits for
+    assert table.barrier_reply(3, 10) == []
+    assert table.barrier_reply(2, 20) == ['first', 'second', 'third']
+    assert table.coalesced == 2
+    assert not table.pending and not table.barriers
+
+
+def test_an_install_without_barriers_releases_at_once():
+    table = InflightTable(clock=FakeClock())
+    table.begin(KEY, 'first')
+    assert table.installed(KEY, []) == ['first']
+    assert table.begin(KEY, 'next') is True
+
+
+def test_abort_returns_only_the_buffered_packets():
+    table = InflightTable(clock=FakeClock())
+    table.begin(KEY, 'first')
+    table.begin(KEY, 'second')
+    assert table.abort(KEY) == ['second']
+    assert table.abort(KEY) == []
+
+
+def test_the_buffer_is_bounded():
+    table = InflightTable(max_buffered=2, clock=FakeClock())
+    table.begin(KEY, 'first')
+    for n in range(5):
+        table.begin(KEY, n)
+    table.installed(KEY, [barrier(1, 1)])
+    assert table.barrier_reply(1, 1) == ['first', 0, 1]
+
+
+def test_unanswered_installs_expire():
+    clock = FakeClock()
+    table = InflightTable(timeout=1.0, clock=clock)
+    table.begin(KEY, 'first')
+    table.installed(KEY, [barrier(1, 1)])
+    clock.advance(0.5)
+    assert table.expire() == []
+    clock.advance(0.5)
+    assert table.expire() == ['first']
+    # the late reply of the expired install is ignored
+    assert table.barrier_reply(1, 1) == []
+
+
+def test_a_timed_out_install_hands_its_packets_to_the_next_one():
+    clock = FakeClock()
+    table = InflightTable(timeout=1.0, clock=clock)
+    table.begin(KEY, 'first')
+    table.begin(KEY, 'second')
+    clock.advance(1.0)
+    assert table.begin(KEY, 'retry') is True
+    assert table.installed(KEY, []) == ['retry', 'first', 'second']
+
+
+def test_floods_of_the_same_key_are_suppressed_for_a_while():
+    clock = FakeClock()
+    table = InflightTable(negative_ttl=1.0, clock=clock)
+    assert table.should_flood(KEY) is True
+    assert table.should_flood(KEY) is False
+    assert table.suppressed == 1
+    clock.advance(1.0)
+    table.expire()
+    assert not table.flooded
+    assert table.should_flood(KEY) is True
@@ -0,0 +1,89 @@
+import pytest
+
+from ethframe import parse_eth
+from fakes import FakeClock
+from link_delay import ETH_TYPE_PROBE, DelayMonitor, parse_probe, probe_frame
+
+
+def measure(monitor, clock, ms, src=1, dst=2):
+    "Hand monitor a probe from src to dst that took ms, before the control channel correction."
+    sent = clock()
+    clock.advance(ms / 1000.0)
+    return monitor.probe_received(src, dst, sent)
+
+
+def monitor_without_rtt(**kwargs):
+    clock = FakeClock()
+    monitor = DelayMonitor(clock=clock, **kwargs)
+    monitor.rtt = {1: 0.0, 2: 0.0}
+    return monitor, clock
+
+
+def test_probes_carry_their_origin_and_send_time():
+    frame = probe_frame(0x1234567890, 7, 1024.5)
+    assert parse_probe(frame) == (0x1234567890, 7, 1024.5)
+    dst, src, ethertype = parse_eth(frame)
+    assert ethertype == ETH_TYPE_PROBE
+    # locally administered multicast destination, never a host
+    assert dst == 0x0300000088b5 and dst & (1 << 40)
+    assert parse_probe(frame[:-1]) is None
+    assert parse_probe(frame[:12] + b'\x08\x00' + frame[14:]) is None
+
+
+def test_the_control_channel_round_trips_are_taken_off_by_half():
+    clock = FakeClock(now=1024.0)
+    monitor = DelayMonitor(clock=clock)
+    # no correction known yet, no sample
+    assert measure(monitor, clock, 10.0) is None
+    for dpid, rtt in ((1, 0.0078125), (2, 0.015625)):
+        data = monitor.echo_data()
+        clock.advance(rtt)
+        monitor.echo_reply(dpid, data)
+    assert monitor.rtt == {1: 0.0078125, 2: 0.015625}
+    # an echo reply without the payload of echo_data() is ignored
+    monitor.echo_reply(1, b'other')
+    monitor.echo_reply(1, b'xxxx' + monitor.echo_data()[4:])
+    assert monitor.rtt[1] == 0.0078125
+
+    # 31.25 ms on the wire minus 3.90625 and 7.8125 ms of control channel
+    assert measure(monitor, clock, 31.25) == 20.0
+    assert monitor.last_sample[(1, 2)] == 19.53125
+    # a sample below the correction counts as no delay, and the cost never goes below the resolution
+    monitor.forget(1, 2)
+    assert measure(monitor, clock, 5.0) == 1.0
+    assert monitor.last_sample[(1, 2)] == 0.0
+
+
+def test_samples_are_smoothed_with_an_ewma():
+    monitor, clock = monitor_without_rtt(alpha=0.25, hysteresis_ms=0.0, hysteresis_ratio=0.0)
+    assert measure(monitor, clock, 10.0) == 10.0
+    measure(monitor, clock, 30.0)
+    assert monitor.delays[(1, 2)] == pytest.approx(15.0)
+    measure(monitor, clock, 15.0)
+    assert monitor.delays[(1, 2)] == pytest.approx(15.0)
+    assert monitor.cost(1, 2) == 15.0 and monitor.samples == 3
+
+
+def test_costs_move_only_out_of_the_hysteresis_band():
+    monitor, clock = monitor_without_rtt(alpha=1.0)
+    assert measure(monitor, clock, 10.0) == 10.0
+    # within max(2 ms, 10 %) of 10
+    assert measure(monitor, clock, 11.5) is None
+    assert measure(monitor, clock, 8.5) is None
+    assert measure(monitor, clock, 12.6) == 13.0
+    assert monitor.cost(1, 2) == 13.0
+
+    # above 20 ms the band is 10 % of the cost
+    assert measure(monitor, clock, 100.0) == 100.0
+    assert measure(monitor, clock, 109.0) is None
+    assert measure(monitor, clock, 91.0) is None
+    assert measure(monitor, clock, 111.0) == 111.0
+
+
+def test_a_forgotten_link_starts_over():
+    monitor, clock = monitor_without_rtt(alpha=0.5)
+    measure(monitor, clock, 10.0)
+    monitor.forget(1, 2)
+    assert monitor.cost(1, 2, default='none') == 'none' and (1, 2) not in monitor.delays
+    # the first sample after is taken as it is, not averaged with the old estimate
+    assert measure(monitor, clock, 40.0) == 40.0
@@ -0,0 +1,75 @@
+from fakes import FakeDatapath, Recorder
+from path_installer import PathInstaller, path_hops
+
+# 1 -(2:1)- 2 -(3:1)- 3 and a detour 1 -(3:1)- 4 -(2:2)- 3
+PORTS = {(1, 2): (2, 1), (2, 1): (1, 2), (2, 3): (3, 1), (3, 2): (1, 3),
+         (1, 4): (3, 1), (4, 1): (1, 3), (4, 3): (2, 2), (3, 4): (2, 2)}
+DST = '00:00:00:00:00:03'
+
+
+def ports_of(links):
+    return lambda src, dst: links.get((src, dst))
+
+
+def make_installer():
+    installed = []
+
+    def add_flow(datapath, priority, match, actions):
+        installed.append((datapath.id, match['in_port'], actions[0].port))
+
+    send_queues = Recorder()
+    installer = PathInstaller(add_flow, send_queues, table_id=1)
+    datapaths = dict((dpid, FakeDatapath(dpid)) for dpid in (1, 2, 3, 4))
+    return installer, datapaths, installed, send_queues
+
+
+def deleted(send_queues):
+    return [(dpid, mod.match['in_port']) for dpid, mod in send_queues.messages]
+
+
+def test_path_hops_and_install_last_hop_first():
+    installer, datapaths, installed, _ = make_installer()
+    hops = path_hops([1, 2, 3], ports_of(PORTS), 5, 4)
+    assert hops == [(1, 5, 2), (2, 1, 3), (3, 1, 4)]
+    assert path_hops([1, 3], ports_of(PORTS), 5, 4) is None
+
+    assert installer.install(datapaths, hops, DST) == []
+    assert installed == [(3, 1, 4), (2, 1, 3), (1, 5, 2)]
+    del datapaths[2]
+    assert installer.install(datapaths, hops, DST) is None
+
+
+def test_refresh_deletes_the_paths_over_a_failed_link():
+    installer, datapaths, _, send_queues = make_installer()
+    links = dict(PORTS)
+    link_ports = ports_of(links)
+    installer.install(datapaths, path_hops([1, 2, 3], link_ports, 5, 4), DST)
+    installer.install(datapaths, path_hops([2, 3], link_ports, 7, 4), DST)
+    installer.install(datapaths, path_hops([1, 4, 3], link_ports, 6, 4), DST)
+    assert installer.refresh(datapaths, link_ports) == 0
+
+    del links[(1, 2)]
+    assert installer.refresh(datapaths, link_ports) == 1
+    # the hop 2 -> 3 -> host is shared with the path entering at 2, which still works
+    assert deleted(send_queues) == [(1, 5), (2, 1)]
+    mod = send_queues.messages[0][1]
+    assert mod.command == datapaths[1].ofproto.OFPFC_DELETE_STRICT and mod.table_id == 1
+    assert mod.match['eth_dst'] == DST
+    assert sorted(installer.paths) == [(DST, 1, 6), (DST, 2, 7)]
+
+
+def test_refresh_deletes_the_paths_through_a_gone_switch():
+    installer, datapaths, _, send_queues = make_installer()
+    installer.install(datapaths, path_hops([1, 4, 3], ports_of(PORTS), 6, 4), DST)
+    del datapaths[4]
+    assert installer.refresh(datapaths, ports_of(PORTS)) == 1
+    assert deleted(send_queues) == [(1, 6), (3, 2)]
+
+
+def test_forget_drops_the_paths_of_a_host():
+    installer, datapaths, _, send_queues = make_installer()
+    installer.install(datapaths, path_hops([1, 2, 3], ports_of(PORTS), 5, 4), DST)
+    installer.forget(DST)
+    del datapaths[2]
+    assert installer.refresh(datapaths, ports_of(PORTS)) == 0
+    assert send_queues.messages == []
@@ -0,0 +1,113 @@
+import pytest
+from ryu.ofproto import ofproto_v1_3_parser
+
+from fakes import FakeClock
+from port_stats import DEFAULT_CAPACITY, PortStatsMonitor
+
+# 1 MB/s, so a tx_bytes delta of 10 ** 6 per second is a fully used port
+CAPACITY = 8 * 10 ** 6
+
+
+def stat(port_no, tx_bytes, duration):
+    sec = int(duration)
+    return ofproto_v1_3_parser.OFPPortStats(
+        port_no=port_no, rx_packets=0, tx_packets=0, rx_bytes=0, tx_bytes=tx_bytes, rx_dropped=0,
+        tx_dropped=0, rx_errors=0, tx_errors=0, rx_frame_err=0, rx_over_err=0, rx_crc_err=0, collisions=0,
+        duration_sec=sec, duration_nsec=int(round((duration - sec) * 1e9)))
+
+
+def port(port_no, curr_speed):
+    return ofproto_v1_3_parser.OFPPort(port_no, '00:00:00:00:00:00', 'eth%d' % port_no, 0, 0, 0, 0, 0, 0,
+                                       curr_speed, 0)
+
+
+def monitor(**kwargs):
+    clock = FakeClock()
+    stats = PortStatsMonitor(clock=clock, **kwargs)
+    stats.add(1)
+    stats.set_capacity(1, 1, CAPACITY)
+    return stats, clock
+
+
+def test_the_interval_doubles_while_idle_and_halves_while_busy():
+    stats, clock = monitor()
+    assert stats.due() == [1] and stats.due() == []
+    intervals = []
+    for n in range(6):
+        # the counter does not move
+        stats.stats_reply(1, [stat(1, 0, n)])
+        intervals.append(stats.switches[1].interval)
+    assert intervals == [2.0, 4.0, 8.0, 16.0, 16.0, 16.0]
+
+    intervals = []
+    for n in range(6):
+        stats.stats_reply(1, [stat(1, (n + 1) * 10 ** 6, 6 + n)])
+        intervals.append(stats.switches[1].interval)
+    assert intervals == [8.0, 4.0, 2.0, 1.0, 1.0, 1.0]
+    # a busy switch is polled again within the new interval, not at the end of the old one
+    assert stats.next_due() <= 1.0
+
+
+def test_due_returns_the_switches_whose_interval_elapsed():
+    stats, clock = monitor()
+    stats.add(2)
+    assert sorted(stats.due()) == [1, 2]
+    stats.stats_reply(1, [stat(1, 0, 0)])
+    stats.stats_reply(1, [stat(1, 0, 1)])
+    # 1 idles at 4 s now, from its next poll on; 2 is still at 1 s
+    clock.advance(1.0)
+    assert sorted(stats.due()) == [1, 2]
+    clock.advance(1.0)
+    assert stats.due() == [2]
+    clock.advance(3.0)
+    assert sorted(stats.due()) == [1, 2]
+    assert stats.polls == 7
+
+
+def test_utilisation_is_the_tx_rate_over_the_reply_durations():
+    stats, clock = monitor(alpha=0.5)
+    assert stats.stats_reply(1, [stat(1, 0, 10.0)]) == []
+    # 750 kB in 1.5 s of port time, whatever the controller's clock says
+    clock.advance(5.0)
+    assert stats.stats_reply(1, [stat(1, 750000, 11.5)]) == [(1, 1)]
+    assert stats.utilisation[(1, 1)] == pytest.approx(0.5)
+    # then 100 % for a second: smoothed half way
+    stats.stats_reply(1, [stat(1, 1750000, 12.5)])
+    assert stats.utilisation[(1, 1)] == pytest.approx(0.75)
+    # a reset counter gives no sample
+    stats.stats_reply(1, [stat(1, 10, 13.5)])
+    assert stats.utilisation[(1, 1)] == pytest.approx(0.75)
+
+
+def test_only_moves_beyond_the_threshold_are_republished():
+    stats, clock = monitor(alpha=1.0)
+    stats.stats_reply(1, [stat(1, 0, 0)])
+    assert stats.stats_reply(1, [stat(1, 400000, 1)]) == [(1, 1)]
+    assert stats.link_utilisation(1, 1) == pytest.approx(0.4)
+    # 0.48 is within 0.1 of the 0.4 last reported
+    assert stats.stats_reply(1, [stat(1, 880000, 2)]) == []
+    assert stats.utilisation[(1, 1)] == pytest.approx(0.48)
+    assert stats.link_utilisation(1, 1) == pytest.approx(0.4)
+    # 0.55 is not
+    assert stats.stats_reply(1, [stat(1, 1430000, 3)]) == [(1, 1)]
+    assert stats.link_utilisation(1, 1) == pytest.approx(0.55)
+    assert stats.link_utilisation(1, 2) == 0.0
+
+
+def test_the_capacity_comes_from_the_port_speed_unless_set():
+    stats, clock = monitor()
+    assert stats.capacity(1, 2) == DEFAULT_CAPACITY
+    # curr_speed is in kbit/s
+    stats.stats_reply(1, [stat(2, 0, 0)], ports={2: port(2, 100000)})
+    assert stats.capacity(1, 2) == 10 ** 8
+    stats.set_capacity(1, 2, CAPACITY)
+    assert stats.capacity(1, 2) == CAPACITY
+
+
+def test_a_removed_switch_is_neither_polled_nor_reported():
+    stats, clock = monitor()
+    stats.stats_reply(1, [stat(1, 0, 0)])
+    stats.stats_reply(1, [stat(1, 10 ** 6, 1)])
+    stats.remove(1)
+    assert stats.due() == [] and stats.utilisation == {} and stats.link_utilisation(1, 1) == 0.0
+    assert stats.stats_reply(1, [stat(1, 2 * 10 ** 6, 2)]) == []
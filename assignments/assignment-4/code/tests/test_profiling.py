@@ -0,0 +1,100 @@
+import math
+import random
+
+import pytest
+
+from profiling import SUB_BUCKETS, LatencyHistogram, Profiler, bucket_index, bucket_value
+
+
+class TickClock(object):
+    "A perf_counter_ns that moves on by step ns every time it is read."
+
+    def __init__(self, step):
+        self.now = 0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+def test_values_below_the_sub_buckets_are_exact():
+    for value in range(SUB_BUCKETS):
+        assert bucket_value(bucket_index(value)) == value
+        assert bucket_index(value + 1) == bucket_index(value) + 1
+
+
+@pytest.mark.parametrize('value', [SUB_BUCKETS, 100, 999, 4096, 123456, 10 ** 9, 2 ** 39 - 1])
+def test_a_bucket_is_within_a_sixteenth_of_its_values(value):
+    index = bucket_index(value)
+    low, high = bucket_value(index), bucket_value(index + 1)
+    assert low <= value < high
+    assert high - low <= low / (SUB_BUCKETS / 2)
+
+
+def test_the_buckets_are_contiguous():
+    for index in range(1, bucket_index(2 ** 40)):
+        assert bucket_index(bucket_value(index)) == index
+        assert bucket_index(bucket_value(index) - 1) == index - 1
+
+
+def test_percentiles_are_read_off_the_buckets_within_a_sixteenth():
+    rng = random.Random(1)
+    samples = [int(rng.lognormvariate(11, 1.5)) for _ in range(20000)]
+    hist = LatencyHistogram()
+    for ns in samples:
+        hist.record(ns)
+    samples.sort()
+    for q in (1, 50, 90, 99, 99.9):
+        # nearest rank, q * n is computed first so that 99.9 % of 20000 is 19980 exactly
+        exact = samples[int(math.ceil(q * len(samples) / 100.0)) - 1]
+        assert exact <= hist.percentile(q) <= exact * (1 + 1.0 / (SUB_BUCKETS / 2))
+    assert hist.percentile(100) == hist.max == samples[-1]
+    assert hist.mean() == pytest.approx(sum(samples) / float(len(samples)))
+    assert LatencyHistogram().percentile(50) is None
+
+
+def test_merged_histograms_count_both():
+    a, b = LatencyHistogram(), LatencyHistogram()
+    for ns in range(1000):
+        (a if ns % 2 else b).record(ns)
+    a.merge(b)
+    assert (a.count, a.total, a.max) == (1000, sum(range(1000)), 999)
+    # 499 lies in the bucket of 496..511
+    assert a.percentile(50) == 511
+
+
+def test_every_call_is_counted_and_one_in_sample_is_timed():
+    profiler = Profiler(clock=TickClock(250))
+
+    @profiler.profile(sample=4)
+    def handler(x):
+        return x + 1
+
+    assert [handler(n) for n in range(10)] == list(range(1, 11))
+    assert handler.__name__ == 'handler'
+    # calls 4 and 8, each 250 ns between the two readings of the clock
+    assert profiler.calls['handler'] == 10 and profiler.latency['handler'].count == 2
+    assert profiler.latency['handler'].total == 500
+    report = profiler.report()['handlers']['handler']
+    assert (report['calls'], report['timed'], report['p50_us']) == (10, 2, 0.25)
+
+
+def test_a_call_that_raises_is_timed_too():
+    profiler = Profiler(clock=TickClock(100))
+
+    @profiler.profile(name='failing')
+    def handler():
+        raise KeyError(1)
+
+    with pytest.raises(KeyError):
+        handler()
+    assert profiler.calls['failing'] == 1 and profiler.latency['failing'].max == 100
+
+
+def test_messages_are_counted_per_datapath_and_kind():
+    profiler = Profiler()
+    profiler.count(1, 'OFPFlowMod', 3)
+    profiler.count(1, 'OFPPacketOut')
+    profiler.count(2, 'OFPFlowMod')
+    assert profiler.report()['datapaths'] == {1: {'OFPFlowMod': 3, 'OFPPacketOut': 1}, 2: {'OFPFlowMod': 1}}
@@ -0,0 +1,137 @@
+import concurrent.futures
+
+from csr_graph import CSRGraph
+from fakes import FakeClock, load_controller
+from route_service import RouteService
+from routing import ecmp_next_hops, shortest_path_tree
+
+# a ring of 1..6, every link costing its lower dpid
+RING = dict((u, {}) for u in range(1, 7))
+for _u in range(1, 7):
+    _v = _u % 6 + 1
+    RING[_u][_v] = RING[_v][_u] = float(min(_u, _v))
+
+
+class ManualExecutor(object):
+    "An executor whose tasks start and run only when the test says so, in the test's process."
+
+    def __init__(self):
+        # [(future, fn, args)] in submission order
+        self.tasks = []
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        self.tasks.append((future, fn, args))
+        return future
+
+    def start(self):
+        "Start the tasks that were not cancelled, as the workers would pick them up."
+        for future, _, _ in self.tasks:
+            if not future.running() and not future.done():
+                future.set_running_or_notify_cancel()
+
+    def finish(self):
+        "Run the started tasks and those still waiting."
+        self.start()
+        for future, fn, args in self.tasks:
+            if future.running():
+                future.set_result(fn(*args))
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def service(**kwargs):
+    route_service = RouteService(clock=FakeClock(), **kwargs)
+    route_service.executor = ManualExecutor()
+    return route_service
+
+
+def test_the_items_are_split_into_chunks():
+    route_service = service(chunk_size=4)
+    graph = CSRGraph.from_adjacency(RING)
+    job = route_service.submit('trees', 1, graph, [6, 5, 4, 3, 2, 1])
+    assert [args[1] for _, _, args in route_service.executor.tasks] == [[1, 2, 3, 4], [5, 6]]
+    assert not job.done() and route_service.collect() == [] and route_service.busy('trees')
+
+    route_service.executor.finish()
+    assert route_service.collect() == [job] and not route_service.busy('trees')
+    assert job.result() == dict((src, shortest_path_tree(RING, src)) for src in RING)
+    assert route_service.stats()['completed'] == 1
+
+
+def test_a_newer_job_cancels_the_waiting_tasks_of_the_older_one():
+    route_service = service(chunk_size=2)
+    graph = CSRGraph.from_adjacency(RING)
+    old = route_service.submit('next_hops', 1, graph, [1, 2, 3, 4])
+    # the same version again is the same job
+    assert route_service.submit('next_hops', 1, graph, [1, 2, 3, 4]) is old
+    # the workers picked up the first chunk only
+    route_service.executor.tasks[0][0].set_running_or_notify_cancel()
+    # another kind is not touched
+    trees = route_service.submit('trees', 1, graph, [1])
+    route_service.clock.advance(1.0)
+    new = route_service.submit('next_hops', 2, graph, [5, 6])
+    assert old.cancelled and [future.cancelled() for future in old.futures] == [False, True]
+    assert not trees.cancelled
+
+    route_service.executor.finish()
+    # the chunk that was already running completes, but its result is dropped
+    assert old.futures[0].done() and not old.futures[0].cancelled()
+    assert route_service.collect() == [trees, new]
+    assert new.result() == dict((dst, ecmp_next_hops(RING, dst)) for dst in (5, 6))
+    assert route_service.stats()['superseded'] == 1 and route_service.stats()['pending'] == []
+
+
+def test_a_failed_task_fails_its_job():
+    route_service = service()
+    job = route_service.submit('trees', 1, CSRGraph.from_adjacency(RING), [1])
+    future, _, _ = route_service.executor.tasks[0]
+    future.set_running_or_notify_cancel()
+    future.set_exception(MemoryError())
+    assert route_service.collect() == [job]
+    assert route_service.stats()['failed'] == 1 and route_service.executor is not None
+
+
+def test_a_small_pool_computes_the_same_routes():
+    route_service = RouteService(workers=1, chunk_size=4)
+    try:
+        graph = CSRGraph.from_adjacency(RING)
+        job = route_service.submit('next_hops', 1, graph, list(RING))
+        assert len(job.futures) == 2
+        concurrent.futures.wait(job.futures)
+        assert route_service.collect() == [job]
+        assert job.result() == dict((dst, ecmp_next_hops(RING, dst)) for dst in RING)
+    finally:
+        route_service.close()
+
+
+def test_the_controller_drops_results_for_an_older_topology(monkeypatch):
+    monkeypatch.delenv('SIMPLE_SWITCH_SHARDS', raising=False)
+    monkeypatch.delenv('SIMPLE_SWITCH_FORWARDING', raising=False)
+    controller = load_controller()
+    controller.SNAPSHOT_PATH = None
+    app = controller.SimpleSwitch13()
+    try:
+        executor = app.route_service.executor = ManualExecutor()
+        app._apply_topology([('add_switch', (dpid, [1, 2, 3])) for dpid in (1, 2, 3)] +
+                            [('add_link', (1, 2, 1, 1, 1.0)), ('add_link', (2, 1, 1, 1, 1.0)),
+                             ('add_link', (2, 3, 2, 2, 1.0)), ('add_link', (3, 2, 2, 2, 1.0))])
+        version = app.route_table.version
+        app.route_service.submit('next_hops', version, app.topology.csr(), [1, 2, 3])
+        # a link comes up while the workers are at it
+        app._apply_topology([('add_link', (1, 3, 2, 1, 1.0)), ('add_link', (3, 1, 1, 2, 1.0))])
+        assert app.route_table.version != version
+
+        executor.finish()
+        app.collect_routes()
+        assert app.dest_installer.dags_version != version and app.dest_installer.dags == {}
+
+        # a job for the current version is loaded
+        version = app.route_table.version
+        app.route_service.submit('next_hops', version, app.topology.csr(), [1, 2, 3])
+        executor.finish()
+        app.collect_routes()
+        assert app.dest_installer.dags_version == version and sorted(app.dest_installer.dags) == [1, 2, 3]
+    finally:
+        app.close()
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from route_table import RouteTable
+from routing import INF, shortest_path_tree
+
+
+def path_cost(graph, path):
+    return sum(graph[u][v] for u, v in zip(path, path[1:]))
+
+
+def assert_matches_dijkstra(table):
+    "Every lookup of table agrees with a full Dijkstra over its current links."
+    for src in table.nodes():
+        dist, _ = shortest_path_tree(table.graph, src)
+        for dst in table.nodes():
+            path, cost = table.lookup(src, dst)
+            if dst not in dist:
+                assert (path, cost) == (None, INF)
+                continue
+            assert cost == dist[dst]
+            assert path[0] == src and path[-1] == dst
+            assert path_cost(table.graph, path) == cost
+
+
+def random_links(rng, nodes, count):
+    links = {}
+    while len(links) < count:
+        u, v = rng.sample(nodes, 2)
+        links[(u, v)] = rng.randint(1, 10)
+    return links
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_repair_matches_a_full_dijkstra_after_random_changes(seed):
+    rng = random.Random(seed)
+    nodes = list(range(1, 13))
+    table = RouteTable()
+    for node in nodes:
+        table.add_node(node)
+    for (u, v), cost in random_links(rng, nodes, 30).items():
+        table.set_link(u, v, cost)
+    assert_matches_dijkstra(table)
+
+    for _ in range(60):
+        links = [(u, v) for u in table.graph for v in table.graph[u]]
+        action = rng.random()
+        if action < 0.35 and links:
+            table.remove_link(*rng.choice(links))
+        elif action < 0.7 and links:
+            u, v = rng.choice(links)
+            table.set_link(u, v, rng.randint(1, 10))
+        else:
+            u, v = rng.sample(nodes, 2)
+            table.set_link(u, v, rng.randint(1, 10))
+        assert_matches_dijkstra(table)
+
+
+def test_batched_changes_rebuild_once():
+    table = RouteTable()
+    table.set_link(1, 2, 1)
+    table.set_link(2, 3, 1)
+    table.begin_batch()
+    assert table.set_link(1, 3, 1) == []
+    assert table.remove_link(1, 2) == []
+    assert table.end_batch() is True
+    assert table.lookup(1, 3) == ([1, 3], 1)
+    assert table.lookup(1, 2) == (None, INF)
+    assert table.end_batch() is False
+
+
+def test_outdated_trees_are_loaded_or_rebuilt_on_lookup():
+    table = RouteTable()
+    table.set_link(1, 2, 1)
+    table.begin_batch()
+    table.set_link(2, 3, 4)
+    table.end_batch(rebuild=False)
+    assert table.outdated == {1, 2, 3}
+    # a lookup before the trees arrive computes the one tree it needs
+    assert table.lookup(1, 3) == ([1, 2, 3], 5)
+    assert table.outdated == {2, 3}
+
+    assert table.load_trees({}, version=table.version - 1) is False
+    assert table.load_trees({2: shortest_path_tree(table.graph, 2)}, version=table.version) is True
+    assert not table.outdated
+    assert table.lookup(2, 3) == ([2, 3], 4)
+
+
+def test_cached_paths_follow_the_version_of_their_tree():
+    table = RouteTable()
+    table.set_link(1, 2, 1)
+    table.set_link(2, 3, 1)
+    assert table.lookup(1, 3) == ([1, 2, 3], 2)
+    table.set_link(1, 3, 1)
+    assert table.lookup(1, 3) == ([1, 3], 1)
+    table.remove_node(3)
+    assert 3 not in table
+    assert table.lookup(1, 3) == (None, INF)
+    assert table.next_hop(1, 2) == 2
@@ -0,0 +1,106 @@
+from ryu.controller import ofp_event
+
+from fakes import FakeClock, FakeDatapath, load_controller
+from send_queue import SendQueues
+
+
+def flow_mod(datapath, eth_dst):
+    parser = datapath.ofproto_parser
+    return parser.OFPFlowMod(datapath, priority=1, match=parser.OFPMatch(eth_dst=eth_dst), instructions=[])
+
+
+def test_messages_wait_for_a_flush_and_end_with_a_barrier():
+    datapath = FakeDatapath(1)
+    queues = SendQueues(clock=FakeClock())
+    first, second = flow_mod(datapath, '00:00:00:00:00:01'), flow_mod(datapath, '00:00:00:00:00:02')
+    queues.put(datapath, first)
+    queues.put(datapath, second)
+    assert datapath.sent == []
+
+    barrier = queues.flush(datapath)
+    assert datapath.sent == [first, second, barrier]
+    assert [msg.xid for msg in datapath.sent] == [1, 2, 3]
+    assert queues.flush(datapath) is None
+    stats = queues.stats()[1]
+    assert stats['flushes'] == 1 and stats['sent'] == 2 and stats['max_depth'] == 2
+    assert stats['kinds'] == {'OFPFlowMod': 2}
+
+
+def test_a_full_queue_is_flushed_at_once():
+    datapath = FakeDatapath(1)
+    queues = SendQueues(max_batch=3, clock=FakeClock())
+    for n in range(4):
+        queues.put(datapath, flow_mod(datapath, '00:00:00:00:00:0%d' % n))
+    assert datapath.names() == ['OFPFlowMod'] * 3 + ['OFPBarrierRequest']
+    assert len(queues.queue(datapath)) == 1
+
+
+def test_the_sweep_flushes_the_queues_that_waited_long_enough():
+    clock = FakeClock()
+    early, late = FakeDatapath(1), FakeDatapath(2)
+    queues = SendQueues(flush_interval=0.5, clock=clock)
+    queues.put(early, flow_mod(early, '00:00:00:00:00:01'))
+    clock.advance(0.25)
+    queues.put(late, flow_mod(late, '00:00:00:00:00:01'))
+    clock.advance(0.25)
+    queues.flush_due()
+    assert early.names() == ['OFPFlowMod', 'OFPBarrierRequest'] and late.sent == []
+    assert queues.stats()[1]['last_flush_latency'] == 0.5
+    clock.advance(0.25)
+    queues.flush_due()
+    assert late.names() == ['OFPFlowMod', 'OFPBarrierRequest']
+
+
+def test_a_reconnected_switch_gets_a_new_queue():
+    queues = SendQueues(clock=FakeClock())
+    old, new = FakeDatapath(1), FakeDatapath(1)
+    queues.put(old, flow_mod(old, '00:00:00:00:00:01'))
+    queues.put(new, flow_mod(new, '00:00:00:00:00:02'))
+    queues.flush(new)
+    assert old.sent == [] and new.names() == ['OFPFlowMod', 'OFPBarrierRequest']
+
+
+def test_bundles_wrap_the_batch_in_open_add_commit():
+    datapath = FakeDatapath(1)
+    ofproto = datapath.ofproto
+    queues = SendQueues(use_bundles=True, clock=FakeClock())
+    mods = [flow_mod(datapath, '00:00:00:00:00:0%d' % n) for n in range(2)]
+    for mod in mods:
+        queues.put(datapath, mod)
+    queues.flush(datapath)
+
+    assert datapath.names() == ['ONFBundleCtrlMsg', 'ONFBundleAddMsg', 'ONFBundleAddMsg',
+                                'ONFBundleCtrlMsg', 'OFPBarrierRequest']
+    open_, first, second, commit, _ = datapath.sent
+    assert open_.type == ofproto.ONF_BCT_OPEN_REQUEST and commit.type == ofproto.ONF_BCT_COMMIT_REQUEST
+    assert [first.message, second.message] == mods
+    assert set(msg.bundle_id for msg in datapath.sent[:4]) == {1}
+    assert open_.flags == ofproto.ONF_BF_ATOMIC | ofproto.ONF_BF_ORDERED
+
+    queues.put(datapath, flow_mod(datapath, '00:00:00:00:00:09'))
+    queues.flush(datapath)
+    assert datapath.sent[5].bundle_id == 2
+
+
+def test_the_controller_writes_bundles_when_enabled(monkeypatch):
+    monkeypatch.setenv('SIMPLE_SWITCH_BUNDLES', '1')
+    controller = load_controller()
+    assert controller.USE_BUNDLES
+    controller.SNAPSHOT_PATH = None
+    app = controller.SimpleSwitch13()
+    try:
+        datapath = FakeDatapath(1)
+        features = datapath.ofproto_parser.OFPSwitchFeatures(datapath)
+        app.switch_features_handler(ofp_event.EventOFPSwitchFeatures(features))
+        app.send_queues.flush(datapath)
+    finally:
+        app.close()
+    names = datapath.names()
+    assert names[0] == 'ONFBundleCtrlMsg' and names[-2:] == ['ONFBundleCtrlMsg', 'OFPBarrierRequest']
+    assert set(names[1:-2]) == {'ONFBundleAddMsg'}
+    assert all(type(msg.message).__name__ == 'OFPFlowMod' for msg in datapath.sent[1:-2])
+
+
+def test_the_controller_writes_plain_messages_by_default(monkeypatch):
+    monkeypatch.delenv('SIMPLE_SWITCH_BUNDLES', raising=False)
+    assert not load_controller().USE_BUNDLES
@@ -0,0 +1,223 @@
+import struct
+import zlib
+
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+from ryu.topology.switches import Link, Port, Switch
+
+import shard
+import snapshot
+from arp_proxy import ArpProxy
+from fakes import FakeClock, FakeDatapath, load_controller
+from host_locator import HostLocator, mac_to_int
+from shard import Coordinator, apply_hosts, own_events, plain_events, shard_of, topology_changes
+from topology_state import TopologyState
+
+
+def ofport(dpid, port_no):
+    return ofproto_v1_3_parser.OFPPort(port_no, '00:00:00:00:00:00', 's%d-eth%d' % (dpid, port_no),
+                                       0, 0, 0, 0, 0, 0, 0, 0)
+
+
+def topology_of(switches, links):
+    "A TopologyState of {dpid: ports} and [(src, dst, port, peer_port, cost)]."
+    topology = TopologyState(lambda src, dst: 1)
+    for dpid, ports in sorted(switches.items()):
+        topology.add_switch(dpid, ports)
+    for src, dst, port, peer_port, cost in links:
+        topology.add_link(src, dst, port, peer_port, cost)
+    return topology
+
+
+def arrays_of(topology, arp_proxy=None):
+    "The arrays of the snapshot a coordinator would publish for topology."
+    arp_proxy = arp_proxy or ArpProxy(topology.hosts)
+    return snapshot.loads(snapshot.dumps(topology, arp_proxy, {}, trees=False))
+
+
+def links_of(topology):
+    return sorted((src, dst, data['port'], data['peer_port'], data['weight'])
+                  for src, dst, data in topology.graph.edges(data=True))
+
+
+def test_shard_of_is_a_stable_hash_of_the_dpid():
+    for dpid in (1, 2, 0x0000deadbeef0001):
+        assert shard_of(dpid, 3) == zlib.crc32(struct.pack('!Q', dpid)) % 3
+        assert shard_of(dpid, 1) == 0
+    shards = [shard_of(dpid, 4) for dpid in range(1, 201)]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_plain_events_reduce_the_discovery_objects_to_numbers():
+    switch = Switch(FakeDatapath(1))
+    for port_no in (1, 2):
+        switch.add_port(ofport(1, port_no))
+    src, dst = Port(1, ofproto_v1_3, ofport(1, 2)), Port(2, ofproto_v1_3, ofport(2, 3))
+    link = Link(src, dst)
+    batch = [('switch_enter', (switch,)), ('link_add', (link,)), ('link_cost', ()),
+             ('set_link_cost', (1, 2, 4.5)), ('port_add', (src,)), ('port_delete', (dst,)),
+             ('link_delete', (link,)), ('switch_leave', (switch,))]
+    assert plain_events(batch) == [
+        ('add_switch', (1, [1, 2])),
+        ('add_link', (1, 2, 2, 3)),
+        ('set_link_cost', (1, 2, 4.5)),
+        ('add_port', (1, 2)),
+        ('drop_port', (2, 3)),
+        ('drop_link', (1, 2)),
+        ('drop_switch', (1,)),
+    ]
+
+
+def test_own_events_announce_the_own_switches_and_the_links_into_them():
+    topology = topology_of({1: [1, 2], 2: [2, 1], 3: [1]},
+                           [(1, 2, 2, 1, 1.0), (2, 1, 1, 2, 1.0), (2, 3, 2, 1, 1.0), (3, 2, 1, 2, 1.0)])
+    events = own_events(topology, lambda dpid: dpid == 2)
+    assert events[0] == ('add_switch', (2, [1, 2]))
+    assert sorted(events[1:]) == [('add_link', (1, 2, 2, 1)), ('add_link', (3, 2, 1, 2))]
+
+
+def test_topology_changes_bring_a_worker_in_line_with_the_snapshot(monkeypatch):
+    # the coordinator: switch 4 went away, 3 got a port, 1-3 moved to other ports, 1-2 costs more
+    published = topology_of({1: [1, 2, 3], 2: [1, 2], 3: [1, 2, 3]},
+                            [(1, 2, 1, 1, 2.0), (2, 1, 1, 1, 2.0), (2, 3, 2, 1, 1.0), (3, 2, 1, 2, 1.0),
+                             (1, 3, 3, 3, 1.0), (3, 1, 3, 3, 1.0)])
+    monkeypatch.delenv('SIMPLE_SWITCH_SHARDS', raising=False)
+    controller = load_controller()
+    controller.SNAPSHOT_PATH = None
+    app = controller.SimpleSwitch13()
+    try:
+        old_links = [(1, 2, 1, 1, 1.0), (2, 1, 1, 1, 1.0), (2, 3, 2, 1, 1.0), (3, 2, 1, 2, 1.0),
+                     (1, 3, 2, 2, 1.0), (3, 1, 2, 2, 1.0), (3, 4, 2, 1, 1.0), (4, 3, 1, 2, 1.0)]
+        app._apply_topology([('add_switch', (1, [1, 2, 3])), ('add_switch', (2, [1, 2])),
+                             ('add_switch', (3, [1, 2])), ('add_switch', (4, [1]))] +
+                            [('add_link', link) for link in old_links])
+        arrays = arrays_of(published)
+
+        changes = topology_changes(arrays, app.topology)
+        assert ('drop_switch', (4,)) in changes
+        assert ('add_port', (3, 3)) in changes
+        assert ('set_link_cost', (1, 2, 2.0)) in changes
+        assert ('drop_link', (1, 3)) in changes and ('add_link', (1, 3, 3, 3, 1.0)) in changes
+        # the links of switch 4 go with the switch
+        assert ('drop_link', (3, 4)) not in changes
+        assert not any(kind == 'add_switch' for kind, _ in changes)
+
+        app._apply_topology(changes)
+        assert sorted(app.topology.graph) == [1, 2, 3]
+        assert app.topology.ports == published.ports
+        assert links_of(app.topology) == links_of(published)
+        for src in (1, 2, 3):
+            for dst in (1, 2, 3):
+                assert app.route_table.lookup(src, dst) == published.route_table.lookup(src, dst)
+        assert topology_changes(arrays, app.topology) == []
+    finally:
+        app.close()
+
+
+def test_topology_changes_add_the_switches_a_worker_does_not_know():
+    published = topology_of({1: [1], 2: [1]}, [(1, 2, 1, 1, 1.0), (2, 1, 1, 1, 1.0)])
+    changes = topology_changes(arrays_of(published), topology_of({}, []))
+    assert changes == [('add_switch', (1, [1])), ('add_switch', (2, [1])),
+                       ('add_link', (1, 2, 1, 1, 1.0)), ('add_link', (2, 1, 1, 1, 1.0))]
+
+
+def test_apply_hosts_keeps_the_own_hosts_first_hand():
+    # this worker owns switch 1
+    owns = lambda dpid: dpid == 1
+    published = topology_of({1: [1, 2], 2: [1, 2], 3: [1]}, [])
+    coordinator_hosts = published.hosts
+    coordinator_hosts.learn('00:00:00:00:00:0a', 2, 2, now=50.0)   # stale sighting of an own host
+    coordinator_hosts.learn('00:00:00:00:00:0b', 2, 2, now=200.0)  # an own host that moved away since
+    coordinator_hosts.learn('00:00:00:00:00:0d', 3, 1, now=100.0)  # a remote host new to this worker
+    coordinator_hosts.learn('00:00:00:00:00:0e', 1, 2, now=300.0)  # on an own switch, unknown here
+    hosts = HostLocator()
+    hosts.learn('00:00:00:00:00:0a', 1, 1, now=100.0)
+    hosts.learn('00:00:00:00:00:0b', 1, 1, now=100.0)
+    hosts.learn('00:00:00:00:00:0c', 2, 1, now=100.0)  # remote, gone from the snapshot
+
+    moved = apply_hosts(arrays_of(published), hosts, owns)
+
+    assert sorted(moved) == [mac_to_int('00:00:00:00:00:0b'), mac_to_int('00:00:00:00:00:0c')]
+    assert hosts.hosts[mac_to_int('00:00:00:00:00:0a')] == (1, 1, 100.0)
+    assert hosts.hosts[mac_to_int('00:00:00:00:00:0b')] == (2, 2, shard.REMOTE_HOST_SEEN)
+    assert '00:00:00:00:00:0c' not in hosts
+    assert hosts.hosts[mac_to_int('00:00:00:00:00:0d')] == (3, 1, shard.REMOTE_HOST_SEEN)
+    assert '00:00:00:00:00:0e' not in hosts
+
+
+class FakeConnection(object):
+    "The coordinator's end of a worker connection: keeps what is published to it."
+
+    def __init__(self):
+        self.received = []
+        self.closed = False
+
+    def send_bytes(self, data):
+        self.received.append(snapshot.loads(data))
+
+    def close(self):
+        self.closed = True
+
+
+def test_the_coordinator_publishes_the_merged_topology_and_forgets_a_worker_that_left(tmp_path):
+    clock = FakeClock()
+    coordinator = Coordinator(2, str(tmp_path / 'coordinator.sock'), authkey=b'test', clock=clock)
+    try:
+        a, b = [dpid for dpid in range(1, 20) if shard_of(dpid, 2) == 0][:2]
+        c = next(dpid for dpid in range(1, 20) if shard_of(dpid, 2) == 1)
+        first, second = FakeConnection(), FakeConnection()
+        coordinator.handle(first, ('hello', 0))
+        coordinator.handle(second, ('hello', 1))
+        # a worker saying hello gets the topology at once, empty so far
+        assert len(first.received) == len(second.received) == 1
+        assert len(first.received[0]['switches']) == 0
+
+        coordinator.handle(first, ('events', 0, [('add_switch', (a, [1, 2])), ('add_switch', (b, [1, 2])),
+                                                 ('add_link', (a, b, 1, 1)), ('add_link', (b, a, 1, 1)),
+                                                 ('add_link', (a, c, 2, 1)), ('set_link_cost', (a, b, 3.0))]))
+        coordinator.handle(second, ('events', 1, [('add_switch', (c, [1, 2])), ('add_link', (c, a, 1, 2))]))
+        coordinator.handle(first, ('hosts', 0, [(0xa, a, 2, 10.0)], []))
+        coordinator.handle(second, ('hosts', 1, [(0xc, c, 2, 10.0)], []))
+        coordinator.handle(second, ('arp', 1, [('10.0.0.12', '00:00:00:00:00:0c')]))
+        # nothing is published before the batch is applied
+        assert len(first.received) == 1
+        coordinator.convergence.flush()
+
+        for conn in (first, second):
+            assert len(conn.received) == 2
+        arrays = first.received[-1]
+        assert sorted(arrays['switches'].tolist()) == sorted([a, b, c])
+        links = dict(((src, dst), cost) for (src, dst, _, _), cost in
+                     zip(arrays['links'].tolist(), arrays['link_costs'].tolist()))
+        assert links == {(a, b): 3.0, (b, a): 1.0, (a, c): 1.0, (c, a): 1.0}
+        assert sorted(arrays['hosts'].tolist()) == sorted([[0xa, a, 2], [0xc, c, 2]])
+        # 10.0.0.12 -> 00:00:00:00:00:0c
+        assert arrays['arp'].tolist() == [[0x0a00000c, 0xc]]
+
+        coordinator._drop(second)
+        assert second.closed and 1 not in coordinator.workers
+        coordinator.convergence.flush()
+        assert sorted(coordinator.topology.graph) == sorted([a, b])
+        assert list(coordinator.topology.hosts.hosts) == [0xa]
+        assert len(second.received) == 2
+        arrays = first.received[-1]
+        assert sorted(arrays['switches'].tolist()) == sorted([a, b])
+        assert sorted(arrays['hosts'].tolist()) == [[0xa, a, 2]]
+    finally:
+        coordinator.close()
+
+
+def test_a_worker_saying_hello_again_replaces_its_old_connection(tmp_path):
+    coordinator = Coordinator(2, str(tmp_path / 'coordinator.sock'), authkey=b'test', clock=FakeClock())
+    try:
+        a = next(dpid for dpid in range(1, 20) if shard_of(dpid, 2) == 0)
+        old, new = FakeConnection(), FakeConnection()
+        coordinator.handle(old, ('hello', 0))
+        coordinator.handle(old, ('events', 0, [('add_switch', (a, [1]))]))
+        coordinator.convergence.flush()
+        coordinator.handle(new, ('hello', 0))
+        assert old.closed and coordinator.workers[0] is new
+        # the switches of the shard are dropped until the worker announces them again
+        coordinator.convergence.flush()
+        assert len(coordinator.topology.graph) == 0
+    finally:
+        coordinator.close()
@@ -0,0 +1,124 @@
+from ryu.controller import ofp_event
+from ryu.controller.handler import MAIN_DISPATCHER
+from ryu.lib.packet import arp, ethernet, ether_types, ipv4, packet
+
+from fakes import FakeDatapath, load_controller
+from sink_tree import SinkTreeInstaller
+
+HOST_A, HOST_B = '00:00:00:00:00:0a', '00:00:00:00:00:0b'
+# a square, 1 reaches 4 over 2 and over 3 at the same cost; A is on port 3 of 1, B on port 3 of 4
+LINKS = [(1, 2, 1, 1), (1, 3, 2, 1), (2, 4, 2, 1), (3, 4, 2, 2)]
+HOST_PORT = 3
+
+
+def frame(src, dst, arp_request=False):
+    pkt = packet.Packet()
+    if arp_request:
+        pkt.add_protocol(ethernet.ethernet(dst='ff:ff:ff:ff:ff:ff', src=src,
+                                           ethertype=ether_types.ETH_TYPE_ARP))
+        pkt.add_protocol(arp.arp_ip(arp.ARP_REQUEST, src, '10.0.0.11', '00:00:00:00:00:00', '10.0.0.10'))
+    else:
+        pkt.add_protocol(ethernet.ethernet(dst=dst, src=src, ethertype=ether_types.ETH_TYPE_IP))
+        pkt.add_protocol(ipv4.ipv4(src='10.0.0.10', dst='10.0.0.11', proto=17))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def packet_in(datapath, in_port, data):
+    parser = datapath.ofproto_parser
+    msg = parser.OFPPacketIn(datapath, buffer_id=datapath.ofproto.OFP_NO_BUFFER, total_len=len(data),
+                             reason=datapath.ofproto.OFPR_NO_MATCH, table_id=0,
+                             match=parser.OFPMatch(in_port=in_port), data=data)
+    msg.msg_len = len(data) + 34
+    return ofp_event.EventOFPPacketIn(msg)
+
+
+def flow_mods(datapath, table_id):
+    return [msg for msg in datapath.sent if type(msg).__name__ == 'OFPFlowMod' and msg.table_id == table_id]
+
+
+def connect(app, datapath):
+    state = ofp_event.EventOFPStateChange(datapath)
+    state.state = MAIN_DISPATCHER
+    app.state_change_handler(state)
+    features = datapath.ofproto_parser.OFPSwitchFeatures(datapath)
+    app.switch_features_handler(ofp_event.EventOFPSwitchFeatures(features))
+
+
+def flush(app):
+    for datapath in app.datapaths.values():
+        app.send_queues.flush(datapath)
+
+
+def start(monkeypatch):
+    monkeypatch.delenv('SIMPLE_SWITCH_SHARDS', raising=False)
+    monkeypatch.setenv('SIMPLE_SWITCH_FORWARDING', 'sink_tree')
+    controller = load_controller()
+    controller.SNAPSHOT_PATH = None
+    return controller, controller.SimpleSwitch13()
+
+
+def test_the_pipeline_and_one_rule_per_destination_on_every_switch(monkeypatch):
+    controller, app = start(monkeypatch)
+    try:
+        assert isinstance(app.dest_installer, SinkTreeInstaller)
+        datapaths = dict((dpid, FakeDatapath(dpid)) for dpid in (1, 2, 3, 4))
+        for datapath in datapaths.values():
+            connect(app, datapath)
+        flush(app)
+
+        for datapath in datapaths.values():
+            ofproto = datapath.ofproto
+            classifier = flow_mods(datapath, controller.CLASSIFIER_TABLE)
+            forward = flow_mods(datapath, controller.FORWARD_TABLE)
+            # table-miss, delay probes and multicast sources in table 0, the table-miss in table 1
+            assert sorted(msg.priority for msg in classifier) == [0, 2, 3]
+            assert [msg.priority for msg in forward] == [0]
+            drop = next(msg for msg in classifier if msg.priority == 2)
+            assert drop.match['eth_src'] == ('01:00:00:00:00:00', '01:00:00:00:00:00')
+            assert drop.instructions == []
+            miss = next(msg for msg in classifier if msg.priority == 0)
+            assert miss.instructions[0].actions[0].port == ofproto.OFPP_CONTROLLER
+            datapath.reset()
+
+        ports = dict((dpid, [1, 2, HOST_PORT] if dpid in (1, 4) else [1, 2]) for dpid in datapaths)
+        app._apply_topology([('add_switch', (dpid, ports[dpid])) for dpid in sorted(datapaths)] +
+                            [('add_link', link) for a, b, port_a, port_b in LINKS
+                             for link in ((a, b, port_a, port_b, 1), (b, a, port_b, port_a, 1))])
+        flush(app)
+        # the inter-switch ports go straight on to table 1
+        for dpid, datapath in datapaths.items():
+            trunk = flow_mods(datapath, controller.CLASSIFIER_TABLE)
+            assert sorted(msg.match['in_port'] for msg in trunk) == [1, 2]
+            for msg in trunk:
+                assert msg.priority == 1
+                assert msg.instructions[0].table_id == controller.FORWARD_TABLE
+            assert flow_mods(datapath, controller.FORWARD_TABLE) == []
+            datapath.reset()
+
+        # B announces itself: its source is let through table 0 of its switch
+        app._packet_in_handler(packet_in(datapaths[4], HOST_PORT, frame(HOST_B, None, arp_request=True)))
+        flush(app)
+        learned = flow_mods(datapaths[4], controller.CLASSIFIER_TABLE)
+        assert len(learned) == 1
+        assert (learned[0].match['in_port'], learned[0].match['eth_src']) == (HOST_PORT, HOST_B)
+        assert learned[0].instructions[0].table_id == controller.FORWARD_TABLE
+        for datapath in datapaths.values():
+            datapath.reset()
+
+        # the first frame towards B programs the whole sink tree, one eth_dst rule per switch
+        app._packet_in_handler(packet_in(datapaths[1], HOST_PORT, frame(HOST_A, HOST_B)))
+        app._packet_in_handler(packet_in(datapaths[2], 1, frame(HOST_A, HOST_B)))
+        flush(app)
+        outputs = {}
+        for dpid, datapath in datapaths.items():
+            rules = flow_mods(datapath, controller.FORWARD_TABLE)
+            assert len(rules) == 1 and rules[0].match['eth_dst'] == HOST_B
+            outputs[dpid] = rules[0].instructions[0].actions[0].port
+        # the equal-cost tie at 1 goes to the lower dpid, 2
+        assert outputs == {1: 1, 2: 2, 3: 2, 4: HOST_PORT}
+        # and A's source is learned at 1
+        assert [len(flow_mods(datapath, controller.CLASSIFIER_TABLE)) for _, datapath in
+                sorted(datapaths.items())] == [1, 0, 0, 0]
+    finally:
+        app.close()
@@ -0,0 +1,76 @@
+import numpy as np
+
+import snapshot
+from arp_proxy import ArpProxy
+from topology_state import TopologyState
+
+LINKS = [(1, 2, 2, 1, 1.0), (2, 1, 1, 2, 1.0), (2, 3, 3, 1, 2.5), (3, 2, 1, 3, 2.5), (1, 3, 3, 2, 5.0)]
+
+
+def build():
+    topology = TopologyState(lambda src, dst: 1)
+    for dpid in (1, 2, 3):
+        topology.add_switch(dpid, [1, 2, 3, 4])
+    for src, dst, port, peer_port, cost in LINKS:
+        topology.add_link(src, dst, port, peer_port, cost)
+    topology.hosts.learn('00:00:00:00:00:01', 1, 4, now=100.0)
+    topology.hosts.learn('00:00:00:00:00:03', 3, 4, now=100.0)
+    arp_proxy = ArpProxy(topology.hosts)
+    arp_proxy.learn('10.0.0.1', '00:00:00:00:00:01')
+    mac_to_port = {1: {'00:00:00:00:00:01': 4}}
+    return topology, arp_proxy, mac_to_port
+
+
+def test_round_trip_through_a_file(tmp_path):
+    topology, arp_proxy, mac_to_port = build()
+    path = str(tmp_path / 'snapshot.npz')
+    assert snapshot.save(path, topology, arp_proxy, mac_to_port, delays={(1, 2): 0.5}, now=123.0) > 0
+    arrays = snapshot.load(path)
+    assert snapshot.written_at(arrays) == 123.0
+
+    restored = TopologyState(lambda src, dst: 1)
+    restored_arp = ArpProxy(restored.hosts)
+    restored_macs, delays = {}, {}
+    switches, links = snapshot.restore(arrays, restored, restored_arp, restored_macs, delays, now=200.0)
+
+    assert switches == {1, 2, 3}
+    assert links == set((src, dst) for src, dst, _, _, _ in LINKS)
+    assert restored.ports == topology.ports
+    for src, dst, port, peer_port, cost in LINKS:
+        assert restored.link_ports(src, dst) == (port, peer_port)
+        assert restored.route_table.cost(src, dst) == cost
+    assert delays == {(1, 2): 0.5}
+    # the hosts age from the restart
+    assert restored.hosts.hosts[1] == (1, 4, 200.0)
+    assert restored_arp.ip_to_mac == arp_proxy.ip_to_mac
+    assert restored_macs == mac_to_port
+    for src in (1, 2, 3):
+        for dst in (1, 2, 3):
+            assert restored.route_table.lookup(src, dst) == topology.route_table.lookup(src, dst)
+    assert restored.route_table.lookup(1, 3) == ([1, 2, 3], 3.5)
+
+
+def test_in_memory_round_trip_without_trees():
+    topology, arp_proxy, mac_to_port = build()
+    arrays = snapshot.loads(snapshot.dumps(topology, arp_proxy, mac_to_port, trees=False))
+    assert len(arrays['trees']) == 0
+    restored = TopologyState(lambda src, dst: 1)
+    snapshot.restore(arrays, restored, ArpProxy(restored.hosts), {})
+    assert restored.route_table.lookup(1, 3) == ([1, 2, 3], 3.5)
+
+
+def test_unreadable_or_other_format_snapshots_are_ignored(tmp_path):
+    assert snapshot.load(str(tmp_path / 'missing.npz')) is None
+    assert snapshot.loads(b'not a snapshot') is None
+    path = str(tmp_path / 'old.npz')
+    with open(path, 'wb') as f:
+        np.savez(f, header=np.array([snapshot.FORMAT_VERSION + 1, 0.0]))
+    assert snapshot.load(path) is None
+
+
+def test_has_switch_checks_the_dpid_and_its_ports():
+    topology, arp_proxy, mac_to_port = build()
+    arrays = snapshot.loads(snapshot.dumps(topology, arp_proxy, mac_to_port))
+    assert snapshot.has_switch(arrays, 2, [4, 3, 2, 1])
+    assert not snapshot.has_switch(arrays, 2, [1, 2, 3])
+    assert not snapshot.has_switch(arrays, 7, [1, 2, 3, 4])
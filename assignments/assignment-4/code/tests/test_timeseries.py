@@ -0,0 +1,83 @@
+import io
+
+import numpy as np
+
+from timeseries import HIST_MIN, RingSeries, TimeSeriesStore
+
+
+def test_the_ring_keeps_the_newest_samples_in_time_order():
+    series = RingSeries(capacity=4)
+    assert len(series) == 0 and series.last() is None
+    for t in range(6):
+        series.append(float(t), 10.0 * t)
+    assert len(series) == 4
+    times, values = series.samples()
+    assert times.tolist() == [2.0, 3.0, 4.0, 5.0]
+    assert values.tolist() == [20.0, 30.0, 40.0, 50.0]
+    assert series.last() == (5.0, 50.0)
+
+
+def test_the_ewma_starts_at_the_first_sample():
+    series = RingSeries(capacity=4, alpha=0.5)
+    assert series.ewma() is None
+    for value in (10.0, 20.0, 40.0):
+        series.append(0.0, value)
+    # 10, then 10 + 0.5 * 10, then 15 + 0.5 * 25
+    assert series.ewma() == 27.5
+
+
+def test_percentiles_read_from_the_histogram_are_within_a_bin():
+    series = RingSeries(capacity=1000)
+    for value in range(1, 1001):
+        series.append(0.0, float(value))
+    for q in (1, 50, 90, 99, 100):
+        # nearest rank: the value below which q % of the samples fall
+        exact = float(int(np.ceil(q / 100.0 * 1000)))
+        assert abs(series.percentile(q) - exact) <= 0.16 * exact
+    assert RingSeries().percentile(50) is None
+
+
+def test_samples_leaving_the_ring_leave_the_histogram():
+    series = RingSeries(capacity=10)
+    for _ in range(10):
+        series.append(0.0, 1000.0)
+    for _ in range(10):
+        series.append(0.0, 1.0)
+    assert series.hist.sum() == 10
+    assert abs(series.percentile(100) - 1.0) <= 0.16
+    series.append(0.0, HIST_MIN / 2)
+    assert series.percentile(1) == 0.0
+
+
+def test_memory_mapped_series_are_reopened_after_a_restart(tmp_path):
+    directory = str(tmp_path / 'timeseries')
+    store = TimeSeriesStore(directory, capacity=8, alpha=0.5)
+    for t in range(10):
+        store.record('delay', (1, 2), float(t), float(t + 1))
+    store.record('utilisation', (2, 1), 3.0, 0.25)
+    store.flush()
+
+    reopened = TimeSeriesStore(directory, capacity=8, alpha=0.5)
+    assert sorted(reopened.series) == [('delay', (1, 2)), ('utilisation', (2, 1))]
+    series = reopened.get('delay', (1, 2))
+    assert series.samples()[1].tolist() == store.get('delay', (1, 2)).samples()[1].tolist()
+    assert reopened.ewma('delay', (1, 2)) == store.ewma('delay', (1, 2))
+    # the histogram is rebuilt from the ring
+    assert reopened.percentile('delay', (1, 2), 50) == store.percentile('delay', (1, 2), 50)
+    reopened.record('delay', (1, 2), 10.0, 11.0)
+    assert series.last() == (10.0, 11.0) and len(series) == 8
+
+
+def test_dump_csv_writes_every_series_in_time_order():
+    store = TimeSeriesStore(capacity=2)
+    for t, value in ((1.0, 0.5), (2.0, 0.75), (3.0, 1.0)):
+        store.record('delay', (1, 2), t, value)
+    store.record('cost', (2, 1), 1.5, 3.0)
+    store.get('cost', (3, 1), create=True)
+    out = io.StringIO()
+    store.dump_csv(out)
+    assert out.getvalue().splitlines() == [
+        'cost,2,1,1.500000,3',
+        'delay,1,2,2.000000,0.75',
+        'delay,1,2,3.000000,1',
+    ]
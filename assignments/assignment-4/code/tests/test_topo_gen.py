@@ -0,0 +1,119 @@
+import collections
+
+import pytest
+
+import topo_gen
+from topo_gen import by_size, fat_tree, leaf_spine, random_geometric, ring, waxman
+
+
+def connected(topology):
+    "Whether every switch is reached from the first one."
+    adj = topology.weight_map()
+    seen = set([topology.switches[0]])
+    queue = collections.deque(seen)
+    while queue:
+        for nxt in adj[queue.popleft()]:
+            if nxt not in seen:
+                seen.add(nxt)
+                queue.append(nxt)
+    return len(seen) == len(topology)
+
+
+def assert_links_well_formed(topology):
+    pairs = [(link.src, link.dst) for link in topology.links]
+    assert len(set(pairs)) == len(pairs)
+    assert all(src < dst for src, dst in pairs)
+    assert all(link.delay > 0 for link in topology.links)
+
+
+@pytest.mark.parametrize('k', [2, 4, 8])
+def test_a_fat_tree_has_5k2_over_4_switches_and_k3_over_2_links(k):
+    topology = fat_tree(k)
+    assert topology.switches == list(range(1, 5 * k * k // 4 + 1))
+    assert len(topology.links) == k ** 3 // 2
+    # k / 2 hosts on each of the k pods' k / 2 edge switches
+    assert len(topology.hosts) == k * k // 2 and set(topology.hosts.values()) == set([k // 2])
+    assert_links_well_formed(topology)
+    assert connected(topology)
+    # every switch has k ports towards the fabric or its hosts
+    degree = collections.Counter()
+    for link in topology.links:
+        degree[link.src] += 1
+        degree[link.dst] += 1
+    assert set(degree[dpid] + topology.hosts.get(dpid, 0) for dpid in topology.switches) == set([k])
+
+
+@pytest.mark.parametrize('k', [0, 3])
+def test_a_fat_tree_arity_must_be_even(k):
+    with pytest.raises(ValueError):
+        fat_tree(k)
+
+
+def test_every_leaf_is_linked_to_every_spine():
+    topology = leaf_spine(6, 2, hosts_per_leaf=3)
+    assert len(topology) == 8 and len(topology.links) == 12
+    assert set((link.src, link.dst) for link in topology.links) == \
+        set((spine, leaf) for spine in (1, 2) for leaf in range(3, 9))
+    assert topology.hosts == dict((leaf, 3) for leaf in range(3, 9))
+
+
+def test_rings_close_on_themselves():
+    assert [(link.src, link.dst) for link in ring(4).links] == [(1, 2), (2, 3), (3, 4), (1, 4)]
+    assert len(ring(2).links) == 1 and ring(1).links == []
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('generate', [random_geometric, waxman])
+def test_the_geometric_families_are_connected(generate, seed):
+    # degree 1 leaves many components to be joined
+    for degree in (1.0, 4.0):
+        topology = generate(300, degree=degree, seed=seed)
+        assert len(topology) == 300
+        assert_links_well_formed(topology)
+        assert connected(topology)
+    # the delay is the distance across a square of SPAN_MS
+    assert max(link.delay for link in topology.links) <= topo_gen.SPAN_MS * 2 ** 0.5
+
+
+def test_the_geometric_families_are_reproducible():
+    assert random_geometric(100, seed=1).links == random_geometric(100, seed=1).links
+    assert waxman(100, seed=1).links != waxman(100, seed=2).links
+
+
+@pytest.mark.parametrize('family, n, switches', [
+    ('fat-tree', 100, 80),
+    ('fat-tree', 20, 20),
+    ('leaf-spine', 100, 100),
+    ('leaf-spine', 10000, 10000),
+    ('ring', 50, 50),
+    ('random-geometric', 100, 100),
+    ('waxman', 100, 100),
+])
+def test_by_size_gives_about_n_switches(family, n, switches):
+    topology = by_size(family, n)
+    assert len(topology) == switches and topology.name.startswith(family)
+
+
+def test_by_size_caps_the_spines_and_rejects_unknown_families():
+    topology = by_size('leaf-spine', 10000)
+    spines = sum(1 for dpid in topology.switches if dpid not in topology.hosts)
+    assert spines == topo_gen.MAX_SPINES
+    with pytest.raises(ValueError):
+        by_size('torus', 100)
+
+
+def test_the_weight_map_has_both_directions_of_every_link():
+    topology = leaf_spine(2, 2)
+    topology.links[0] = topology.links[0]._replace(delay=5.0, bw=10)
+    assert topology.weight_map() == {1: {3: 5.0, 4: 1.0}, 2: {3: 1.0, 4: 1.0},
+                                     3: {1: 5.0, 2: 1.0}, 4: {1: 1.0, 2: 1.0}}
+    bw = topology.weight_map('bw')
+    assert bw[1][3] == bw[3][1] == 10 and bw[2][4] == topo_gen.CORE_BW
+    # a switch without links is still in the map
+    assert ring(1).weight_map() == {1: {}}
+
+
+def test_hosts_are_numbered_across_the_switches():
+    topology = leaf_spine(2, 1, hosts_per_leaf=2)
+    # host k of switch d is k * 3 + d
+    assert sorted(topology.host_addresses()) == [(2, 2), (3, 3), (5, 2), (6, 3)]
@@ -0,0 +1,93 @@
+from ryu.controller import ofp_event
+from ryu.controller.handler import MAIN_DISPATCHER
+from ryu.lib.packet import arp, ethernet, ether_types, packet
+
+from fakes import FakeDatapath, load_controller
+from topology_state import TopologyState
+
+# a triangle, 1-2 and 1-3 on the BFS tree from 1, 2-3 closing the loop; port 3 of every switch is
+# a host port
+LINKS = [(1, 2, 1, 1), (1, 3, 2, 1), (2, 3, 2, 2)]
+HOST_PORT = 3
+
+
+def triangle():
+    topology = TopologyState(lambda src, dst: 1)
+    for dpid in (1, 2, 3):
+        topology.add_switch(dpid, [1, 2, HOST_PORT])
+    for a, b, port_a, port_b in LINKS:
+        topology.add_link(a, b, port_a, port_b, 1)
+        topology.add_link(b, a, port_b, port_a, 1)
+    return topology
+
+
+def test_broadcasts_are_flooded_over_a_bfs_tree_from_the_lowest_dpid():
+    topology = triangle()
+    assert topology.tree_ports() == {(1, 1), (2, 1), (1, 2), (3, 1)}
+    assert topology.flood_ports(1) == [1, 2, HOST_PORT]
+    # 2-3 is off the tree, only the host ports are flooded there
+    assert topology.flood_ports(2) == [1, HOST_PORT]
+    assert topology.flood_ports(3) == [1, HOST_PORT]
+    assert topology.flood_ports(4) is None
+
+
+def test_links_seen_in_one_direction_only_stay_off_the_tree():
+    topology = triangle()
+    topology.add_switch(4, [1])
+    topology.add_link(1, 4, 4, 1, 1)
+    topology.add_port(1, 4)
+    assert 4 not in topology.flood_ports(1)
+    assert topology.flood_ports(4) == [1]
+
+
+def test_the_tree_follows_the_links():
+    topology = triangle()
+    tree = topology.tree_ports()
+    assert topology.tree_ports() is tree
+    # a cost change leaves the tree alone
+    topology.set_link_cost(1, 2, 5)
+    assert topology.tree_ports() is tree
+    topology.drop_link(1, 2)
+    topology.drop_link(2, 1)
+    # 2 now hangs off 3
+    assert topology.tree_ports() == {(1, 2), (3, 1), (3, 2), (2, 2)}
+    # port 1 lost its link and is an edge port like the host's
+    assert topology.flood_ports(2) == [1, 2, HOST_PORT]
+
+
+def test_the_controller_drops_broadcasts_arriving_off_the_tree(monkeypatch):
+    monkeypatch.delenv('SIMPLE_SWITCH_SHARDS', raising=False)
+    controller = load_controller()
+    controller.SNAPSHOT_PATH = None
+    app = controller.SimpleSwitch13()
+    try:
+        datapath = FakeDatapath(2)
+        state = ofp_event.EventOFPStateChange(datapath)
+        state.state = MAIN_DISPATCHER
+        app.state_change_handler(state)
+        app.topology = triangle()
+        pkt = packet.Packet()
+        pkt.add_protocol(ethernet.ethernet(dst='ff:ff:ff:ff:ff:ff', src='00:00:00:00:00:0a',
+                                           ethertype=ether_types.ETH_TYPE_ARP))
+        pkt.add_protocol(arp.arp_ip(arp.ARP_REQUEST, '00:00:00:00:00:0a', '10.0.0.10',
+                                    '00:00:00:00:00:00', '10.0.0.99'))
+        pkt.serialize()
+        parser = datapath.ofproto_parser
+
+        def packet_in(in_port):
+            msg = parser.OFPPacketIn(datapath, buffer_id=datapath.ofproto.OFP_NO_BUFFER,
+                                     total_len=len(pkt.data), reason=datapath.ofproto.OFPR_NO_MATCH,
+                                     table_id=0, match=parser.OFPMatch(in_port=in_port), data=bytes(pkt.data))
+            msg.msg_len = len(pkt.data) + 34
+            app._packet_in_handler(ofp_event.EventOFPPacketIn(msg))
+
+        # the copy coming over 2-3 was already delivered by the tree
+        packet_in(2)
+        assert datapath.sent == []
+        # the copy from 1 is flooded on, out of the host port only
+        packet_in(1)
+        out, = datapath.sent
+        assert type(out).__name__ == 'OFPPacketOut'
+        assert [action.port for action in out.actions] == [HOST_PORT]
+    finally:
+        app.close()
@@ -0,0 +1,185 @@
+"""
+Ring-buffer time-series store for link measurements.
+
+Every (metric, key) series, e.g. ('delay', (1, 2)), is a fixed-size ring of
+(time, value) rows in one float64 NumPy array, so a series costs the same
+memory however long the controller runs and no Python object is kept per
+sample. Next to the ring a series maintains
+
+  * an EWMA, updated on every append, and
+  * a histogram over logarithmic bins of the samples currently in the ring
+    (the sample that falls out is subtracted), so percentile() reads
+    the histogram instead of sorting; its error is one bin, about 15 %,
+    and values up to HIST_MIN read as 0.
+
+With a directory the rings are numpy.memmap files instead, one per series,
+and are opened again (histogram rebuilt) after a restart. dump_csv() writes
+every series in time order for offline analysis.
+"""
+
+import os
+
+import numpy as np
+
+# Samples kept per series
+CAPACITY = 4096
+# Weight of a new sample in the EWMA
+EWMA_ALPHA = 0.2
+# Percentile histogram: log-spaced bins from HIST_MIN to HIST_MAX, values
+# outside fall in the first and last bin
+HIST_MIN = 1e-3
+HIST_MAX = 1e6
+HIST_BINS_PER_DECADE = 8
+
+# rows 0 and 1 of every ring hold (head, count) and (ewma, has ewma)
+_HEADER_ROWS = 2
+_SUFFIX = '.ring'
+
+
+class RingSeries(object):
+
+    def __init__(self, capacity=CAPACITY, alpha=EWMA_ALPHA, path=None):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.path = path
+        shape = (capacity + _HEADER_ROWS, 2)
+        if path is None:
+            self.data = np.zeros(shape, dtype=np.float64)
+        elif os.path.exists(path):
+            self.data = np.memmap(path, dtype=np.float64, mode='r+')
+            self.data = self.data.reshape(-1, 2)
+            self.capacity = self.data.shape[0] - _HEADER_ROWS
+        else:
+            self.data = np.memmap(path, dtype=np.float64, mode='w+', shape=shape)
+        self.rows = self.data[_HEADER_ROWS:]
+
+        decades = np.log10(HIST_MAX) - np.log10(HIST_MIN)
+        self.edges = np.logspace(np.log10(HIST_MIN), np.log10(HIST_MAX),
+                                 int(decades * HIST_BINS_PER_DECADE) + 1)
+        self.hist = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        if len(self):
+            np.add.at(self.hist, np.searchsorted(self.edges, self.values()), 1)
+
+    def __len__(self):
+        return int(self.data[0, 1])
+
+    def append(self, t, value):
+        head, count = int(self.data[0, 0]), int(self.data[0, 1])
+        if count == self.capacity:
+            self.hist[self._bin(self.rows[head, 1])] -= 1
+        else:
+            self.data[0, 1] = count + 1
+        self.rows[head] = (t, value)
+        self.hist[self._bin(value)] += 1
+        self.data[0, 0] = (head + 1) % self.capacity
+
+        if self.data[1, 1]:
+            self.data[1, 0] += self.alpha * (value - self.data[1, 0])
+        else:
+            self.data[1] = (value, 1.0)
+
+    def _bin(self, value):
+        return int(np.searchsorted(self.edges, value))
+
+    def ewma(self):
+        return float(self.data[1, 0]) if self.data[1, 1] else None
+
+    def last(self):
+        "(time, value) of the newest sample, or None."
+        if not len(self):
+            return None
+        t, value = self.rows[(int(self.data[0, 0]) - 1) % self.capacity]
+        return float(t), float(value)
+
+    def percentile(self, q):
+        "Approximate q-th percentile (0..100) of the samples in the ring, or None."
+        count = len(self)
+        if not count:
+            return None
+        rank = max(int(np.ceil(q / 100.0 * count)), 1)
+        i = int(np.searchsorted(np.cumsum(self.hist), rank))
+        if i == 0:
+            return 0.0
+        # the geometric middle of the bin, clamped to the last edge
+        lo = self.edges[i - 1]
+        hi = self.edges[min(i, len(self.edges) - 1)]
+        return float(np.sqrt(lo * hi))
+
+    def samples(self):
+        "(times, values) arrays in time order, oldest first."
+        head, count = int(self.data[0, 0]), len(self)
+        if count < self.capacity:
+            rows = self.rows[:count]
+        else:
+            rows = np.concatenate((self.rows[head:], self.rows[:head]))
+        return rows[:, 0], rows[:, 1]
+
+    def values(self):
+        return self.samples()[1]
+
+    def flush(self):
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+
+
+class TimeSeriesStore(object):
+
+    def __init__(self, directory=None, capacity=CAPACITY, alpha=EWMA_ALPHA):
+        # directory for the memory-mapped rings, None keeps them in memory
+        self.directory = directory
+        self.capacity = capacity
+        self.alpha = alpha
+        # (metric, key) -> RingSeries
+        self.series = {}
+        if directory is not None:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(_SUFFIX):
+                    metric, key = self._parse_name(name[:-len(_SUFFIX)])
+                    self.series[(metric, key)] = RingSeries(
+                        capacity, alpha, os.path.join(directory, name))
+
+    @staticmethod
+    def _file_name(metric, key):
+        return '-'.join([metric] + [str(part) for part in key]) + _SUFFIX
+
+    @staticmethod
+    def _parse_name(name):
+        parts = name.split('-')
+        key = tuple(int(part) if part.isdigit() else part for part in parts[1:])
+        return parts[0], key
+
+    def get(self, metric, key, create=False):
+        series = self.series.get((metric, key))
+        if series is None and create:
+            path = None
+            if self.directory is not None:
+                path = os.path.join(self.directory, self._file_name(metric, key))
+            series = RingSeries(self.capacity, self.alpha, path)
+            self.series[(metric, key)] = series
+        return series
+
+    def record(self, metric, key, t, value):
+        self.get(metric, key, create=True).append(t, value)
+
+    def ewma(self, metric, key):
+        series = self.get(metric, key)
+        return series.ewma() if series is not None else None
+
+    def percentile(self, metric, key, q):
+        series = self.get(metric, key)
+        return series.percentile(q) if series is not None else None
+
+    def flush(self):
+        for series in self.series.values():
+            series.flush()
+
+    def dump_csv(self, out):
+        "Write metric,key,...,time,value rows of every series to the open file out."
+        for (metric, key), series in sorted(self.series.items(), key=lambda item: str(item[0])):
+            times, values = series.samples()
+            if not len(times):
+                continue
+            prefix = ','.join([metric] + [str(part) for part in key]).replace('%', '%%')
+            np.savetxt(out, np.column_stack((times, values)), fmt=prefix + ',%.6f,%.9g')
@@ -0,0 +1,269 @@
+"""
+Synthetic topologies for testing the routing at scale.
+
+Every generator returns a GeneratedTopology: switches numbered from 1, the
+switch-to-switch links with a delay (ms) and a bandwidth (Mbit/s), and the
+number of hosts on every switch. The same graph is then available as
+
+  * weight_map(): {dpid: {dpid: cost}}, the adjacency map the routing
+    modules and CSRGraph.from_adjacency take (cost = delay by default);
+  * mininet_topo(): a Mininet Topo with TCLink delay/bw parameters, host
+    k of switch d is numbered n = k * max(dpid) + d, with the mac n and
+    the ip 10.0.0.n spread over three bytes, so the first host of every
+    switch is named as in topo.py.
+
+The families:
+
+  fat_tree(k)                   k-ary fat-tree, 5k^2/4 switches
+  leaf_spine(leaves, spines)    every leaf linked to every spine
+  ring(n)
+  random_geometric(n, degree)   switches in the unit square, linked within
+                                the radius giving the average degree
+  waxman(n, degree)             P(link) = beta * exp(-d / (alpha * L)),
+                                O(n^2) pairs drawn
+
+The geometric families take the delay from the distance (the side of the
+square is SPAN_MS) and are made connected by linking every smaller
+component to the closest switch of the largest one. by_size() picks the
+parameters of a family for about n switches. For Mininet:
+
+    sudo mn --custom topo_gen.py --topo fattree,4 --link tc --controller remote
+"""
+
+import collections
+import math
+
+import numpy as np
+
+# Delay in ms across the unit square of the geometric families
+SPAN_MS = 50.0
+# Delay in ms of the links of the structured families
+FABRIC_DELAY_MS = 1.0
+# Link bandwidths in Mbit/s, within what TCLink can shape
+CORE_BW = 1000
+EDGE_BW = 100
+# Upper bound of the spine layer picked by by_size()
+MAX_SPINES = 16
+
+FAMILIES = ('fat-tree', 'leaf-spine', 'ring', 'random-geometric', 'waxman')
+
+TopoLink = collections.namedtuple('TopoLink', 'src dst delay bw')
+
+
+class GeneratedTopology(object):
+
+    def __init__(self, name, switches, links, hosts=None):
+        self.name = name
+        self.switches = list(switches)
+        # TopoLink per switch pair, src < dst
+        self.links = list(links)
+        # dpid -> number of hosts
+        self.hosts = dict(hosts or {})
+
+    def __len__(self):
+        return len(self.switches)
+
+    def weight_map(self, weight='delay'):
+        "{dpid: {dpid: cost}} in both directions, the cost being the delay or the bw attribute."
+        adj = dict((dpid, {}) for dpid in self.switches)
+        for link in self.links:
+            cost = getattr(link, weight)
+            adj[link.src][link.dst] = cost
+            adj[link.dst][link.src] = cost
+        return adj
+
+    def host_addresses(self):
+        "(n, dpid) of every host, in the numbering of the module docstring."
+        top = max(self.switches) if self.switches else 0
+        for dpid in sorted(self.hosts):
+            for k in range(self.hosts[dpid]):
+                yield k * top + dpid, dpid
+
+
+def mininet_topo(topology):
+    "The topology as a Mininet Topo (Mininet is only needed here)."
+    from mininet.topo import Topo
+
+    class GeneratedTopo(Topo):
+
+        def build(self):
+            for dpid in topology.switches:
+                self.addSwitch('s%d' % dpid, dpid='%016x' % dpid)
+            for n, dpid in topology.host_addresses():
+                host = self.addHost('h%d' % n, ip=_host_ip(n), mac=_host_mac(n))
+                self.addLink('s%d' % dpid, host, bw=EDGE_BW)
+            for link in topology.links:
+                self.addLink('s%d' % link.src, 's%d' % link.dst,
+                             delay='%gms' % link.delay, bw=link.bw)
+
+    return GeneratedTopo()
+
+
+def _host_mac(n):
+    # host_locator.int_to_mac, not imported so that mn --custom can load this file on its own
+    return ':'.join('%02x' % (n >> shift & 0xff) for shift in range(40, -8, -8))
+
+
+def _host_ip(n):
+    return '10.%d.%d.%d' % (n >> 16 & 0xff, n >> 8 & 0xff, n & 0xff)
+
+
+def fat_tree(k, hosts_per_edge=None):
+    "k-ary fat-tree: (k/2)^2 core, then k pods of k/2 aggregation and k/2 edge switches."
+    if k < 2 or k % 2:
+        raise ValueError('fat-tree arity must be even: %s' % k)
+    half = k // 2
+    hosts_per_edge = half if hosts_per_edge is None else hosts_per_edge
+    core = list(range(1, half * half + 1))
+    links = []
+    edges = []
+    next_dpid = len(core) + 1
+    for _ in range(k):
+        aggs = list(range(next_dpid, next_dpid + half))
+        pod_edges = list(range(next_dpid + half, next_dpid + k))
+        next_dpid += k
+        for i, agg in enumerate(aggs):
+            # aggregation switch i of every pod connects to core group i
+            for core_dpid in core[i * half:(i + 1) * half]:
+                links.append(TopoLink(core_dpid, agg, FABRIC_DELAY_MS, CORE_BW))
+            for edge in pod_edges:
+                links.append(TopoLink(agg, edge, FABRIC_DELAY_MS, CORE_BW))
+        edges.extend(pod_edges)
+    return GeneratedTopology('fat-tree-%d' % k, range(1, next_dpid), links,
+                             dict((edge, hosts_per_edge) for edge in edges))
+
+
+def leaf_spine(leaves, spines, hosts_per_leaf=2):
+    "Spines numbered first, every leaf linked to every spine."
+    spine_ids = list(range(1, spines + 1))
+    leaf_ids = list(range(spines + 1, spines + leaves + 1))
+    links = [TopoLink(spine, leaf, FABRIC_DELAY_MS, CORE_BW) for leaf in leaf_ids for spine in spine_ids]
+    return GeneratedTopology('leaf-spine-%dx%d' % (leaves, spines), spine_ids + leaf_ids, links,
+                             dict((leaf, hosts_per_leaf) for leaf in leaf_ids))
+
+
+def ring(n, hosts_per_switch=1):
+    switches = list(range(1, n + 1))
+    if n < 2:
+        links = []
+    elif n == 2:
+        links = [TopoLink(1, 2, FABRIC_DELAY_MS, CORE_BW)]
+    else:
+        links = [TopoLink(min(i, i % n + 1), max(i, i % n + 1), FABRIC_DELAY_MS, CORE_BW)
+                 for i in switches]
+    return GeneratedTopology('ring-%d' % n, switches, links,
+                             dict((dpid, hosts_per_switch) for dpid in switches))
+
+
+def random_geometric(n, degree=6.0, hosts_per_switch=1, seed=0):
+    """
+    n switches at random points of the unit square, linked when closer than
+    the radius that gives the average degree. The square is cut in cells of
+    one radius, so only neighbouring cells are compared.
+    """
+    rnd = np.random.RandomState(seed)
+    points = rnd.random_sample((n, 2))
+    radius = math.sqrt(degree / (math.pi * max(n, 1)))
+    cells = collections.defaultdict(list)
+    for i, (x, y) in enumerate(points):
+        cells[(int(x / radius), int(y / radius))].append(i)
+
+    pairs = {}
+    for (cx, cy), members in cells.items():
+        near = [j for dx in (-1, 0, 1) for dy in (-1, 0, 1) for j in cells.get((cx + dx, cy + dy), ())]
+        near = np.array(near)
+        for i in members:
+            others = near[near > i]
+            d = np.hypot(*(points[others] - points[i]).T)
+            for j, dist in zip(others[d <= radius], d[d <= radius]):
+                pairs[(i, int(j))] = dist
+    _connect(points, pairs)
+    return _geometric('random-geometric-%d' % n, n, pairs, hosts_per_switch)
+
+
+def waxman(n, degree=4.0, alpha=0.15, hosts_per_switch=1, seed=0):
+    """
+    Waxman graph on n random points of the unit square: u and v are linked
+    with probability beta * exp(-d(u, v) / (alpha * L)), L the diagonal.
+    beta is set for the average degree (at most 1).
+    """
+    rnd = np.random.RandomState(seed)
+    points = rnd.random_sample((n, 2))
+    scale = alpha * math.sqrt(2)
+    # mean link probability for beta = 1, from a sample of pairs
+    sample = rnd.randint(0, n, size=(min(n * 4, 100000), 2))
+    mean = np.exp(-np.hypot(*(points[sample[:, 0]] - points[sample[:, 1]]).T) / scale).mean()
+    beta = min(1.0, degree / (max(n - 1, 1) * mean))
+
+    pairs = {}
+    for i in range(n - 1):
+        d = np.hypot(*(points[i + 1:] - points[i]).T)
+        linked = np.nonzero(rnd.random_sample(len(d)) < beta * np.exp(-d / scale))[0]
+        for j in linked:
+            pairs[(i, i + 1 + int(j))] = d[j]
+    _connect(points, pairs)
+    return _geometric('waxman-%d' % n, n, pairs, hosts_per_switch)
+
+
+def _connect(points, pairs):
+    "Link every component but the largest to the closest point of the largest one."
+    n = len(points)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        parent[find(i)] = find(j)
+    components = collections.defaultdict(list)
+    for i in range(n):
+        components[find(i)].append(i)
+    if len(components) < 2:
+        return
+    main = max(components.values(), key=len)
+    main_points = points[main]
+    for members in components.values():
+        if members is main:
+            continue
+        d = np.hypot(*(main_points - points[members[0]]).T)
+        j = int(np.argmin(d))
+        i, k = sorted((members[0], main[j]))
+        pairs[(i, k)] = d[j]
+
+
+def _geometric(name, n, pairs, hosts_per_switch):
+    links = [TopoLink(i + 1, j + 1, max(round(d * SPAN_MS, 3), 0.001), CORE_BW)
+             for (i, j), d in sorted(pairs.items())]
+    switches = list(range(1, n + 1))
+    return GeneratedTopology(name, switches, links, dict((dpid, hosts_per_switch) for dpid in switches))
+
+
+def by_size(family, n, seed=0):
+    "A topology of the family with about n switches."
+    if family == 'fat-tree':
+        # 5k^2/4 switches, k even
+        k = max(2, int(round(math.sqrt(n * 4 / 5.0) / 2)) * 2)
+        return fat_tree(k)
+    if family == 'leaf-spine':
+        spines = min(max(2, int(round(math.sqrt(n) / 4))), MAX_SPINES)
+        return leaf_spine(max(n - spines, 1), spines)
+    if family == 'ring':
+        return ring(n)
+    if family == 'random-geometric':
+        return random_geometric(n, seed=seed)
+    if family == 'waxman':
+        return waxman(n, seed=seed)
+    raise ValueError('unknown topology family: %s' % family)
+
+
+# mn --custom topo_gen.py --topo <name>,<args>
+topos = {
+    'fattree': lambda k=4: mininet_topo(fat_tree(int(k))),
+    'leafspine': lambda leaves=4, spines=2: mininet_topo(leaf_spine(int(leaves), int(spines))),
+    'ring': lambda n=6: mininet_topo(ring(int(n))),
+    'geometric': lambda n=20, seed=0: mininet_topo(random_geometric(int(n), seed=int(seed))),
+    'waxman': lambda n=20, seed=0: mininet_topo(waxman(int(n), seed=int(seed))),
+}
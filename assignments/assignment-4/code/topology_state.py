@@ -0,0 +1,176 @@
+"""
+Topology state of the controller, updated one discovery event at a time.
+
+The switches and links are kept in a networkx DiGraph whose edges carry the
+egress port ('port'), the ingress port on the neighbour ('peer_port') and
+the routing cost ('weight'). Every delta is mirrored into the RouteTable
+and the host locations into a HostLocator, so the packet-in path only ever
+reads from here and never rebuilds anything.
+
+Broadcasts are flooded over a spanning tree of the links instead of every
+port, because the topology has loops: flood_ports() is every edge port of
+a switch plus its ports on the tree. The tree is a BFS tree from the lowest
+dpid of each connected part and only changes when a link comes or goes, not
+when a link cost is updated.
+"""
+
+import networkx as nx
+
+from csr_graph import CSRGraph
+from host_locator import HostLocator
+from route_table import RouteTable
+
+
+class TopologyState(object):
+
+    def __init__(self, link_cost):
+        # link_cost(src dpid, dst dpid) -> cost of a newly discovered link
+        self.link_cost = link_cost
+        self.graph = nx.DiGraph()
+        self.route_table = RouteTable()
+        self.hosts = HostLocator()
+        # (dpid, port) of the switch-to-switch ports, hosts are never learned on those
+        self.switch_ports = set()
+        # dpid -> port numbers of the switch
+        self.ports = {}
+        # bumped whenever a link is added or removed
+        self.link_version = 0
+        # (link version, {(dpid, port) on the spanning tree}) of the last flood tree
+        self._tree = (None, None)
+        # (route table version, CSRGraph) of the last compact snapshot
+        self._csr = (None, None)
+
+    def switch_enter(self, switch):
+        self.add_switch(switch.dp.id, [port.port_no for port in switch.ports], switch=switch)
+
+    def add_switch(self, dpid, ports, **attrs):
+        self.graph.add_node(dpid, **attrs)
+        self.ports[dpid] = set(ports)
+        self.route_table.add_node(dpid)
+
+    def switch_leave(self, switch):
+        self.drop_switch(switch.dp.id)
+
+    def drop_switch(self, dpid):
+        if dpid not in self.graph:
+            return
+        for src, dst in list(self.graph.in_edges(dpid)) + list(self.graph.out_edges(dpid)):
+            self._remove_edge(src, dst)
+        self.graph.remove_node(dpid)
+        self.ports.pop(dpid, None)
+        self.route_table.remove_node(dpid)
+
+    def port_add(self, port):
+        self.add_port(port.dpid, port.port_no)
+
+    def add_port(self, dpid, port_no):
+        self.ports.setdefault(dpid, set()).add(port_no)
+
+    def port_delete(self, port):
+        self.drop_port(port.dpid, port.port_no)
+
+    def drop_port(self, dpid, port_no):
+        self.ports.get(dpid, set()).discard(port_no)
+        self.port_down(dpid, port_no)
+
+    def link_add(self, link):
+        src, dst = link.src.dpid, link.dst.dpid
+        self.add_link(src, dst, link.src.port_no, link.dst.port_no, self.link_cost(src, dst))
+
+    def add_link(self, src, dst, port, peer_port, cost):
+        if not self.graph.has_edge(src, dst):
+            self.link_version += 1
+        self.graph.add_edge(src, dst, port=port, peer_port=peer_port, weight=cost)
+        self.switch_ports.add((src, port))
+        self.route_table.set_link(src, dst, cost)
+
+    def link_delete(self, link):
+        self.drop_link(link.src.dpid, link.dst.dpid)
+
+    def drop_link(self, src, dst):
+        if self.graph.has_edge(src, dst):
+            self._remove_edge(src, dst)
+
+    def port_down(self, dpid, port_no):
+        "Drop the links in both directions behind a port that went down."
+        if dpid not in self.graph:
+            return
+        for src, dst, data in list(self.graph.out_edges(dpid, data=True)):
+            if data['port'] == port_no:
+                self._remove_edge(src, dst)
+        for src, dst, data in list(self.graph.in_edges(dpid, data=True)):
+            if data['peer_port'] == port_no:
+                self._remove_edge(src, dst)
+
+    def set_link_cost(self, src, dst, cost):
+        if self.graph.has_edge(src, dst):
+            self.graph[src][dst]['weight'] = cost
+            self.route_table.set_link(src, dst, cost)
+
+    def host_add(self, host):
+        "Returns the previous (dpid, port) if the host moved."
+        return self.hosts.learn(host.mac, host.port.dpid, host.port.port_no)
+
+    def is_switch_port(self, dpid, port_no):
+        return (dpid, port_no) in self.switch_ports
+
+    def link_ports(self, src, dst):
+        "(egress port on src, ingress port on dst) of a link, or None if it is not known."
+        data = self.graph.get_edge_data(src, dst)
+        if data is None:
+            return None
+        return data['port'], data['peer_port']
+
+    def flood_ports(self, dpid):
+        """
+        Ports of dpid a broadcast may be sent out of: the edge ports and the
+        ports on the spanning tree. None if the ports of dpid are not known.
+        """
+        ports = self.ports.get(dpid)
+        if ports is None:
+            return None
+        tree = self.tree_ports()
+        return sorted(port for port in ports
+                      if (dpid, port) in tree or (dpid, port) not in self.switch_ports)
+
+    def tree_ports(self):
+        "(dpid, port) of both ends of every link of the flood spanning tree."
+        version, ports = self._tree
+        if version != self.link_version:
+            ports = self._spanning_tree()
+            self._tree = (self.link_version, ports)
+        return ports
+
+    def _spanning_tree(self):
+        ports = set()
+        seen = set()
+        for root in sorted(self.graph):
+            if root in seen:
+                continue
+            seen.add(root)
+            queue = [root]
+            for u in queue:
+                for v in sorted(self.graph.successors(u)):
+                    # only links discovered in both directions are used
+                    if v in seen or not self.graph.has_edge(v, u):
+                        continue
+                    seen.add(v)
+                    queue.append(v)
+                    ports.add((u, self.graph[u][v]['port']))
+                    ports.add((v, self.graph[v][u]['port']))
+        return ports
+
+    def csr(self):
+        "Compact CSRGraph snapshot of the current topology, rebuilt only after a change."
+        version, graph = self._csr
+        if version != self.route_table.version:
+            graph = CSRGraph.from_topology(self.graph)
+            self._csr = (self.route_table.version, graph)
+        return graph
+
+    def _remove_edge(self, src, dst):
+        data = self.graph[src][dst]
+        self.switch_ports.discard((src, data['port']))
+        self.graph.remove_edge(src, dst)
+        self.link_version += 1
+        self.route_table.remove_link(src, dst)